@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+#
+# Part of automaid -- a Python package to process MERMAID files
+# pymaid environment (Python v3.10)
+#
+# Index of the files of a (server or processed) directory, listed once with
+# `os.scandir` and then queried by float number, extension and hexadecimal date
+# instead of globbing the whole directory for every float.
+
+import os
+import re
+import errno
+import shutil
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# <NUMB>_<HEXADATE>.<EXT> (e.g., 10_5E79D332.MER, 0026_5D4BF32C.000)
+FLOAT_FILE_REGEX = re.compile(r"^(\d+)_([^.]*)\.(.+)$")
+HEXADATE_REGEX = re.compile(r"^[0-9A-F]+$")
+
+# Extensions of the fragments concatenated into .LOG/.BIN and .RBR files
+FRAGMENT_REGEX = re.compile(r"^[0-9]{3}$")
+RBR_FRAGMENT_REGEX = re.compile(r"^R[0-9]{2}$")
+
+# Float names of <FLOAT>.vit files, e.g., 452.020-P-10.vit
+VIT_FLOAT_REGEX = re.compile(r"^([0-9].*\..*-.*-.*[0-9])\.vit$")
+
+# Linux ioctl to clone (reflink) a file on copy-on-write filesystems (Btrfs, XFS)
+FICLONE = 0x40049409
+
+def stage_file(src_path, dest_dir):
+    '''Stage `src_path` in `dest_dir` without copying its data if possible
+
+    The file is hard-linked, or else (e.g., if hard links are not permitted)
+    reflinked, and only copied as a last resort, e.g., across filesystems.
+    Staged files share their data with the server files: they must never be
+    modified in place (see `Catalog.create`).
+
+    Returns the path of the staged file.
+
+    '''
+    dest_path = os.path.join(dest_dir, os.path.basename(src_path))
+    try:
+        os.link(src_path, dest_path)
+        return dest_path
+    except OSError as e:
+        if e.errno == errno.EEXIST:
+            raise
+
+    if fcntl is not None:
+        try:
+            with open(src_path, "rb") as src, open(dest_path, "wb") as dest:
+                fcntl.ioctl(dest.fileno(), FICLONE, src.fileno())
+            return dest_path
+        except OSError:
+            os.remove(dest_path)
+
+    shutil.copy(src_path, dest_path)
+    return dest_path
+
+class Entry:
+    '''A single file of a Catalog
+
+    name -- file name
+    float_nb -- float number (string) or None, e.g., "10" for 10_5E79D332.MER
+    head -- file name without extension, e.g., "10_5E79D332"
+    extension -- file extension without the dot, e.g., "MER", "000", "vit"
+    date -- Unix Epoch time decoded from the hexadecimal date, or None
+
+    '''
+    __slots__ = ("name", "float_nb", "head", "extension", "date")
+
+    def __init__(self, name):
+        self.name = name
+        self.float_nb = None
+        self.date = None
+
+        catch = FLOAT_FILE_REGEX.match(name)
+        if catch:
+            self.float_nb = catch.group(1)
+            self.head = self.float_nb + "_" + catch.group(2)
+            self.extension = catch.group(3)
+            if HEXADATE_REGEX.match(catch.group(2)):
+                self.date = int(catch.group(2), 16)
+        else:
+            self.head, _, self.extension = name.rpartition(".")
+            if not self.head:
+                self.head = name
+
+class Catalog:
+    '''Index of the files of directory `path`
+
+    The directory is listed once when the catalog is built; files created or
+    removed afterwards by automaid itself must be registered with `add` and
+    `remove` to keep the index up to date.
+
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.by_float_nb = {}
+        self.by_head = {}
+        self.by_extension = {}
+
+        with os.scandir(path) as it:
+            for dir_entry in it:
+                if dir_entry.is_file():
+                    self.add(dir_entry.name)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def add(self, name):
+        name = os.path.basename(name)
+        if name in self.entries:
+            return
+
+        entry = Entry(name)
+        self.entries[name] = entry
+        if entry.float_nb is not None:
+            self.by_float_nb.setdefault(entry.float_nb, set()).add(name)
+        self.by_head.setdefault(entry.head, set()).add(name)
+        self.by_extension.setdefault(entry.extension, set()).add(name)
+
+    def remove(self, name):
+        name = os.path.basename(name)
+        entry = self.entries.pop(name, None)
+        if entry is None:
+            return
+
+        if entry.float_nb is not None:
+            self.by_float_nb[entry.float_nb].discard(name)
+        self.by_head[entry.head].discard(name)
+        self.by_extension[entry.extension].discard(name)
+
+    def create(self, name, mode="wb"):
+        '''Open a new file `name` for writing and add it to the catalog
+
+        Any existing file of that name is unlinked first, rather than truncated,
+        so that writing a derived file never alters the server file a staged
+        entry may be linked to.
+
+        '''
+        file_path = self.get_path(os.path.basename(name))
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        self.add(name)
+        return open(file_path, mode)
+
+    def unlink(self, name):
+        '''Remove file `name` from the directory and from the catalog
+
+        '''
+        os.remove(self.get_path(os.path.basename(name)))
+        self.remove(name)
+
+    def get_path(self, name):
+        return os.path.join(self.path, name)
+
+    def get_paths(self, names):
+        return [self.get_path(name) for name in sorted(names)]
+
+    def get_floats(self):
+        '''Return the names of the floats with a <FLOAT>.vit file
+
+        '''
+        mfloats = []
+        for name in self.by_extension.get("vit", ()):
+            catch = VIT_FLOAT_REGEX.match(name)
+            if catch:
+                mfloats.append(catch.group(1))
+        return mfloats
+
+    def get_float_files(self, mfloat):
+        '''Return the paths of all files of float `mfloat`, i.e., those named
+        <NUMB>_* and the <FLOAT>.vit, .cmd, .out... files
+
+        '''
+        mfloat_nb = re.findall(r"(\d+)$", mfloat)[0]
+        names = set(self.by_float_nb.get(mfloat_nb, ()))
+        names |= self.by_head.get(mfloat, set())
+        return self.get_paths(names)
+
+    def get_files(self, extension, float_nb=None):
+        '''Return the paths of the files with extension `extension` (e.g., "LOG"),
+        optionally only those of float number `float_nb`
+
+        '''
+        names = self.by_extension.get(extension, set())
+        if float_nb is not None:
+            names = names & self.by_float_nb.get(float_nb, set())
+        return self.get_paths(names)
+
+    def get_fragments(self, name, regex=FRAGMENT_REGEX):
+        '''Return the paths of the fragments (e.g., .000, .001...) sharing the head of
+        file `name`, whose extensions match `regex`
+
+        '''
+        head = self.entries[os.path.basename(name)].head
+        names = [n for n in self.by_head.get(head, ()) if regex.match(self.entries[n].extension)]
+        return self.get_paths(names)
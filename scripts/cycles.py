@@ -19,6 +19,7 @@ import sys
 import glob
 import collections
 
+import numpy as np
 from obspy import UTCDateTime
 import plotly.offline as plotly
 import plotly.graph_objs as graph
@@ -27,10 +28,94 @@ import gps
 import utils
 import setup
 import preprocess
+import events
 
 # Get current version number.
 version = setup.get_version()
 
+class CycleLines:
+    '''
+        Table of the lines of a cycle, tokenised once: the Unix Epoch time of
+        each line (int64 array) and the line itself.
+
+        `find_timestamped_values` returns the same values as
+        utils.find_timestamped_values, but only runs the regular expression on
+        the lines containing a given substring (a cheap prefilter).
+    '''
+    # First "<time>:" of a line (as searched by utils.find_timestamped_values)
+    timestamp_regex = re.compile(r"(\d+):")
+
+    def __init__(self, content):
+        self.lines = utils.split_log_lines(content)
+        epochs = []
+        self.has_epoch = np.ones(len(self.lines), dtype=bool)
+        for index, line in enumerate(self.lines):
+            catch = self.timestamp_regex.search(line)
+            epoch = int(catch.group(1)) if catch else -1
+            if not 0 <= epoch <= np.iinfo(np.int64).max:
+                # No (or no valid) time: queries matching this line fail
+                self.has_epoch[index] = False
+                epoch = -1
+            epochs.append(epoch)
+        self.epochs = np.array(epochs, dtype=np.int64)
+
+        self.found = {}
+
+    def __len__(self):
+        return len(self.lines)
+
+    def get_indices(self, contains=None):
+        '''
+            Return the indices of the lines which contain the string `contains`
+            (all lines if None)
+        '''
+        if contains is None:
+            return range(len(self.lines))
+        return [i for i, line in enumerate(self.lines) if contains in line]
+
+    def find_timestamped_epochs(self, regexp, contains=None):
+        '''
+            Return the structured array (utils.TIMESTAMPED_DTYPE) of the lines
+            matching `regexp`, as utils.find_timestamped_epochs, among the lines
+            containing `contains` (see get_indices), a substring of every line
+            that `regexp` may match
+
+            Results are memoised per query.
+        '''
+        key = (regexp, contains)
+        if key in self.found:
+            return self.found[key].copy()
+
+        compiled = re.compile(regexp)
+        epochs = []
+        values = []
+        for index in self.get_indices(contains):
+            catch = compiled.search(self.lines[index])
+            if catch is None:
+                continue
+            if not self.has_epoch[index]:
+                raise ValueError("No time on line: {}".format(self.lines[index]))
+            # Same value as the first item of `re.findall`
+            groups = catch.groups("")
+            if not groups:
+                values.append(catch.group(0))
+            elif len(groups) == 1:
+                values.append(groups[0])
+            else:
+                values.append(groups)
+            epochs.append(self.epochs[index])
+
+        self.found[key] = utils.timestamped_array(epochs, values)
+        return self.found[key].copy()
+
+    def find_timestamped_values(self, regexp, contains=None):
+        '''
+            Return the [value, UTCDateTime] lists of the lines matching
+            `regexp`, as utils.find_timestamped_values (see
+            find_timestamped_epochs)
+        '''
+        return utils.timestamped_values(self.find_timestamped_epochs(regexp, contains))
+
 class Log:
     log_name = None
     log_content = None
@@ -160,19 +245,24 @@ class Log:
         # (the metadata header, which does not necessarily relate to the
         # events and their binary data below that header in the same .MER)
         self.events = events.get_events_between(self.start_date, self.end_date)
-        # Set and parse info from .MER file and invert wavelet transform any binary data
-        # (cannot invert the data without vital information from the .MER environment)
+        # Set and parse info from .MER file, needed to invert the wavelet
+        # transform of any binary data (see `Cycle.set_events_processed_data`)
         if not self.mer_environment and len(self.events) > 0:
             # Mer file is not logged on LOG file but events are found during this dive
             # E.g : 12_65B5EC90.LOG / 12_65BF9636.MER
             self.mer_environment = self.events[0].default_mer_environment
 
         for event in self.events:
+            # Only the header is needed here (for the starttime of requested
+            # events); the binary data are read when inverted
+            event.load_mer_binary(header_only=True)
             event.set_kstnm_kinst(self.kstnm, self.kinst)
             event.set_environment(self.mer_environment_name, self.mer_environment)
             event.find_measured_sampling_frequency()
             event.set_uncorrected_starttime()
-            event.set_processed_data()
+            event.unload_mer_binary()
+        # The binary data are only inverted cycle by cycle, when their output
+        # files are written (see `Cycle.set_events_processed_data`)
         # Re-sort events based on starttime (rather than INFO DATE)
         self.events.sort(key=lambda x: x.uncorrected_starttime)
         # Merge gps list into an unique
@@ -224,6 +314,7 @@ class Cycle:
     kinst = None
     cycle_name = None
     cycle_content = None
+    cycle_lines = None
     cycle_nb = None
 
     start_date = None
@@ -262,10 +353,13 @@ class Cycle:
 
     mermaid_reboots = None
     emergency_triggers = None
-    pressure_mbar = None
-    vitals_vbat = None
-    vitals_pext = None
-    vitals_pint = None
+    # Structured arrays (utils.TIMESTAMPED_DTYPE) of the pressure and vitals
+    # readings, also exposed as [value, UTCDateTime] lists by the properties
+    # `pressure_mbar` and `vitals_*` below
+    pressure_mbar_epochs = None
+    vitals_vbat_epochs = None
+    vitals_pext_epochs = None
+    vitals_pint_epochs = None
 
 
     gps_valid4clockdrift_correction = None
@@ -290,7 +384,8 @@ class Cycle:
     # Class attribute to hold MERMAID "MH" FDSN network code
     network = utils.network()
 
-    def __init__(self, base_path=None, cycle_name=None, events=None, profilesS41=None ,profilesS61=None, profilesRBR=None):
+    def __init__(self, base_path=None, cycle_name=None, events=None, profilesS41=None ,profilesS61=None, profilesRBR=None,
+                 cycle_content=None):
         self.base_path = base_path
         self.__version__ = version
         self.cycle_name = cycle_name
@@ -310,15 +405,20 @@ class Cycle:
         self.cycle_nb = int(filename_split[0], 10)
         self.start_date = UTCDateTime(int(filename_split[1], 16))
 
-        # Read the content of the CYCLE file
-        with open(self.base_path + self.cycle_name, "rb") as f:
-            self.cycle_content = f.read().decode("utf-8","replace")
-            # Empty .LOG file, e.g. 0003_5FDCB1EE.LOG in testing
-            # (maybe it was later transmitted?)
-            if not self.cycle_content:
-                return
+        # Read the content of the CYCLE file, unless it was handed over in
+        # memory by the cycle builder (see preprocess.iter_cycles)
+        if cycle_content is None:
+            with open(self.base_path + self.cycle_name, "rb") as f:
+                cycle_content = f.read().decode("utf-8","replace")
+        self.cycle_content = cycle_content
+        # Empty .LOG file, e.g. 0003_5FDCB1EE.LOG in testing
+        # (maybe it was later transmitted?)
+        if not self.cycle_content:
+            return
+        # Tokenise the lines of the cycle once for all the searches below
+        cycle_lines = self.get_cycle_lines()
         # Get the last date (last line of the cycle file)
-        last_epoch_time = utils.split_log_lines(self.cycle_content)[-1].split(':')[0]
+        last_epoch_time = cycle_lines.lines[-1].split(':')[0]
         self.end_date = UTCDateTime(int(last_epoch_time))
         # Get cycle duration
         self.len_secs = int(self.end_date - self.start_date)
@@ -326,8 +426,7 @@ class Cycle:
         # Get the station name
         find_name = None
         find_soft = None
-        lines = utils.split_log_lines(self.cycle_content)
-        for line in lines :
+        for line in cycle_lines.lines :
             match_board = re.findall("board (.+)", line)
             match_buoy = re.findall("buoy (.+)", line)
             match_soft_v1 = re.findall("soft (.+)", line)
@@ -382,7 +481,8 @@ class Cycle:
         # DO NOT DO: `('\[PRESS ,\s*\d+\]P\s*(\+?\-?\d+)mbar', self.cycle_content)`
         # because "P.*mbar" is a valid pressure, even if prefixed with "[SURFIN, ..."
         # Add \] before P to delete log when battery measurement are done (for new buoys)
-        self.pressure_mbar = utils.find_timestamped_values(r"\]P\s*(\+?\-?\d+)mbar", self.cycle_content)
+        # (structured array of Unix Epoch times and values, see utils.TIMESTAMPED_DTYPE)
+        self.pressure_mbar_epochs = cycle_lines.find_timestamped_epochs(r"\]P\s*(\+?\-?\d+)mbar", contains="mbar")
 
         # Check if the .CYCLE corresponds to float initialization
         if self.cycle_nb == 0 :
@@ -390,31 +490,32 @@ class Cycle:
             self.start_cycle = self.start_date
         else :
             # Find Leave surface date
-            diving = utils.find_timestamped_values(r"\[\w+, *\d+\]P? *(\+?\-?\d+)mbar reached", self.cycle_content)
+            diving = cycle_lines.find_timestamped_values(r"\[\w+, *\d+\]P? *(\+?\-?\d+)mbar reached",
+                                                        contains="mbar reached")
             if diving:
                 # Cycle start when buoy leave surface
                 self.is_dive = True
                 self.descent_leave_surface_date = diving[0][1]
                 self.start_cycle = self.descent_leave_surface_date
         # Check if the .CYCLE is completed
-        complete = utils.find_timestamped_values(preprocess.REGEX_FILE_END, self.cycle_content)
+        complete = cycle_lines.find_timestamped_values(preprocess.REGEX_FILE_END, contains="[PREPROCESS]End of cycle")
         if complete :
             self.is_complete_cycle = True
             self.end_cycle = complete[0][1]
 
         # Find start of surfacing date
         # Start of surfacing can be triggered by start of last stage (CTD profile)
-        surfacing_stage = utils.find_timestamped_values(r"\]Stage \[(\d+)\] surfacing", self.cycle_content)
+        surfacing_stage = cycle_lines.find_timestamped_values(r"\]Stage \[(\d+)\] surfacing", contains="surfacing")
         if surfacing_stage:
             # Surfacing stage
             stage_nb = surfacing_stage[0][0]
             regex_stage_begin = r"\[MAIN  *, *\d+\]stage\[" + stage_nb + r"\]"
-            stage_begin = utils.find_timestamped_values(regex_stage_begin, self.cycle_content)
+            stage_begin = cycle_lines.find_timestamped_values(regex_stage_begin, contains="[MAIN")
             if stage_begin :
                 self.ascent_start_date = stage_begin[0][1]
         # By default surfacing is triggered when all stage are finished
         if self.descent_leave_surface_date and not self.ascent_start_date :
-            surfacing = utils.find_timestamped_values(r"\[MAIN *, *\d+\]surfacing", self.cycle_content)
+            surfacing = cycle_lines.find_timestamped_values(r"\[MAIN *, *\d+\]surfacing", contains="[MAIN")
             if surfacing :
                 # Get first surfacing after leave surface
                 for surfin in surfacing :
@@ -426,7 +527,7 @@ class Cycle:
         # It's possible that MERMAID physically dive and returned to the surface but there was
         # an error with the .LOG, so that information was not recorded (ex. 25_5B9CF6CF.LOG)
         # Log files may record several bladder fillings during a mission
-        fillb_list = utils.find_timestamped_values(r"\[SURFIN, *\d+\]filling external bladder", self.cycle_content)
+        fillb_list = cycle_lines.find_timestamped_values(r"\[SURFIN, *\d+\]filling external bladder", contains="[SURFIN,")
         for fillb in fillb_list :
             if fillb[1] > self.ascent_start_date :
                 # find first fill after surfacing start
@@ -434,13 +535,13 @@ class Cycle:
                 break
 
         # Find if emergency triggered
-        self.emergency_triggers = utils.find_timestamped_values(r"\]<ERR>TRIGGERED BY (.*)",self.cycle_content)
+        self.emergency_triggers = cycle_lines.find_timestamped_values(r"\]<ERR>TRIGGERED BY (.*)", contains="<ERR>TRIGGERED BY")
         # Find if mermaid reboot occurs
-        self.mermaid_reboots = utils.find_timestamped_values(r"\]\$BOARD",self.cycle_content)
+        self.mermaid_reboots = cycle_lines.find_timestamped_values(r"\]\$BOARD", contains="]$BOARD")
         # Find vitals for cycle
-        self.vitals_vbat = utils.find_timestamped_values(r"Vbat (\d+)mV \(min (\d+)mV\)",self.cycle_content)
-        self.vitals_pext = utils.find_timestamped_values(r"Pext (-?\d+)mbar \(rng (-?\d+)mbar\)",self.cycle_content)
-        self.vitals_pint = utils.find_timestamped_values(r"internal pressure (\d+)Pa",self.cycle_content)
+        self.vitals_vbat_epochs = cycle_lines.find_timestamped_epochs(r"Vbat (\d+)mV \(min (\d+)mV\)", contains="Vbat")
+        self.vitals_pext_epochs = cycle_lines.find_timestamped_epochs(r"Pext (-?\d+)mbar \(rng (-?\d+)mbar\)", contains="Pext")
+        self.vitals_pint_epochs = cycle_lines.find_timestamped_epochs(r"internal pressure (\d+)Pa", contains="internal pressure")
         # Generate the directory name (CycleNB_Date)
         self.directory_name = filename_split[0] + "_" + self.start_date.strftime("%Y%m%d-%Hh%Mm%Ss")
         if self.is_init:
@@ -487,6 +588,47 @@ class Cycle:
     def __len__(self):
         return 1
 
+    def __getstate__(self):
+        # The line table is rebuilt from `cycle_content` when needed rather
+        # than pickled
+        state = self.__dict__.copy()
+        state.pop("cycle_lines", None)
+        return state
+
+    # [value, UTCDateTime] lists of the pressure and vitals readings, as
+    # utils.find_timestamped_values (built from the structured arrays on access)
+    @property
+    def pressure_mbar(self):
+        if self.pressure_mbar_epochs is None:
+            return None
+        return utils.timestamped_values(self.pressure_mbar_epochs)
+
+    @property
+    def vitals_vbat(self):
+        if self.vitals_vbat_epochs is None:
+            return None
+        return utils.timestamped_values(self.vitals_vbat_epochs)
+
+    @property
+    def vitals_pext(self):
+        if self.vitals_pext_epochs is None:
+            return None
+        return utils.timestamped_values(self.vitals_pext_epochs)
+
+    @property
+    def vitals_pint(self):
+        if self.vitals_pint_epochs is None:
+            return None
+        return utils.timestamped_values(self.vitals_pint_epochs)
+
+    def get_cycle_lines(self):
+        '''
+            Return the CycleLines table of the cycle content (built once)
+        '''
+        if self.cycle_lines is None:
+            self.cycle_lines = CycleLines(self.cycle_content)
+        return self.cycle_lines
+
     def write_datetime_cycle(self):
         # Check if file exist
         if self.processed_path :
@@ -582,19 +724,20 @@ class Cycle:
         # Search pressure values
         # DO NOT DO: `('\[PRESS ,\s*\d+\]P\s*(\+?\-?\d+)mbar', self.cycle_content)`
         # because "P.*mbar" is a valid pressure, even if prefixed with "[SURFIN, ..."
-        pressure = utils.find_timestamped_values(r"\]P\s*(\+?\-?\d+)mbar", self.cycle_content)
-        bypass = utils.find_timestamped_values(r"BYPASS.+\].*opening (\d+)", self.cycle_content)
-        valve = utils.find_timestamped_values(r":\[VALVE.+\].*opening f?o?r? ?(\d+)ms", self.cycle_content)
-        pump = utils.find_timestamped_values(r":\[PUMP.+\].*during (\d+)ms", self.cycle_content)
-        mermaid_events = utils.find_timestamped_values(r"\[MRMAID,\d+\] *\d+dbar, *-?\d+degC", self.cycle_content)
+        cycle_lines = self.get_cycle_lines()
+        pressure = cycle_lines.find_timestamped_epochs(r"\]P\s*(\+?\-?\d+)mbar", contains="mbar")
+        bypass = cycle_lines.find_timestamped_epochs(r"BYPASS.+\].*opening (\d+)", contains="BYPASS")
+        valve = cycle_lines.find_timestamped_epochs(r":\[VALVE.+\].*opening f?o?r? ?(\d+)ms", contains="[VALVE")
+        pump = cycle_lines.find_timestamped_epochs(r":\[PUMP.+\].*during (\d+)ms", contains="[PUMP")
+        mermaid_events = cycle_lines.find_timestamped_epochs(r"\[MRMAID,\d+\] *\d+dbar, *-?\d+degC", contains="[MRMAID,")
 
         # Return if there is no data to plot
         if len(pressure) < 1:
             return
 
         # Add pressure values to the graph
-        p_val = [-int(p[0])/100. for p in pressure]
-        p_date = [p[1] for p in pressure]
+        p_val = (-pressure["value"].astype(np.int64)/100.).tolist()
+        p_date = [UTCDateTime(int(e)) for e in pressure["epoch"]]
 
         # Plotly you can implement WebGL with Scattergl() in place of Scatter()
         # for increased speed, improved interactivity, and the ability to plot even more data.
@@ -624,21 +767,21 @@ class Cycle:
         maximum = 0
 
         # Add bypass lines
-        bypass = [bp[1] for bp in bypass]
+        bypass = [UTCDateTime(int(e)) for e in bypass["epoch"]]
         bypass_line = utils.plotly_vertical_shape(bypass,
                                                   ymin=minimum,
                                                   ymax=maximum,
                                                   name="bypass",
                                                   color="blue")
         # Add valve lines
-        valve = [vv[1] for vv in valve]
+        valve = [UTCDateTime(int(e)) for e in valve["epoch"]]
         valve_line = utils.plotly_vertical_shape(valve,
                                                  ymin=minimum,
                                                  ymax=maximum,
                                                  name="valve",
                                                  color="green")
         # Add pump lines
-        pump = [pp[1] for pp in pump]
+        pump = [UTCDateTime(int(e)) for e in pump["epoch"]]
         pump_line = utils.plotly_vertical_shape(pump,
                                                 ymin=minimum,
                                                 ymax=maximum,
@@ -646,7 +789,7 @@ class Cycle:
                                                 color="orange")
 
         # Add mermaid events lines
-        mermaid_events = [pp[1] for pp in mermaid_events]
+        mermaid_events = [UTCDateTime(int(e)) for e in mermaid_events["epoch"]]
         mermaid_events_line = utils.plotly_vertical_shape(mermaid_events,
                                                           ymin=minimum,
                                                           ymax=maximum,
@@ -829,22 +972,19 @@ class Cycle:
         '''Sets `processed_file_name` attr for each event attached to this complete
         dive.
 
-        Removes redundant events, e.g.,
+        Redundant events (identical header and binary data, e.g.,
         20180728T225619.07_5B7739F0.MER.REQ.WLT5, whose data appears twice in
-        07_5B7739F0.MER.
+        07_5B7739F0.MER) were already removed, float-wide, by `events.Events`.
 
-        Appends '1' to 'MER' in redundant file names whose data actually differ,
-        e.g., in the case of '20180728T225619.06_5B773AE6.MER.REQ.WLT5' and
+        Appends '1', '2', ... to 'MER' in redundant file names whose data
+        actually differ, e.g., in the case of
+        '20180728T225619.06_5B773AE6.MER.REQ.WLT5' and
         '20180728T225619.06_5B773AE6.MER1.REQ.WLT5', whose data are both
         contained in 06_5B773AE6.MER and do in fact differ, but whose processed
         filenames are identical because those only display seconds precision
         (and the timing differences between the event dates are on the order of
-        fractional seconds).
-
-        This check for redundancy only considers a single redundant file name
-        appearing twice in any give cycle; if multiple filenames appear
-        twice and/or any one appears three or more times this will error (the
-        fix complicates the code a lot and I've yet to see the need for it...).
+        fractional seconds).  Any number of redundant file names, each
+        appearing any number of times, are renamed so.
 
         Note that setting of attr `processed_file_name` does not imply that valid
         GPS fixes are associated with the events and they therefore may be
@@ -853,61 +993,29 @@ class Cycle:
 
         '''
 
-        names = []
         for event in self.events:
             event.set_processed_file_name()
-            names.append(event.processed_file_name)
 
         # It is acceptable to check for processed filename redundancies on a
         # per-dive basis, as opposed to considering the entire `event.Events`
-        # list, because the same data (meaning that `event.mer_binary_binary`
-        # and `event.mer_binary_header` are equal) requested at a later date
-        # will be transmitted in a different .MER file, e.g., the
-        # `event.mer_binary_name` will be different from the current dive and
-        # thus the `event.processed_file_name` resulting in no name conflict
-
-        redundant_names = [name for name,count in collections.Counter(names).items() if count > 1 and name is not None]
-
-        if not redundant_names:
-            return
-
-        if len(redundant_names) > 1:
-            raise ValueError('Must edit def to handle multiple redundant file names')
+        # list, because the processed file name includes `event.mer_binary_name`,
+        # which differs between .MER files, and the starttime, which ties the
+        # event to this dive
 
-        redundant_index = []
-        for index,name in enumerate(names):
-            if name == redundant_names[0]:
-                redundant_index.append(index)
-
-        if len(redundant_index) > 2:
-            raise ValueError('Must edit def to handle 3+ occurrences of a single redundant file name')
-
-        # Same processed file name  (.sac, .mseed), different data (do not remove from list!):
+        # Same processed file name (.sac, .mseed), different data (do not remove from list!):
         #     '20180728T225619.06_5B773AE6.MER.REQ.WLT5'
-        # Rename second occurrence of redundant PROCESSED file name to:
+        # Rename second (third...) occurrence of redundant PROCESSED file name to:
         #     '20180728T225619.06_5B773AE6.MER1.REQ.WLT5'
-        #
-        # Same file name, redundant data (remove second event from list):
-        #     '20180728T225619.07_5B7739F0.MER.REQ.WLT5'
-
-        if self.events[redundant_index[0]].mer_binary_header ==  \
-           self.events[redundant_index[1]].mer_binary_header and \
-           self.events[redundant_index[0]].mer_binary_binary ==  \
-           self.events[redundant_index[1]].mer_binary_binary:
-
-            # Remove the redundant event from the list of events associated with
-            # this cycle.  This does not delete the events.Event object
-            # itself, which is still referenced elsewhere, including
-            # `dive_logs`, so be careful
-            del self.events[redundant_index[1]]
+        #     ('20180728T225619.06_5B773AE6.MER2.REQ.WLT5'...)
+        occurrences = collections.Counter()
+        for event in self.events:
+            name = event.processed_file_name
+            if name is None:
+                continue
 
-        else:
-            # Rename the event with DIFFERENT data but a redundant processed file
-            # name (e.g., because the filename only has seconds precision, and
-            # the event date may be different by fractional seconds) from
-            # "...MER..." to "...MER1..."
-            self.events[redundant_index[1]].processed_file_name = \
-            self.events[redundant_index[1]].processed_file_name.replace('MER', 'MER1')
+            if occurrences[name] > 0:
+                event.processed_file_name = name.replace('MER', 'MER{:d}'.format(occurrences[name]))
+            occurrences[name] += 1
 
     def compute_station_locations(self, mixed_layer_depth_m, preliminary_location_ok=False):
         '''
@@ -949,13 +1057,13 @@ class Cycle:
         # Find when & where the float reached the surface
         self.ascent_reach_surface_loc =  gps.linear_interpolation(self.gps_after_dive, \
                                                                   self.ascent_reach_surface_date)
-        # Find pressure values
-        pressure_date = [p[1] for p in self.pressure_mbar]
+        # Find pressure values (dates are only built for the readings used below)
+        pressure_epoch = self.pressure_mbar_epochs["epoch"]
 
         # Convert pressure values from mbar to dbar
         # For our purposes it it fine to assume that 1 dbar = 1 m = 100 mbar
         # (NOT 1 m = 101 mbar as stated in MERMAID manual Réf : 452.000.852 Version 00)
-        pressure_dbar = [int(p[0])/100. for p in self.pressure_mbar]
+        pressure_dbar = (self.pressure_mbar_epochs["value"].astype(np.int64)/100.).tolist()
 
         # Determine if using one- or two-layer ocean.
         if max(pressure_dbar) > mixed_layer_depth_m and not self.emergency_triggers:
@@ -970,11 +1078,11 @@ class Cycle:
             while pressure_dbar[i] < mixed_layer_depth_m and i < len(pressure_dbar):
                 i += 1
 
-            descent_date_in_mixed_layer = pressure_date[i]
+            descent_date_in_mixed_layer = UTCDateTime(int(pressure_epoch[i]))
             descent_depth_in_mixed_layer = pressure_dbar[i]
 
             if i > 0:
-                descent_date_in_surface_layer = pressure_date[i-1]
+                descent_date_in_surface_layer = UTCDateTime(int(pressure_epoch[i-1]))
                 descent_depth_in_surface_layer = pressure_dbar[i-1]
             else:
                 # On the descent: we have pressure readings in the mixed layer but not in the
@@ -1003,11 +1111,11 @@ class Cycle:
             while pressure_dbar[i] < mixed_layer_depth_m and i > 0:
                 i -= 1
 
-            ascent_date_in_mixed_layer = pressure_date[i]
+            ascent_date_in_mixed_layer = UTCDateTime(int(pressure_epoch[i]))
             ascent_depth_in_mixed_layer = pressure_dbar[i]
 
             if i < len(pressure_dbar)-1:
-                ascent_date_in_surface_layer = pressure_date[i+1]
+                ascent_date_in_surface_layer = UTCDateTime(int(pressure_epoch[i+1]))
                 ascent_depth_in_surface_layer = pressure_dbar[i+1]
             else:
                 # On the ascent: we have pressure readings in the mixed layer but not the surface
@@ -1094,13 +1202,30 @@ class Cycle:
             for profile in self.profilesRBR:
                 profile.write_csv(self.processed_path)
 
-    def write_events_sac(self):
+    def write_events_streams(self, formats):
         for event in self.events:
-            event.write_sac(self.processed_path)
-
-    def write_events_mseed(self):
+            event.write_stream(self.processed_path, formats)
+
+    def set_events_processed_data(self):
+        # Invert the wavelet transforms of the events of this cycle together, in
+        # batches, only once their output files are about to be written, so that
+        # the seismograms (and the .MER binary data they are inverted from) of a
+        # single cycle are held in memory at a time (the binary data are read
+        # when inverted, and dropped once inverted)
+        inverted_data = events.Events.invert_events(self.events)
+        for i, event in enumerate(self.events):
+            event.set_processed_data(inverted_data.get(i))
+            event.unload_mer_binary()
+
+    def release_events_data(self):
+        # Drop the seismograms (and the Stanford PSD percentiles, which are
+        # views of them) of the events once they are plotted and written, so
+        # that they do not accumulate in memory over all cycles (nor are they
+        # pickled)
         for event in self.events:
-            event.write_mseed(self.processed_path)
+            event.processed_data = None
+            event.stanford_psd_perc50 = None
+            event.stanford_psd_perc95 = None
 
     def write_events_mhpsd(self, creation_datestr=None):
         for event in self.events:
@@ -1217,15 +1342,21 @@ class Cycle:
 
 
 # Create dives object
-def get_cycles(path, events, profilesS41, profilesS61, profilesRBR):
-    # Get the list of cycle files
-    cycle_names = glob.glob(path + "*.CYCLE")
-    cycle_names = [os.path.basename(x) for x in cycle_names]
-    cycle_names.sort()
+def get_cycles(path, events, profilesS41, profilesS61, profilesRBR, begin_nb=0, cycle_records=None):
+    # Get the (cycle_name, content) records of the cycles handed over in memory
+    # by the cycle builder (see preprocess.iter_cycles), or else the list of
+    # cycle files (whose content is read by Cycle)
+    if cycle_records is None:
+        cycle_names = glob.glob(path + "*.CYCLE")
+        cycle_records = [(os.path.basename(x), None) for x in cycle_names]
+    # Skip those numbered below `begin_nb`, e.g., which were reused from a
+    # previous run
+    cycle_records = [x for x in cycle_records if int(x[0].split("_")[0], 10) >= begin_nb]
+    cycle_records.sort(key=lambda x: x[0])
     # Create Cycle objects
     cycles = []
-    for cycle_name in cycle_names:
-        c = Cycle(path, cycle_name, events, profilesS41, profilesS61, profilesRBR)
+    for cycle_name, cycle_content in cycle_records:
+        c = Cycle(path, cycle_name, events, profilesS41, profilesS61, profilesRBR, cycle_content)
         if c.cycle_content:
             cycles.append(c)
     return cycles
@@ -15,7 +15,11 @@ import sys
 import os
 import re
 import glob
-import subprocess
+import copy
+import mmap
+import hashlib
+import functools
+import pickle
 import numpy as np
 import matplotlib
 
@@ -37,12 +41,217 @@ import gps
 import sys
 import setup
 import utils
+import icdf24
+import manifest
 import mermaidpsd
 import time
 
 # Get current version number.
 version = setup.get_version()
 
+# Name of the index of the .MER events of a float (written in processed/<float>/)
+MER_INDEX_NAME = "mer_index.pickle"
+
+# Format of that index, to be incremented whenever the indexed `Event` objects
+# gain or lose attributes
+MER_INDEX_FORMAT = 2
+
+# ObsPy formats of the seismogram files written by `Event.write_stream`, by file
+# extension
+STREAM_FORMATS = {"sac": "SAC", "mseed": "MSEED"}
+
+# Cache of inverted seismograms (an `inversion_cache.InversionCache`, set by
+# main.py), or None to always invert the wavelet coefficients
+inversion_cache = None
+
+def read_mer_index(path):
+    '''Return the .MER event index written in `path` by a previous run (see
+    `Events`), or an empty dict if there is none, it is unreadable, or it was
+    written by another version of automaid (or in another format)
+
+    The index maps the name of each .MER file to a dict of its 'size', 'sha1',
+    'mer_environment', 'gps_info' (GPS fixes of its environment) and 'events'
+    (its valid events, as parsed from their headers, with the offsets of their
+    header and binary data but not the data themselves).
+
+    '''
+    mer_index_path = os.path.join(path, MER_INDEX_NAME)
+    if not os.path.exists(mer_index_path):
+        return {}
+
+    try:
+        with open(mer_index_path, "rb") as f:
+            content = pickle.load(f)
+    except Exception:
+        return {}
+
+    if content.get("version") != version or content.get("format") != MER_INDEX_FORMAT:
+        return {}
+
+    return content.get("files", {})
+
+def write_mer_index(path, mer_index):
+    '''Write .MER event index `mer_index` in `path` (via a temporary file)
+
+    '''
+    mer_index_path = os.path.join(path, MER_INDEX_NAME)
+    with open(mer_index_path + ".tmp", "wb") as f:
+        pickle.dump({"version": version, "format": MER_INDEX_FORMAT, "files": mer_index}, f)
+    os.replace(mer_index_path + ".tmp", mer_index_path)
+
+def index_mer_events(content):
+    '''Return the (header offset, header length, binary offset, binary length)
+    of the complete </EVENT> blocks of .MER file `content` (bytes or mmap)
+
+    Equivalent to splitting the content after the last </PARAMETERS> into
+    <EVENT> blocks, then each block into its header (before "<DATA>\\n\\r")
+    and binary data (after it, until "\\n\\r\\t</DATA>"), without copying
+    any of them.
+
+    '''
+    locations = []
+    data_begin = b"<DATA>\x0A\x0D"
+    data_end = b"\x0A\x0D\x09</DATA>"
+
+    parameters = content.rfind(b"</PARAMETERS>")
+    position = 0 if parameters < 0 else parameters + len(b"</PARAMETERS>")
+    position = content.find(b"<EVENT>", position)
+    while position >= 0:
+        block_begin = position + len(b"<EVENT>")
+        position = content.find(b"<EVENT>", block_begin)
+        block_end = len(content) if position < 0 else position
+
+        # Ensure every event block is complete(ly transmitted)
+        if content[block_begin:block_begin+14] != b"\n\r\t<INFO DATE=" \
+           or content[max(block_begin, block_end-22):block_end] != b"\n\r\t</DATA>\n\r</EVENT>\n\r":
+            continue
+
+        # The header of this specific </EVENT> block (NOT the </ENVIRONMENT> of
+        # the same .MER file, which may be unrelated (different time))
+        header_end = content.find(data_begin, block_begin, block_end)
+        if header_end < 0:
+            continue
+
+        # The actual binary data contained in this </EVENT> block (the seismogram)
+        # N.B:
+        # "\x0A" is "\n": True
+        # "\x0D" is "\r": True
+        # "\x09" is "\t": True
+        # https://docs.python.org/2/reference/lexical_analysis.html#string-and-bytes-literals
+        binary_begin = header_end + len(data_begin)
+        segment_end = content.find(data_begin, binary_begin, block_end)
+        if segment_end < 0:
+            segment_end = block_end
+        binary_end = content.find(data_end, binary_begin, segment_end)
+        if binary_end < 0:
+            binary_end = segment_end
+
+        locations.append((block_begin, header_end - block_begin, binary_begin, binary_end - binary_begin))
+
+    return locations
+
+def hash_event(mer_binary_header, mer_binary_binary):
+    '''Return the SHA-1 hexdigest of the header and binary data (bytes) of an
+    </EVENT> block, which identifies its content regardless of the .MER file
+    it was transmitted in
+
+    '''
+    sha1 = hashlib.sha1(mer_binary_header)
+    sha1.update(mer_binary_binary)
+    return sha1.hexdigest()
+
+def date_key(date):
+    '''Return the int64-able key by which UTCDateTime compares `date` (at its
+    default precision): Unix Epoch time in nanoseconds rounded to microseconds
+
+    '''
+    if not isinstance(date, UTCDateTime):
+        date = UTCDateTime(date)
+    return round(date.ns, -3)
+
+# KEY=VALUE pairs of .MER event headers and environments, e.g., " STAGES=5" (a
+# key starts the content, or follows a whitespace or the "<" of a tag), and the
+# tags that contain them, e.g., "<FORMAT ... STAGES=5 />"
+KEY_VALUE_REGEX = re.compile(r"(?:^|[\s<])([^\s=<>]+)=(\S*)")
+TAG_REGEX = re.compile(r"<(\w+)([^<>]*)>")
+
+# Expected formats of the values (matched at their start)
+INT_VALUE_REGEX = re.compile(r"(-?\d+)")
+UINT_VALUE_REGEX = re.compile(r"(\d+)")
+FLOAT_VALUE_REGEX = re.compile(r"(\d+\.\d+)")
+WORD_VALUE_REGEX = re.compile(r"(\w+)")
+DATE_VALUE_REGEX = re.compile(r"(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})")
+DATE_US_VALUE_REGEX = re.compile(r"(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d{6})")
+FNAME_VALUE_REGEX = re.compile(r"(\d{4}-\d{2}-\d{2}T\d{2}_\d{2}_\d{2})")
+FNAME_US_VALUE_REGEX = re.compile(r"\d{4}-\d{2}-\d{2}T\d{2}_\d{2}_\d{2}\.?(\d{6}?)")
+
+def parse_key_values(content):
+    '''Return the dict of the KEY=VALUE pairs of .MER event header or
+    environment `content` (bytes or str), tokenized in one pass
+
+    Only the first value of a KEY repeated in `content` is kept (e.g., that of
+    the first <GPSINFO DATE=...> of an environment).
+
+    '''
+    if isinstance(content, bytes):
+        content = content.decode("utf-8", "replace")
+
+    # Reversed, so that the first value of a key overwrites the others
+    return dict(reversed(KEY_VALUE_REGEX.findall(content)))
+
+def find_value(key_values, key, value_regex):
+    '''Return the first group of the match of `value_regex` at the start of the
+    value of `key` in `key_values` (see `parse_key_values`), or None
+
+    '''
+    value = key_values.get(key)
+    if value is None:
+        return None
+
+    catch = value_regex.match(value)
+    return catch.group(1) if catch else None
+
+def find_required_value(key_values, key, value_regex):
+    '''Return the value of `key` in `key_values`, as `find_value`, but raise a
+    ValueError if it is missing or malformed (a value that cannot be done
+    without)
+
+    '''
+    value = find_value(key_values, key, value_regex)
+    if value is None:
+        raise ValueError("{:s}= missing or malformed in .MER header or environment".format(key))
+
+    return value
+
+@functools.lru_cache(maxsize=1024)
+def parse_environment(mer_environment):
+    '''Return the dict of the values of .MER environment `mer_environment`
+    used to process events (str, or None if not found)
+
+    Memoised: the many events that share an environment only parse it once.
+
+    '''
+    key_values = parse_key_values(mer_environment)
+
+    # The sampling frequency is that of the <TRUE_SAMPLE_FREQ FS_Hz=... /> tag
+    sample_freq = {}
+    for tag, attributes in TAG_REGEX.findall(mer_environment):
+        if tag == "TRUE_SAMPLE_FREQ":
+            sample_freq = parse_key_values(attributes)
+            break
+
+    return {
+        "DURATION_h": find_value(key_values, "DURATION_h", UINT_VALUE_REGEX),
+        "PROCESS_PERIOD_h": find_value(key_values, "PROCESS_PERIOD_h", UINT_VALUE_REGEX),
+        "WINDOW_LEN": find_value(key_values, "WINDOW_LEN", UINT_VALUE_REGEX),
+        "WINDOW_TYPE": find_value(key_values, "WINDOW_TYPE", WORD_VALUE_REGEX),
+        "OVERLAP_PERCENT": find_value(key_values, "OVERLAP_PERCENT", UINT_VALUE_REGEX),
+        "dB_OFFSET": find_value(key_values, "dB_OFFSET", UINT_VALUE_REGEX),
+        "FS_Hz": find_value(sample_freq, "FS_Hz", FLOAT_VALUE_REGEX),
+        "NORMALIZED": find_value(key_values, "NORMALIZED", UINT_VALUE_REGEX),
+        "EDGES_CORRECTION": find_value(key_values, "EDGES_CORRECTION", UINT_VALUE_REGEX)
+    }
+
 class Events:
     '''The Events (plural) class references a SINGLE .MER file, and all events that
      live within it, which may be associated with the environments of multiple
@@ -52,12 +261,27 @@ class Events:
 
     '''
 
-    def __init__(self, base_path=None, mer_name=None):
+    def __init__(self, base_path=None, mer_name=None, mer_index=None, mer_hashes=None):
+        '''
+        Keyword arguments:
+        base_path -- directory of the .MER files
+        mer_name -- single .MER file to read (default None: all .MER files)
+        mer_index -- .MER event index of a previous run (see `read_mer_index`):
+                     unchanged .MER files are loaded from it rather than parsed
+                     (default None: parse all .MER files and build no index)
+        mer_hashes -- SHA-1 hexdigests of the .MER files by file name, if
+                      already known (e.g., from the server manifest)
+
+        '''
         self.mer_name = mer_name
         self.base_path = base_path
         self.events = []
         self.gps_info = []
         self.__version__ = version
+        # .MER event index of this run (written with `write_mer_index`)
+        self.mer_index = {}
+        if mer_hashes is None:
+            mer_hashes = {}
 
         # If just a base path to (e.g., a server directory) is passed, load all
         # .MER files contained there; otherwise read a single input file
@@ -70,59 +294,128 @@ class Events:
             # This .MER file name
             mer_binary_name = mer_file.split("/")[-1]
 
-            # The </EVENT> binary blocks contained in this .MER file
-            with open(mer_file, "rb") as f:
-                content = f.read()
-
-            catch = re.findall(b"<ENVIRONMENT>.+</PARAMETERS>", content, re.DOTALL)
-            if catch :
-                mer_environment = catch[0].decode("utf-8","replace")
-                self.gps_info += gps.get_gps_from_mer_environment(mer_binary_name,mer_environment)
-
-            events = content.split(b'</PARAMETERS>')[-1].split(b'<EVENT>')[1:]
-            for event in events:
-                # Ensure every event block is complete(ly transmitted)
-                if event[0:14] != b"\n\r\t<INFO DATE=" or event[-22:] != b"\n\r\t</DATA>\n\r</EVENT>\n\r":
+            # Load the events and GPS fixes of the .MER files unchanged since
+            # the last run from its index (copies, so that the index itself is
+            # never altered by the processing of the events)
+            mer_sha1 = None
+            if mer_index is not None:
+                mer_size = os.path.getsize(mer_file)
+                mer_sha1 = mer_hashes.get(mer_binary_name) or manifest.hash_file(mer_file)
+                entry = mer_index.get(mer_binary_name)
+                if entry is not None and entry["size"] == mer_size and entry["sha1"] == mer_sha1:
+                    mer_environment = entry["mer_environment"]
+                    self.gps_info += [copy.copy(fix) for fix in entry["gps_info"]]
+                    for evt in entry["events"]:
+                        evt = copy.copy(evt)
+                        evt.mer_binary_location = (mer_file,) + evt.mer_binary_location[1:]
+                        self.events.append(evt)
+                    self.mer_index[mer_binary_name] = entry
                     continue
-                # The header of this specific </EVENT> block (NOT the </ENVIRONMENT> of
-                # the same .MER file, which may be unrelated (different time))
-                mer_binary_header = event.split(b"<DATA>\x0A\x0D")[0]
-
-                # The actual binary data contained in this </EVENT> block (the seismogram)
-                # N.B:
-                # "\x0A" is "\n": True
-                # "\x0D" is "\r": True
-                # "\x09" is "\t": True
-                # https://docs.python.org/2/reference/lexical_analysis.html#string-and-bytes-literals
-                mer_binary_binary = event.split(b"<DATA>\x0A\x0D")[1].split(b"\x0A\x0D\x09</DATA>")[0]
-
-                # The double split above is not foolproof; if the final data
-                # block in the .MER file ends without </DATA> (i.e., the file
-                # was not completely transmitted), the object 'binary' will just
-                # return everything to the end of the file -- verify that the we
-                # actually have the expected number of bytes (apparently len()
-                # returns the byte-length of a string, though I am not super
-                # happy with this solution because I would prefer to know the
-                # specific encoding used for event binary...)
-                if b" ROUNDS=" not in mer_binary_header:
-                    actual_binary_length = len(mer_binary_binary)
-                    bytes_per_sample = int(re.search(b'BYTES_PER_SAMPLE=(\d+)', mer_binary_header).group(1))
-                    num_samples = int(re.search(b'LENGTH=(\d+)', mer_binary_header).group(1))
-                    expected_binary_length = bytes_per_sample * num_samples
-                    if actual_binary_length != expected_binary_length:
-                        continue
-
-                evt = Event(mer_binary_name, mer_binary_header, mer_binary_binary,mer_environment)
-
-                # Use weak catchall for obj init issues (e.g., formatting
-                # abnormalities in the .MER file)
-                if evt.info_date:
-                    self.events.append(evt)
+            file_environment = None
+            file_gps_info = []
+            file_events = []
+
+            # The </EVENT> binary blocks contained in this .MER file, memory-mapped
+            # only while they are indexed: events only keep the offsets of their
+            # header and binary data, read when they are processed (see
+            # `Event.load_mer_binary`)
+            if os.path.getsize(mer_file) == 0:
+                continue
+            with open(mer_file, "rb") as f, \
+                 mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as content:
+
+                catch = re.search(b"<ENVIRONMENT>.+</PARAMETERS>", content, re.DOTALL)
+                if catch :
+                    mer_environment = catch.group(0).decode("utf-8","replace")
+                    file_environment = mer_environment
+                    file_gps_info = gps.get_gps_from_mer_environment(mer_binary_name,mer_environment)
+                    self.gps_info += file_gps_info
+
+                for location in index_mer_events(content):
+                    header_offset, header_length, binary_offset, binary_length = location
+                    mer_binary_header = content[header_offset:header_offset+header_length]
+
+                    # The double split of an </EVENT> block into header and
+                    # binary data (see `index_mer_events`) is not foolproof; if
+                    # the final data block in the .MER file ends without </DATA>
+                    # (i.e., the file was not completely transmitted), the
+                    # binary data just extend to the end of the file -- verify
+                    # that the we actually have the expected number of bytes
+                    # (apparently len() returns the byte-length of a string,
+                    # though I am not super happy with this solution because I
+                    # would prefer to know the specific encoding used for event
+                    # binary...)
+                    header = parse_key_values(mer_binary_header)
+                    if "ROUNDS" not in header:
+                        actual_binary_length = binary_length
+                        bytes_per_sample = int(find_required_value(header, "BYTES_PER_SAMPLE", UINT_VALUE_REGEX))
+                        num_samples = int(find_required_value(header, "LENGTH", UINT_VALUE_REGEX))
+                        expected_binary_length = bytes_per_sample * num_samples
+                        if actual_binary_length != expected_binary_length:
+                            continue
+
+                    evt = Event(mer_binary_name, mer_binary_header, None, mer_environment,
+                                mer_binary_location=(mer_file,) + location,
+                                mer_binary_header_key_values=header)
+
+                    # Use weak catchall for obj init issues (e.g., formatting
+                    # abnormalities in the .MER file)
+                    if evt.info_date:
+                        binary_offset, binary_length = location[2:]
+                        evt.mer_binary_hash = hash_event(mer_binary_header,
+                                                         content[binary_offset:binary_offset+binary_length])
+                        self.events.append(evt)
+                        file_events.append(evt)
+
+            # Index the .MER file, unless it has no environment of its own (its
+            # events then take that of the previous .MER file read)
+            if mer_sha1 is not None and file_environment is not None:
+                self.mer_index[mer_binary_name] = {
+                    "size": mer_size,
+                    "sha1": mer_sha1,
+                    "mer_environment": file_environment,
+                    "gps_info": [copy.copy(fix) for fix in file_gps_info],
+                    "events": [copy.copy(evt) for evt in file_events]
+                }
+
+        # Remove redundant events, whose header and binary data are identical to
+        # those of another event of this float, e.g., requested data
+        # re-transmitted in a later .MER file after an "<ERR>upload", or
+        # repeated in the same .MER file (20180728T225619.07_5B7739F0.MER.REQ.WLT5
+        # appears twice in 07_5B7739F0.MER); only the first occurrence, by .MER
+        # file name (i.e., transmission date) and then position in that file,
+        # is kept, so that the same data are never inverted, plotted or written
+        # twice
+        self.events.sort(key=lambda x: (x.mer_binary_name, x.mer_binary_location[1]))
+        unique_events = {}
+        for evt in self.events:
+            unique_events.setdefault(evt.mer_binary_hash, evt)
+        self.events = list(unique_events.values())
 
         # Sort by events by reported "INFO DATE", which may be 1970 if the clock
         # was reset (the info date has not been corrected for clockdrift)
         self.events.sort(key=lambda x: x.info_date)
 
+        # Index the event and GPS dates for the range queries below
+        self.index_dates()
+
+    def index_dates(self):
+        '''Build the sorted arrays of event (info) and GPS dates queried by
+        `get_events_between` and `get_gps_between` (to be called again if
+        `self.events` or `self.gps_info` are modified)
+
+        Dates are stored as int64 Unix Epoch times in nanoseconds, rounded to
+        microseconds as UTCDateTime does when comparing dates (at its default
+        precision), so that searching them is equivalent to comparing the
+        dates themselves
+
+        '''
+        self.events_ns = np.array([date_key(event.info_date) for event in self.events], dtype=np.int64)
+
+        gps_ns = np.array([date_key(gps.date) for gps in self.gps_info], dtype=np.int64)
+        self.gps_order = np.argsort(gps_ns, kind="stable")
+        self.gps_ns = gps_ns[self.gps_order]
+
     def get_events_between(self, begin, end):
         # The dates are not yet corrected for clockdrift, which can be years if
         # the float reset to UNIX time 0 (01-Jan-1970).  So this def actually
@@ -139,18 +432,73 @@ class Events:
         #   </PARAMETERS><EVENT>
         #   <INFO DATE=1970-01-03T10:18:13.513763 ... />
         # "
-        catched_events = []
-        for event in self.events:
-            if begin < event.info_date < end:
-                catched_events.append(event)
-        return sorted(catched_events, key=lambda x: x.info_date)
+        #
+        # Events strictly between `begin` and `end`, sorted by info date
+        # (`self.events` is already)
+        try:
+            first = np.searchsorted(self.events_ns, date_key(begin), side="right")
+            last = np.searchsorted(self.events_ns, date_key(end), side="left")
+        except TypeError:
+            # Not a date (e.g., None): no event compares as between
+            return []
+        return self.events[first:last]
 
     def get_gps_between(self, begin, end):
-        catched_gps = []
-        for gps in self.gps_info:
-            if begin < gps.date < end:
-                catched_gps.append(gps)
-        return sorted(catched_gps, key=lambda x: x.date)
+        # GPS fixes strictly between `begin` and `end`, sorted by date (stable)
+        try:
+            first = np.searchsorted(self.gps_ns, date_key(begin), side="right")
+            last = np.searchsorted(self.gps_ns, date_key(end), side="left")
+        except TypeError:
+            return []
+        return [self.gps_info[i] for i in self.gps_order[first:last]]
+    @staticmethod
+    def invert_events(event_list):
+        '''Invert the wavelet coefficients of the "WLT?" events of `event_list`,
+        whose environment must be set, in batches of events sharing the same
+        (scales, normalized, edges_correction) flavor (see `icdf24.icdf24_batch`)
+
+        Returns a dict of the inverted data by index in `event_list`, to be passed
+        to `Event.set_processed_data`; events not inverted here (Stanford PSD, RAW
+        and those of invalid size) are left to `Event.set_processed_data` alone.
+
+        Data already in the `inversion_cache` are read from it rather than
+        inverted, and newly-inverted data are added to it.  The binary data of
+        lazily-read events are read if they are not loaded yet (see
+        `Event.load_mer_binary`).
+
+        '''
+        inverted_data = {}
+        indices_by_flavor = {}
+        keys = {}
+        for i, event in enumerate(event_list):
+            if event.is_stanford_event or event.scales == "-1":
+                continue
+
+            event.load_mer_binary()
+            event.set_wavelet_flavor()
+            if not icdf24.is_valid_size(len(event.mer_binary_binary) // 4, int(event.scales)):
+                continue
+
+            flavor = (event.scales, event.normalized, event.edges_correction)
+            if inversion_cache is not None:
+                keys[i] = inversion_cache.get_key(event.mer_binary_binary, *flavor)
+                data = inversion_cache.load(keys[i])
+                if data is not None:
+                    inverted_data[i] = data
+                    continue
+
+            indices_by_flavor.setdefault(flavor, []).append(i)
+
+        for (scales, normalized, edges_correction), indices in indices_by_flavor.items():
+            signals = icdf24.icdf24_batch([event_list[i].mer_binary_binary for i in indices],
+                                          scales, normalized, edges_correction)
+            inverted_data.update(zip(indices, signals))
+            if inversion_cache is not None:
+                for i, signal in zip(indices, signals):
+                    inversion_cache.save(keys[i], signal)
+
+        return inverted_data
+
     # def __repr__(self):
     #     return "Events('{}', '{}')".format(self.base_path, self.mer_name)
 
@@ -167,11 +515,22 @@ class Event:
 
     '''
 
-    def __init__(self, mer_binary_name=None, mer_binary_header=None, mer_binary_binary=None, default_mer_environment=None):
+    def __init__(self, mer_binary_name=None, mer_binary_header=None, mer_binary_binary=None, default_mer_environment=None,
+                 mer_binary_location=None, mer_binary_header_key_values=None):
         self.mer_binary_name = mer_binary_name
         self.mer_binary_header = mer_binary_header
         self.mer_binary_binary = mer_binary_binary
         self.default_mer_environment = default_mer_environment
+        # (.MER file path, header offset, header length, binary offset, binary
+        # length) of the header and binary data when they are read lazily
+        self.mer_binary_location = mer_binary_location
+        # Whether `mer_binary_binary` holds the binary data of this event: False
+        # for lazily-read events until `load_mer_binary` (and again after
+        # `unload_mer_binary`, e.g., in the float pickle), whereas an event
+        # whose binary data are loaded but empty has an empty `mer_binary_binary`
+        self.mer_binary_loaded = mer_binary_binary is not None
+        # SHA-1 of the header and binary data, set by `Events` (see `hash_event`)
+        self.mer_binary_hash = None
         self.__version__ = version
 
         self.kstnm = None
@@ -180,7 +539,11 @@ class Event:
         self.mer_environment_name = None
         self.mer_environment = None
 
+        # Only set while the outputs of the cycle of this event are written
+        # (see `cycles.Cycle.set_events_processed_data`), None otherwise
         self.processed_data = None
+        self.processed_data_max = None
+        self.processed_data_min = None
         self.measured_fs = None
         self.decimated_fs = None
         self.trig = None
@@ -223,11 +586,18 @@ class Event:
 
         print("{} (binary)".format(self.mer_binary_name))
 
-        if len(re.findall(b" ROUNDS=(-?\d+)", self.mer_binary_header)) > 0 :
+        # Tokenize the header once (KEY=VALUE pairs), unless already done (see
+        # `parse_key_values`)
+        header = mer_binary_header_key_values
+        if header is None:
+            header = parse_key_values(self.mer_binary_header)
+
+        stanford_rounds = find_value(header, "ROUNDS", INT_VALUE_REGEX)
+        if stanford_rounds is not None:
             self.is_stanford_event = True
-            self.stanford_rounds = re.findall(b" ROUNDS=(-?\d+)", self.mer_binary_header)[0]
-            date = re.findall(b" DATE=(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d{6})", mer_binary_header, re.DOTALL)
-            self.info_date = UTCDateTime.strptime(date[0].decode("utf-8","replace"), "%Y-%m-%dT%H:%M:%S.%f")
+            self.stanford_rounds = stanford_rounds.encode("utf-8")
+            date = find_required_value(header, "DATE", DATE_US_VALUE_REGEX)
+            self.info_date = UTCDateTime.strptime(date, "%Y-%m-%dT%H:%M:%S.%f")
             self.is_requested = False
             #if len(re.findall("FNAME=(\d{4}-\d{2}-\d{2}T\d{2}_\d{2}_\d{2}\.\d{6})", self.header))  0 :
             #self.requested = True
@@ -236,17 +606,17 @@ class Event:
             ## REQUIRES REFACTOR to add `.is_buffer` (raw buffer data/no time correction)
 
             self.is_stanford_event = False
-            self.scales = re.findall(b" STAGES=(-?\d+)", self.mer_binary_header)[0].decode("utf-8","replace")
-            catch_trig = re.findall(b" TRIG=(\d+)", self.mer_binary_header)
-            if len(catch_trig) > 0:
+            self.scales = find_required_value(header, "STAGES", INT_VALUE_REGEX)
+            catch_trig = find_value(header, "TRIG", UINT_VALUE_REGEX)
+            if catch_trig is not None:
                 # Event detected with STA/LTA algorithm
                 self.is_requested = False
-                self.trig = int(catch_trig[0])
+                self.trig = int(catch_trig)
 
                 # Sometimes "INFO DATE" is transferred with the incorrect precision,
                 # e.g., in 0039_5E71459C.MER, which is missing fractional seconds
                 # ("INFO DATE=2020-03-16T01:06:42")
-                date = re.findall(b" DATE=(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d{6})", mer_binary_header, re.DOTALL)
+                date = find_required_value(header, "DATE", DATE_US_VALUE_REGEX)
                 if not date:
                     return
 
@@ -263,19 +633,56 @@ class Event:
                 # (not mbar, like other pressures in the .LOG)
                 # We assume 1 dbar = 1 m = 100 mbar
                 # (NOT 1 m = 101 mbar as stated in MERMAID manual Réf : 452.000.852 Version 00)
-                self.pressure_dbar = int(re.findall(b" PRESSURE=(-?\d+)", self.mer_binary_header)[0])
+                self.pressure_dbar = int(find_required_value(header, "PRESSURE", INT_VALUE_REGEX))
                 self.pressure_mbar = self.pressure_dbar * 100
-                self.info_date = UTCDateTime.strptime(date[0].decode("utf-8","replace"), "%Y-%m-%dT%H:%M:%S.%f")
+                self.info_date = UTCDateTime.strptime(date, "%Y-%m-%dT%H:%M:%S.%f")
                 self.depth = self.pressure_dbar # ~= meters
-                self.temperature = int(re.findall(b" TEMPERATURE=(-?\d+)", self.mer_binary_header)[0])
-                self.criterion = float(re.findall(b" CRITERION=(\d+\.\d+)", self.mer_binary_header)[0])
-                self.snr = float(re.findall(b" SNR=(\d+\.\d+)", self.mer_binary_header)[0])
+                self.temperature = int(find_required_value(header, "TEMPERATURE", INT_VALUE_REGEX))
+                self.criterion = float(find_required_value(header, "CRITERION", FLOAT_VALUE_REGEX))
+                self.snr = float(find_required_value(header, "SNR", FLOAT_VALUE_REGEX))
 
             else:
                 # Event requested by user
                 self.is_requested = True
-                date = re.findall(b" DATE=(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})", mer_binary_header, re.DOTALL)
-                self.info_date = UTCDateTime.strptime(date[0].decode("utf-8","replace"), "%Y-%m-%dT%H:%M:%S")
+                date = find_required_value(header, "DATE", DATE_VALUE_REGEX)
+                self.info_date = UTCDateTime.strptime(date, "%Y-%m-%dT%H:%M:%S")
+
+        # Only keep the header of lazily-read events once it is loaded again
+        if self.mer_binary_location is not None:
+            self.mer_binary_header = None
+
+    def load_mer_binary(self, header_only=False):
+        '''Read the header and binary data (or only the header, if `header_only`)
+        of this event from its .MER file, if they were not passed at
+        initialization (see `Events`) and are not loaded yet
+
+        '''
+        if self.mer_binary_location is None or self.mer_binary_loaded:
+            return
+
+        mer_file, header_offset, header_length, binary_offset, binary_length = self.mer_binary_location
+        with open(mer_file, "rb") as f:
+            f.seek(header_offset)
+            self.mer_binary_header = f.read(header_length)
+            if header_only:
+                return
+
+            f.seek(binary_offset)
+            self.mer_binary_binary = f.read(binary_length)
+        self.mer_binary_loaded = True
+
+    def unload_mer_binary(self):
+        '''Drop the header and binary data of this event if they may be read again
+        from its .MER file (see `load_mer_binary`), so that they are neither
+        kept in memory nor pickled
+
+        '''
+        if self.mer_binary_location is None:
+            return
+
+        self.mer_binary_header = None
+        self.mer_binary_binary = None
+        self.mer_binary_loaded = False
 
     def set_kstnm_kinst(self, kstnm=None, kinst=None):
         '''Sets `kstnm` and `kinst` attrs using those station and instrument names
@@ -292,47 +699,27 @@ class Event:
 
         # Shouldn't these attrs remain `None` instead of `""` if not a
         # Stanford float?
-        duration = re.findall("DURATION_h=(\d+)", self.mer_environment)
-        if len(duration) > 0:
-            self.stanford_duration = duration[0]
+        environment = parse_environment(self.mer_environment)
+        if environment["DURATION_h"] is not None:
+            self.stanford_duration = environment["DURATION_h"]
+            self.stanford_period = environment["PROCESS_PERIOD_h"]
+            self.stanford_win_len = environment["WINDOW_LEN"]
+            self.stanford_win_type = environment["WINDOW_TYPE"]
+            self.stanford_overlap = environment["OVERLAP_PERCENT"]
+            self.stanford_db_offset = environment["dB_OFFSET"]
         else :
             self.stanford_duration = ""
-
-        period = re.findall("PROCESS_PERIOD_h=(\d+)", self.mer_environment)
-        if len(duration) > 0:
-            self.stanford_period = period[0]
-        else :
             self.stanford_period = ""
-
-        win_len = re.findall("WINDOW_LEN=(\d+)", self.mer_environment)
-        if len(duration) > 0:
-            self.stanford_win_len = win_len[0]
-        else :
             self.stanford_win_len = ""
-
-        win_type = re.findall("WINDOW_TYPE=(\w+)", self.mer_environment)
-        if len(duration) > 0:
-            self.stanford_win_type = win_type[0]
-        else :
             self.stanford_win_type = ""
-
-        overlap = re.findall("OVERLAP_PERCENT=(\d+)", self.mer_environment)
-        if len(duration) > 0:
-            self.stanford_overlap = overlap[0]
-        else :
             self.stanford_overlap = ""
-
-        db_offset = re.findall("dB_OFFSET=(\d+)", self.mer_environment)
-        if len(duration) > 0:
-            self.stanford_db_offset = db_offset[0]
-        else :
             self.stanford_db_offset = ""
 
     def find_measured_sampling_frequency(self):
         # Get the frequency recorded in the .MER environment header
-        fs_catch = re.findall("TRUE_SAMPLE_FREQ FS_Hz=(\d+\.\d+)", self.mer_environment)
+        fs_catch = parse_environment(self.mer_environment)["FS_Hz"]
         if fs_catch:
-            self.measured_fs = float(fs_catch[0])
+            self.measured_fs = float(fs_catch)
         else:
             return
 
@@ -382,15 +769,16 @@ class Event:
             # milliseconds could be introduced in the date of the requested
             # signal (and the error would be of several tenths of seconds by
             # considering the sampling frequency exactly equal to 40Hz)."
-            rec_file_date = re.findall(b"FNAME=(\d{4}-\d{2}-\d{2}T\d{2}_\d{2}_\d{2})", self.mer_binary_header)
-            rec_file_date = UTCDateTime.strptime(rec_file_date[0].decode("utf-8","replace"), "%Y-%m-%dT%H_%M_%S")
+            header = parse_key_values(self.mer_binary_header)
+            rec_file_date = find_required_value(header, "FNAME", FNAME_VALUE_REGEX)
+            rec_file_date = UTCDateTime.strptime(rec_file_date, "%Y-%m-%dT%H_%M_%S")
 
-            rec_file_ms = re.findall(b"FNAME=\d{4}-\d{2}-\d{2}T\d{2}_\d{2}_\d{2}\.?(\d{6}?)", self.mer_binary_header)
-            if len(rec_file_ms) > 0:
-                rec_file_date += float("0." + rec_file_ms[0].decode("utf-8","replace"))
+            rec_file_ms = find_value(header, "FNAME", FNAME_US_VALUE_REGEX)
+            if rec_file_ms:
+                rec_file_date += float("0." + rec_file_ms)
 
-            sample_offset = re.findall(b"SMP_OFFSET=(\d+)", self.mer_binary_header)
-            sample_offset = float(sample_offset[0])
+            sample_offset = find_required_value(header, "SMP_OFFSET", UINT_VALUE_REGEX)
+            sample_offset = float(sample_offset)
             self.uncorrected_starttime = rec_file_date + sample_offset / self.measured_fs
         else:
             # For a detected event the INFO DATE is timestamp of the STA/LTA trigger
@@ -409,13 +797,36 @@ class Event:
             # Bumps and other matters," 28 Mar 2021.
             self.uncorrected_starttime = self.info_date - float(self.trig) / self.decimated_fs
 
-    def set_processed_data(self):
+    def set_wavelet_flavor(self):
+        '''Set the flavor of the inverse wavelet transform of this (non-Stanford)
+        event from its .MER environment
+
+        Sets attrs:
+        `normalized`
+        `edges_correction`
+
+        '''
+        environment = parse_environment(self.mer_environment)
+        for key in ("NORMALIZED", "EDGES_CORRECTION"):
+            if environment[key] is None:
+                raise ValueError("{:s}= missing or malformed in .MER environment {:s}"
+                                 .format(key, str(self.mer_environment_name)))
+
+        self.normalized = environment["NORMALIZED"]
+        self.edges_correction = environment["EDGES_CORRECTION"]
+
+    def set_processed_data(self, inverted_data=None):
         '''Convert raw .MER binary data to processed MERMAID traces or Stanford PSD
         50-95% arrays.  The former's binary are generally inverted via a
         CDF(2,4) wavelet transform for "WLT?" data (or through casting to int32
         in the case of "RAW" [STAGES=-1] data), while the latter's are simply
         cast to int8 and...
 
+        The inverted data may already have been computed in a batch with other
+        events (see `invert_events`) and be passed as `inverted_data`.  The
+        binary data of a lazily-read event are read if they are not loaded yet
+        (see `load_mer_binary`).
+
         Sets attrs:
         `processed_data`          (for V1 floats and V2 Stanford PSD floats)
         `data_max`                (for V1 floats and V2 Stanford PSD floats)
@@ -424,6 +835,7 @@ class Event:
         `edges_correction`        (only for V1 floats)
 
         '''
+        self.load_mer_binary()
 
         if self.is_stanford_event:
             self.processed_data = np.frombuffer(self.mer_binary_binary, np.int8) - np.int8(self.stanford_db_offset)
@@ -457,80 +869,29 @@ class Event:
         else:
             # Get additional information on flavor of invert wavelet transform
             # Must do this before the `return` statement, in the case of RAW files
-            self.normalized = re.findall(" NORMALIZED=(\d+)", self.mer_environment)[0]
-            self.edges_correction = re.findall(" EDGES_CORRECTION=(\d+)", self.mer_environment)[0]
+            self.set_wavelet_flavor()
 
             # If scales == -1 this is a raw signal, just convert binary data to np array of int32
-            if self.scales != "-1":
-                # Change to bin/ directory because the executable C inversion
-                # program called below can fail with full paths :(
-                os.chdir("bin")
-
-                # The following scripts READ wavelet coefficients (what MERMAID
-                # generally sends) from a file named "wtcoeffs" and WRITE the inverted
-                # data to a file name, e.g., "wtcoeffs.icdf24_5"
-                wtcoeffs_data_file_name = "wtcoeffs"
-                inverted_data_file_name = "wtcoeffs.icdf24_" + self.scales
-
-                # Delete any previously-inverted data just to be absolutely sure we are
-                # working with this event's data only (an interruption before the second
-                # call to delete these files could result in their persistence)
-                if os.path.exists(wtcoeffs_data_file_name):
-                    os.remove(wtcoeffs_data_file_name)
-
-                if os.path.exists(inverted_data_file_name):
-                    os.remove(inverted_data_file_name)
-
-                # Write cdf24 data to file named "wtcoeffs" in local directory
-                with open(wtcoeffs_data_file_name, 'wb') as f:
-                    f.write(self.mer_binary_binary)
-
-                # The inverse wavelet transform C code (`icdf24_v103(ec)_test`) is
-                # called below in a shell subprocess and its output is verified;
-                # determine if edge correction needs to be accounted for and set the
-                # first argument (the executable) in the full command (note that "./" is
-                # required before script on JDS' Linux machine, but not JDS' Mac...)
-                icdf24_shell_command = []
-                if self.edges_correction == "1":
-                    icdf24_shell_command.append("./icdf24_v103ec_test")
-
-                else:
-                    icdf24_shell_command.append("./icdf24_v103_test")
-
-                # Append the argument list to feed inversion script, e.g., "5 1 wtcoeffs"
-                icdf24_shell_command.extend([self.scales, self.normalized, wtcoeffs_data_file_name])
-
-                # Perform inverse wavelet transform, e.g., running in background shell --
-                # $ ./icdf24_v103ec_test 5 1 wtcoeffs
-                # NB, `subprocess` is analogous to `system` in MATLAB
-                stdout = subprocess.check_output(icdf24_shell_command)
-
-                # Ensure the inverse wavelet transform worked as expected, meaning that
-                # it generated an output file of int32 data
-                if not os.path.exists(inverted_data_file_name):
-                    cmd = ' '.join(map(str, icdf24_shell_command))
+            if inverted_data is not None:
+                self.processed_data = inverted_data
+
+            elif self.scales != "-1":
+                # Invert the CDF(2,4) wavelet coefficients (what MERMAID generally
+                # sends) in process, with or without edge correction; this
+                # reproduces, bit for bit, the C programs `icdf24_v103_test` and
+                # `icdf24_v103ec_test` (see icdf24.py)
+                try:
+                    self.processed_data = icdf24.icdf24(self.mer_binary_binary, self.scales,
+                                                        self.normalized, self.edges_correction)
+
+                except ValueError as e:
                     err_mess = "\nFailed: inverse wavelet transformation\n"
-                    err_mess += "In directory: {:s}\n".format(bin_path)
-                    err_mess += "Attempted command: {:s}\n".format(cmd)
-                    err_mess += "Using: event around {:s} in {:s}\n\n".format(self.info_date, self.mer_binary_name)
-                    err_mess += "Command printout:\n'{:s}'".format(stdout)
+                    err_mess += "Using: event around {:s} in {:s}\n\n".format(str(self.info_date), self.mer_binary_name)
+                    err_mess += "Error: '{:s}'".format(str(e))
 
-                    # This output message is more helpful than the program crashing on
-                    # the next line
+                    # This output message is more helpful than the program crashing
                     sys.exit(err_mess)
 
-                # Read the inverted data
-                self.processed_data = np.fromfile(inverted_data_file_name, np.int32)
-
-                # Delete the files of coefficient and inverted data, otherwise a latter
-                # .MER with an incomplete binary event block can come along and use the
-                # same data
-                os.remove(wtcoeffs_data_file_name)
-                os.remove(inverted_data_file_name)
-
-                # Move up one level back into the scripts/ directory
-                os.chdir("..")
-
             else:
                 self.processed_data = np.frombuffer(self.mer_binary_binary, np.int32)
 
@@ -705,12 +1066,12 @@ class Event:
         print(processed_path_html)
         if os.path.exists(processed_path_html):
             return
-        win_sz = re.findall(r"WINDOW_LEN=(\d+)", self.mer_environment, re.DOTALL)
+        win_sz = parse_environment(self.mer_environment)["WINDOW_LEN"]
         dt = np.dtype([('perc50', np.int8)])
         x_split = np.array_split(self.processed_data,2)
         x0=x_split[0]
         x1=x_split[1]
-        freq_max=(float)((x0.size*40)/int(win_sz[0]))
+        freq_max=(float)((x0.size*40)/int(win_sz))
         freq = np.arange(0.,freq_max,freq_max/x0.size)
 
 
@@ -785,12 +1146,12 @@ class Event:
         print(processed_path_png)
         if os.path.exists(processed_path_png):
             return
-        win_sz = re.findall("WINDOW_LEN=(\d+)", self.mer_environment, re.DOTALL)
+        win_sz = parse_environment(self.mer_environment)["WINDOW_LEN"]
         dt = np.dtype([('perc50', np.int8)])
         x_split = np.array_split(self.processed_data,2)
         x0=x_split[0]
         x1=x_split[1]
-        freq_max=(float)((x0.size*40)/int(win_sz[0]))
+        freq_max=(float)((x0.size*40)/int(win_sz))
         freq = np.arange(0.,freq_max,(freq_max/x0.size))
 
         # Plot frequency image
@@ -976,8 +1337,18 @@ class Event:
         # Attach Stats to events object
         self.obspy_trace_stats = stats
 
-    def write_mseed(self, processed_path, force_without_loc=False,
-                 force_redo=False, force_without_time_correction=False):
+    def write_stream(self, processed_path, formats=("sac", "mseed"), force_without_loc=False,
+                     force_redo=False, force_without_time_correction=False):
+        '''Write the seismogram of this event in each of `formats` (file extensions
+        of `STREAM_FORMATS`, e.g., "sac" and "mseed"), all from the same ObsPy
+        Stream, which is only built if one of those files is not written yet
+        (or if `force_redo`)
+
+        A note about starttime and .sac, and the headers NZMSEC and B, if
+        str(event.obspy_trace_stats["starttime"]) == '2018-09-28T10:14:34.251926Z',
+        then in the .sac header "NZMSEC" would be 251 and "B" would be 926.
+
+        '''
         # NB, mseed2sac writes, e.g., "MH.P0025..BDH.D.2018.259.211355.SAC",
         # where "D" is the quality indicator, "D -- The state of quality control
         # of the data is indeterminate" (SEED v2.4 manual pg. 108)
@@ -987,62 +1358,44 @@ class Event:
 
         # Check if the station location has been calculated
         if self.station_loc is None and not force_without_loc:
-            #print self.processed_file_name + ": Skip mseed generation, wait the next ascent to compute location"
+            #print self.processed_file_name + ": Skip sac/mseed generation, wait the next ascent to compute location"
             return
 
         # Format the metadata into miniSEED and SAC header formats
         if not self.obspy_trace_stats:
             self.set_obspy_trace_stats(force_without_loc)
 
-        # Check if file exists
-        mseed_filename = processed_path + self.processed_file_name + ".mseed"
-        if not force_redo and os.path.exists(mseed_filename):
+        # Check which files exist
+        filenames = [(extension, processed_path + self.processed_file_name + "." + extension)
+                     for extension in formats]
+        if not force_redo:
+            filenames = [(extension, filename) for extension, filename in filenames
+                         if not os.path.exists(filename)]
+        if not filenames:
             return
 
         # Get stream object
         stream = self.get_stream(processed_path, force_without_loc)
 
-        # Save stream object with the time correction applied but without 'Time
-        # correction applied' flag or 'Time correction' value being set in the
-        # 48-byte fixed header
-        stream.write(mseed_filename, format='MSEED')
+        for extension, filename in filenames:
+            # Save stream object (with the time correction applied but without
+            # 'Time correction applied' flag or 'Time correction' value being
+            # set in the 48-byte fixed header of miniSEED files)
+            stream.write(filename, format=STREAM_FORMATS[extension])
 
-        # Update (open and rewrite bits of each 48-byte fixed header that
-        # precedes each record) the mseed file with time-correction metadata
-        if not force_without_time_correction and not self.station_loc_is_preliminary:
-            utils.set_mseed_time_correction(mseed_filename, self.mseed_time_correction)
+            # Update (open and rewrite bits of each 48-byte fixed header that
+            # precedes each record) the mseed file with time-correction metadata
+            if extension == "mseed" and not force_without_time_correction \
+               and not self.station_loc_is_preliminary:
+                utils.set_mseed_time_correction(filename, self.mseed_time_correction)
 
+    def write_mseed(self, processed_path, force_without_loc=False,
+                 force_redo=False, force_without_time_correction=False):
+        self.write_stream(processed_path, ["mseed"], force_without_loc, force_redo,
+                          force_without_time_correction)
 
     def write_sac(self, processed_path, force_without_loc=False, force_redo=False):
-        '''
-        A note about starttime and .sac, and the headers NZMSEC and B, if
-        str(event.obspy_trace_stats["starttime"]) == '2018-09-28T10:14:34.251926Z',
-        then in the .sac header "NZMSEC" would be 251 and "B" would be 926.
-
-        '''
-
-        if self.is_stanford_event:
-            return
-
-        # Check if the station location has been calculated
-        if self.station_loc is None and not force_without_loc:
-            #print self.processed_file_name + ": Skip sac generation, wait the next ascent to compute location"
-            return
-
-        # Format the metadata into miniSEED and SAC header formats
-        if not self.obspy_trace_stats:
-            self.set_obspy_trace_stats(force_without_loc)
-
-        # Check if file exists
-        sac_filename = processed_path + self.processed_file_name + ".sac"
-        if not force_redo and os.path.exists(sac_filename):
-            return
-
-        # Get stream object
-        stream = self.get_stream(processed_path, force_without_loc)
-
-        # Save stream object
-        stream.write(sac_filename, format='SAC')
+        self.write_stream(processed_path, ["sac"], force_without_loc, force_redo)
 
     def write_mhpsd(self, processed_path, creation_datestr, force_redo=False):
         if not self.is_stanford_event or self.station_loc is None:
@@ -20,6 +20,7 @@ import csv
 import pytz
 import datetime
 import numpy as np
+from obspy import UTCDateTime
 
 import cycles
 import setup
@@ -215,10 +216,11 @@ class GeoCSV:
             # (07_5B773AF5.LOG, lines 916 and 917)
             press_rows = []
             prev_pressure_row = []
-            for pressure in sorted(cycle.pressure_mbar, key=lambda x:x[1]):
+            pressure_mbar = cycle.pressure_mbar_epochs[np.argsort(cycle.pressure_mbar_epochs["epoch"], kind="stable")]
+            for pressure_epoch, pressure_value in pressure_mbar:
                 pressure_row = [
                     self.MethodIdentifier_Pressure,
-                    str(pressure[1])[:23]+'Z',
+                    str(UTCDateTime(int(pressure_epoch)))[:23]+'Z',
                     cycle.network,
                     cycle.kstnm,
                     nan,
@@ -227,7 +229,7 @@ class GeoCSV:
                     nan,
                     nan,
                     nan,
-                    d0(pressure[0]),
+                    d0(pressure_value),
                     'MERMAIDHydrophone({:s})'.format(cycle.kinst),
                     nan,
                     nan,
@@ -298,7 +300,7 @@ class GeoCSV:
                         if event.pressure_dbar * 100 != event.pressure_mbar:
                             raise ValueError("Expected 100 mbar to equal 1 dbar")
 
-                        if event.pressure_dbar is not event.obspy_trace_stats.sac["stdp"]:
+                        if event.pressure_dbar != event.obspy_trace_stats.sac["stdp"]:
                             raise ValueError("`stdp` (roughly meters) should be the dbar pressure from .MER")
 
                         det_algo_rows.append(algorithm_row)
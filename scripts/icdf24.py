@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+#
+# Part of automaid -- a Python package to process MERMAID files
+# pymaid environment (Python v3.10)
+#
+# Inverse CDF(2,4) (Cohen-Daubechies-Feauveau) wavelet transform of the integer
+# wavelet coefficients sent by MERMAID, with and without edge corrections.
+#
+# This is a NumPy port of the C inversion programs in src/V103/ and
+# src/V103EC/ (`icdf24_v103_test` and `icdf24_v103ec_test`), vectorised over the
+# samples of each scale: it reproduces their integer (int32) arithmetic,
+# including the rounding of `long_mult_and_div` (src/V103/long_ops.c), C's
+# truncated division and int32 wraparound, so that its output is identical,
+# bit for bit, to theirs (see
+# tests_and_verifications/verify_icdf24.py).
+
+import numpy as np
+
+# Version of this inversion, to be incremented whenever its output changes (it
+# keys the cache of inverted seismograms, see inversion_cache.py)
+version = "v1.0.0"
+
+# SQRT(2) ~= 239 / 169 (see src/V103/icdf24.c)
+SQRT2_NUM = 239
+SQRT2_DEN = 169
+
+# Lifting coefficients of the approximation part, Ua = [-3 19 19 -3] / 64
+A = 3
+B = 19
+C = 64
+
+INT32_MIN = -2**31
+
+def _wrap(x):
+    '''Return int64 array `x` wrapped to the int32 range, as C would store it
+
+    '''
+    return ((x + 2**31) & (2**32 - 1)) - 2**31
+
+def _div(x, den):
+    '''Return int64 array `x` divided by `den` > 0, truncated toward zero (C "/")
+
+    '''
+    # Floor division of x + den - 1 for negative x (x >> 63 is -1 for x < 0)
+    return (x + ((x >> 63) & (den - 1))) // den
+
+def _long_mult_and_div(x, num, den):
+    '''Return `x` * `num` / `den` as computed by `long_mult_and_div` (default
+    implementation of src/V103/long_ops.c), for int32 values `x` and `num`,
+    `den` > 0
+
+    '''
+    # long_mult_and_div divides |x| by `den` first and then adds the product of
+    # the remainder divided by `den`: this is x * `num` / `den` truncated
+    # toward zero (and wrapped), as long as -x does not overflow...
+    y = _div(x * num, den)
+
+    # ...i.e., except for INT32_MIN, whose remainder keeps its negative sign
+    is_min = x == INT32_MIN
+    if is_min.any():
+        y[is_min] = -(2**31 // den) * num + (num * (2**31 % den)) // den
+
+    return _wrap(y) if num > den else y
+
+def _undo_scale(x, lx, edges_correction):
+    '''Undo in place one scale of the transform of the rows of `x`, whose
+    approximation and detail parts are x[:, :lx] and x[:, lx:2*lx]
+    (normalization already undone)
+
+    '''
+    a = x[:, :lx].copy()
+    d = x[:, lx:2*lx].copy()
+
+    # Approximation part
+    if edges_correction:
+        # Haar transform
+        a[:, :1] = _wrap(a[:, :1] - _long_mult_and_div(d[:, :1], 1, 2))
+        if lx > 1:
+            # CDF(2,2)
+            a[:, 1:2] = _wrap(a[:, 1:2] - _long_mult_and_div(_wrap(d[:, :1] + d[:, 1:2]), 1, 4))
+
+    if lx > 3:
+        a[:, 2:lx-1] = _wrap(a[:, 2:lx-1] + _long_mult_and_div(_wrap(d[:, :lx-3] + d[:, 3:]), A, C))
+        a[:, 2:lx-1] = _wrap(a[:, 2:lx-1] - _long_mult_and_div(_wrap(d[:, 1:lx-2] + d[:, 2:lx-1]), B, C))
+
+    if edges_correction and lx > 2:
+        # CDF(2,2)
+        a[:, lx-1:] = _wrap(a[:, lx-1:] - _long_mult_and_div(_wrap(d[:, lx-1:] + d[:, lx-2:lx-1]), 1, 4))
+
+    # Detail part
+    d[:, :lx-1] = _wrap(d[:, :lx-1] + _div(_wrap(a[:, :-1] + a[:, 1:]), 2))
+    if edges_correction:
+        # Haar transform
+        d[:, lx-1:] = _wrap(d[:, lx-1:] + a[:, lx-1:])
+
+    # Resort
+    x[:, 0:2*lx:2] = a
+    x[:, 1:2*lx:2] = d
+
+def _invert(x, scales, normalized, edges_correction):
+    '''Return the inverse transform of each row of int64 array `x` (see
+    `icdf24` for the arguments)
+
+    '''
+    # Normalization by sqrt(2) compensates for 6 scales: divide the signal by
+    # sqrt(2) for each missing scale (before inversion without edge corrections,
+    # after with)
+    if normalized == 1 and not edges_correction:
+        for i in range(6 - scales):
+            x = _long_mult_and_div(x, SQRT2_DEN, SQRT2_NUM)
+
+    lx = x.shape[1] >> scales
+    for q in range(scales):
+        # Undo normalization
+        if normalized == 1:
+            x[:, :lx] = _long_mult_and_div(x[:, :lx], SQRT2_DEN, SQRT2_NUM)
+            x[:, lx:2*lx] = _long_mult_and_div(x[:, lx:2*lx], SQRT2_NUM, SQRT2_DEN)
+
+        elif normalized != 0:
+            # Approximation divided by 2 every other scale, and details
+            # multiplied by sqrt(2) in between
+            if q % 2 == 0:
+                x[:, :lx] >>= 1
+            else:
+                x[:, lx:2*lx] = _long_mult_and_div(x[:, lx:2*lx], SQRT2_NUM, SQRT2_DEN)
+
+        _undo_scale(x, lx, edges_correction)
+        lx <<= 1
+
+    if normalized == 1 and edges_correction:
+        for i in range(6 - scales):
+            x = _long_mult_and_div(x, SQRT2_DEN, SQRT2_NUM)
+
+    # With normalization by 2, an odd number of scales leaves the signal divided
+    # by sqrt(2) once too many
+    elif normalized not in (0, 1) and scales % 2:
+        x = _long_mult_and_div(x, SQRT2_NUM, SQRT2_DEN)
+
+    return x.astype(np.int32)
+
+def _as_int32(coefficients):
+    '''Return `coefficients` (int32 array, or bytes as sent in .MER files) as
+    an int32 array
+
+    '''
+    if isinstance(coefficients, (bytes, bytearray, memoryview)):
+        # Like `fread` in the C programs, ignore any trailing incomplete int32
+        return np.frombuffer(coefficients, np.int32, len(coefficients) // 4)
+
+    return np.asarray(coefficients, dtype=np.int32)
+
+def is_valid_size(size, scales):
+    '''Return True if `size` coefficients can be inverted over `scales` scales
+
+    '''
+    return scales >= 0 and size > 0 and size % (1 << scales) == 0
+
+def icdf24(coefficients, scales, normalized, edges_correction):
+    '''Return the int32 signal whose CDF(2,4) wavelet transform (`scales`
+    rounds) is `coefficients` (int32 array, or bytes as sent in .MER files)
+
+    Keyword arguments:
+    coefficients -- wavelet coefficients, [A_K, D_K, ..., D_1] (see src/V103/icdf24.h)
+    scales -- number of scales of the transform (STAGES), >= 0
+    normalized -- 0 for no normalization, 1 for normalization by sqrt(2),
+                  2 (or any other value) for normalization by 2 (NORMALIZED)
+    edges_correction -- True (or "1") if the coefficients were computed with
+                        edge corrections (EDGES_CORRECTION)
+
+    Raises ValueError, as the C programs fail, if the number of coefficients
+    is zero or not a multiple of 2**`scales`.
+
+    NB, with `normalized` = 1 and `scales` > 6, the C programs would loop
+    (almost) endlessly (their "6 - K" scale compensation underflows); no
+    compensation is applied here.
+
+    '''
+    return icdf24_batch([coefficients], scales, normalized, edges_correction)[0]
+
+def icdf24_batch(coefficients_list, scales, normalized, edges_correction):
+    '''Return the list of the int32 signals whose CDF(2,4) wavelet transforms
+    are the elements of `coefficients_list`, in the same order, all with the
+    same `scales`, `normalized` and `edges_correction` (see `icdf24`)
+
+    The coefficients of the same length are inverted together, as the rows of a
+    single array, so that the cost of each NumPy operation is shared by all of
+    them rather than paid once per seismogram.
+
+    Raises ValueError if any of them has an invalid size (see `icdf24`).
+
+    '''
+    scales = int(scales)
+    normalized = int(normalized)
+    edges_correction = str(edges_correction) in ("1", "True")
+
+    coefficients_list = [_as_int32(coefficients) for coefficients in coefficients_list]
+    for coefficients in coefficients_list:
+        if not is_valid_size(coefficients.size, scales):
+            raise ValueError("{:d} not a valid size for {:d} scales".format(coefficients.size, scales))
+
+    # Group the coefficients by length and map the inverted rows back by index
+    indices_by_size = {}
+    for i, coefficients in enumerate(coefficients_list):
+        indices_by_size.setdefault(coefficients.size, []).append(i)
+
+    signals = [None] * len(coefficients_list)
+    for indices in indices_by_size.values():
+        x = np.array([coefficients_list[i] for i in indices], dtype=np.int64)
+        for i, signal in zip(indices, _invert(x, scales, normalized, edges_correction)):
+            signals[i] = signal
+
+    return signals
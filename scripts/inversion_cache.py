@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+#
+# Part of automaid -- a Python package to process MERMAID files
+# pymaid environment (Python v3.10)
+#
+# Content-addressed disk cache of inverted seismograms, shared by all floats:
+# the int32 data inverted from the wavelet coefficients of an event (see
+# icdf24.py) are saved as .npy files named after a hash of those coefficients
+# and of the flavor and version of the inversion, and are read back when the
+# same coefficients are inverted again, e.g., when a float is reprocessed.
+
+import os
+import hashlib
+import numpy as np
+
+import icdf24
+
+# Cache directory name (written in the processed directory)
+INVERSION_CACHE_NAME = "inversion_cache"
+
+class InversionCache:
+    '''Cache of inverted seismograms in directory `path`, evicting the least
+    recently used ones when their total size exceeds `max_size` bytes
+
+    Arrays are stored in subdirectories named after the first two characters
+    of their key, e.g., <path>/3f/3f9a...c2.npy; a cache hit updates the
+    modification time of its file, which orders the eviction.
+
+    The size of the cache is tallied as arrays are saved, and the cache is
+    evicted as soon as it exceeds `max_size` (floats processed in parallel each
+    keep their own tally, which every eviction resets to the actual size).
+
+    '''
+
+    def __init__(self, path, max_size):
+        self.path = path
+        self.max_size = max_size
+        # Size (bytes) of the cache, unknown until it is first needed
+        self.size = None
+
+    def get_key(self, coefficients, scales, normalized, edges_correction):
+        '''Return the key of the data inverted from `coefficients` (bytes) with
+        `scales`, `normalized` and `edges_correction` (see `icdf24.icdf24`)
+
+        '''
+        h = hashlib.sha256()
+        h.update("{:s} {:s} {:s} {:s}\n".format(icdf24.version, str(scales), str(normalized),
+                                               str(edges_correction)).encode("utf-8"))
+        h.update(coefficients)
+        return h.hexdigest()
+
+    def get_path(self, key):
+        return os.path.join(self.path, key[:2], key + ".npy")
+
+    def load(self, key):
+        '''Return the data cached under `key` (read in memory, so that the file
+        is not kept open), or None
+
+        '''
+        path = self.get_path(key)
+        try:
+            data = np.load(path)
+        except (OSError, ValueError):
+            return None
+
+        # Mark as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        return data
+
+    def save(self, key, data):
+        '''Cache `data` under `key` (via a temporary file, so that floats
+        processed in parallel never read a partially-written array)
+
+        '''
+        path = self.get_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = "{:s}.{:d}.tmp".format(path, os.getpid())
+        with open(tmp_path, "wb") as f:
+            np.save(f, data)
+        os.replace(tmp_path, path)
+
+        # Keep the cache within its maximum size during the run
+        if self.size is None:
+            self.size = self.get_size()
+        else:
+            self.size += os.path.getsize(path)
+        if self.size > self.max_size:
+            self.evict()
+
+    def list_files(self):
+        '''Return the (modification time, size, path) of the cached arrays
+
+        '''
+        files = []
+        if not os.path.isdir(self.path):
+            return files
+
+        with os.scandir(self.path) as it:
+            for dir_entry in it:
+                if not dir_entry.is_dir():
+                    continue
+
+                with os.scandir(dir_entry.path) as sub_it:
+                    for file_entry in sub_it:
+                        if file_entry.name.endswith(".npy"):
+                            # The file may have been evicted by another float
+                            # processed in parallel
+                            try:
+                                stat = file_entry.stat()
+                            except FileNotFoundError:
+                                continue
+                            files.append((stat.st_mtime, stat.st_size, file_entry.path))
+
+        return files
+
+    def get_size(self):
+        '''Return the total size (bytes) of the cached arrays
+
+        '''
+        return sum(file_size for _, file_size, _ in self.list_files())
+
+    def evict(self):
+        '''Remove the least recently used arrays until the cache is no larger
+        than `max_size` bytes
+
+        '''
+        files = self.list_files()
+        size = sum(file_size for _, file_size, _ in files)
+        for _, file_size, file_path in sorted(files):
+            if size <= self.max_size:
+                break
+
+            # The file may already have been evicted by another float processed
+            # in parallel
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+
+            size -= file_size
+
+        self.size = size
@@ -20,9 +20,12 @@ import argparse
 import datetime
 import functools
 import pickle
+import concurrent.futures
 
 import kml
 import gps
+import catalog
+import manifest
 import setup
 import cycles
 import utils
@@ -30,6 +33,7 @@ import events
 import vitals
 import geocsv
 import preprocess
+import inversion_cache
 import sbe41
 import sbe61
 import rbr
@@ -91,18 +95,59 @@ parser.add_argument('-d',
                     dest='database',
                     #metavar='',
                     help="database directory (default: {:s})".format(def_database_path))
+parser.add_argument('-j',
+                    '--jobs',
+                    default=1,
+                    type=int,
+                    dest='jobs',
+                    #metavar='',
+                    help="number of floats processed in parallel (default: 1)")
+parser.add_argument('--decrypt-jobs',
+                    default=1,
+                    type=int,
+                    dest='decrypt_jobs',
+                    #metavar='',
+                    help="number of .BIN files of a float decrypted in parallel (default: 1)")
+parser.add_argument('--no-inversion-cache',
+                    action='store_false',
+                    dest='inversion_cache',
+                    help="invert every seismogram, without reading or writing the cache of inverted seismograms")
 args = parser.parse_args()
 server_path = os.path.abspath(args.server)
 processed_path = os.path.abspath(args.processed)
 database_path = os.path.abspath(args.database)
+jobs = args.jobs
+decrypt_jobs = args.decrypt_jobs
+use_inversion_cache = args.inversion_cache
 
 # Set an inclusive time range of analysis for a specific float
 # (by default, deployment to present...adjust here or there)
+run_date = datetime.datetime.utcnow()
 filterDate = utils.deploy2present()
 
 # Boolean set to true in order to delete every processed data and redo everything
 redo = False
 
+# Boolean set to true in order to skip floats whose server files have not
+# changed since the last run, and to only reprocess the cycles of the other
+# floats that their new server files can affect (see `manifest.py`)
+incremental = True
+
+# Boolean set to true in order to stage the server files in the processed
+# directory as hard links (or reflinks) rather than copies; they are copied
+# anyway when linking is not possible, e.g., across filesystems
+stage_links = True
+
+# Boolean set to true in order to also write (and keep) the .CYCLE files in the
+# processed directory of each float, e.g., for debugging or archival; cycles
+# are otherwise handed over in memory from their assembly to their processing
+write_cycle_files = False
+
+# Maximum size (bytes) of the cache of inverted seismograms shared by all floats
+# (in processed/inversion_cache/), beyond which the least recently used ones are
+# evicted; disable the cache with --no-inversion-cache
+inversion_cache_size = 2 * 1024**3
+
 # Filter to only run Princeton set.
 princeton_only = False
 
@@ -113,6 +158,9 @@ write_sac = True
 write_mseed = True
 write_mhpsd = True
 
+# Seismogram formats (file extensions of `events.STREAM_FORMATS`) to write
+stream_formats = [extension for extension, write in [("sac", write_sac), ("mseed", write_mseed)] if write]
+
 # Use WebGL implementation of graph to
 # increase speed, improve interactivity, and the ability to plot even more data
 optimized_html = True
@@ -143,6 +191,375 @@ def sort_mfloats(a,b):
     nbB = int(buoy_nbB,10)
     return nbA - nbB
 
+def get_reusable_cycles(previous_cycles, changed_files, mevents, mprofiles):
+    '''Return the leading cycles processed during the last run that none of the
+    new or modified server files in `changed_files` can affect, i.e., the
+    complete cycles that end before the earliest date to which those files
+    relate.  The first incomplete ("IcCycle") cycle, and every cycle after it,
+    are always reprocessed.
+
+    '''
+    changed_files = set(changed_files)
+
+    # The earliest date to which a changed file relates is the (hexadecimal)
+    # date in its name or, for .MER and CTD files, the dates of the events, GPS
+    # fixes and profiles they contain (events may be transmitted several
+    # surfacings after they were recorded)
+    changed_dates = [utils.get_date_from_file_name(f) for f in changed_files
+                     if re.match(r"\d+_[0-9A-F]+\.", f)]
+    changed_dates += [e.info_date for e in mevents.events if e.mer_binary_name in changed_files]
+    changed_dates += [g.date for g in mevents.gps_info if g.source in changed_files]
+    for profiles in mprofiles:
+        changed_dates += [p.date for p in profiles.profiles if p.file_name in changed_files]
+    first_changed_date = min(changed_dates) if changed_dates else None
+
+    reusable_cycles = []
+    for cycle in previous_cycles:
+        if not cycle.is_complete_cycle:
+            break
+        if first_changed_date is not None and cycle.end_date >= first_changed_date:
+            break
+        reusable_cycles.append(cycle)
+
+    return reusable_cycles
+
+def get_settings(begin, end):
+    '''Return the settings, besides its server files, that the outputs of a
+    float processed between `begin` and `end` depend on (recorded in its
+    manifest, see `manifest.read`)
+
+    '''
+    # An end of the time range after the start of this run (generally the
+    # present, which changes at every run) is recorded as such
+    return {
+        "begin": str(begin),
+        "end": str(end) if end < run_date else "present",
+        "outputs": {
+            "csv_file": csv_file,
+            "mixed_layer_depth_m": mixed_layer_depth_m,
+            "min_gps_fix": min_gps_fix,
+            "max_gps_time": max_gps_time,
+            "preliminary_location_ok": preliminary_location_ok,
+            "write_png": write_png,
+            "write_html": write_html,
+            "stream_formats": stream_formats,
+            "write_mhpsd": write_mhpsd,
+            "optimized_html": optimized_html,
+            "local_html": local_html,
+            "write_cycle_files": write_cycle_files
+        },
+        "databases": manifest.hash_directory(preprocess.database_path)
+    }
+
+def process_float(mfloat, files_to_copy):
+    '''Process every server file of a single MERMAID float, from copying its
+    raw files (`files_to_copy`, listed in the server catalog) to writing all of
+    its output files.
+
+    Returns the last cycle of the float (or None if it has no cycles), which
+    is used to compile `lastcycle` once every float has been processed.
+
+    Floats are independent of one another; this def may be run in a worker
+    process when `--jobs` is greater than one.
+
+    '''
+    print("Processing {:s} .LOG & .MER files...".format(mfloat))
+
+    # Set the path for the float
+    mfloat_path = os.path.join(processed_path, mfloat, "")
+
+    # Get float number
+    mfloat_nb = re.findall("(\d+)$", mfloat)[0]
+
+    # Delete the directory if the redo flag is true
+    if redo and os.path.exists(mfloat_path):
+        shutil.rmtree(mfloat_path)
+
+    # Create directory for the float
+    if not os.path.exists(mfloat_path):
+        os.mkdir(mfloat_path)
+
+    # Determine the time range of analysis (generally; birth to death of a MERMAID)
+    if mfloat in filterDate.keys():
+        begin = filterDate[mfloat][0]
+        end = filterDate[mfloat][1]
+    else:
+        begin = datetime.datetime(1000, 1, 1)
+        end = datetime.datetime(3000, 1, 1)
+
+    # Compare the server files with those processed during the last run and,
+    # if none are new, modified or removed, reuse the cycles of the last run
+    # (these must be read before the processed directory is cleaned below);
+    # a manifest written with other settings (time range, output options,
+    # decryption databases) is ignored, so that the float is reprocessed
+    settings = get_settings(begin, end)
+    previous_manifest = manifest.read(mfloat_path, settings) if incremental else {}
+    previous_mer_index = events.read_mer_index(mfloat_path) if incremental else {}
+    server_manifest = manifest.build(files_to_copy, previous_manifest)
+    changed_files = manifest.changed_files(previous_manifest, server_manifest)
+    previous_cycles = []
+    previous_cycle_state = None
+    pickle_path = mfloat_path + mfloat + '.pickle'
+    if previous_manifest and os.path.exists(pickle_path):
+        with open(pickle_path, 'rb') as handle:
+            previous_cycles = pickle.load(handle)
+        if not changed_files:
+            print(" ...no new server files since last run, skipping {:s}".format(mfloat))
+            if previous_cycles:
+                return previous_cycles[-1]
+            return
+        previous_cycle_state = preprocess.read_cycle_state(mfloat_path)
+        # Removed server files may affect any cycle: reprocess everything
+        if set(previous_manifest) - set(server_manifest):
+            previous_cycles = []
+            previous_cycle_state = None
+
+    # Remove existing files in the processed directory (the script may have been previously
+    # executed, copied the files, then failed)
+    for f in glob.glob(mfloat_path + "*.*"):
+        os.remove(f)
+
+    # Stage (link or copy) files
+    for f in files_to_copy:
+        if stage_links:
+            catalog.stage_file(f, mfloat_path)
+        else:
+            shutil.copy(f, mfloat_path)
+
+    # Index the staged files once; preprocessing queries (and updates) this
+    # catalog instead of globbing the processed directory at every step
+    mfloat_catalog = catalog.Catalog(mfloat_path)
+
+    # Concatenate all files for this float
+    preprocess.concatenate_files(mfloat_path, mfloat_catalog);
+
+    # Decrypt all files for this float
+    preprocess.decrypt_all(mfloat_path, mfloat_catalog, decrypt_jobs);
+
+    # Resume the cycle assembly of the last run (after its last complete
+    # cycle) if none of the LOGs it read has changed since; the cycles it
+    # completed are then available from its pickle
+    cycle_state = None
+    if previous_cycle_state is not None \
+       and preprocess.is_cycle_state_valid(previous_cycle_state, changed_files, begin, end) \
+       and [c.cycle_nb for c in previous_cycles[:previous_cycle_state["cycle_nb"]]] \
+           == list(range(previous_cycle_state["cycle_nb"])):
+        cycle_state = previous_cycle_state
+        print(" ...resuming {:s} cycle assembly at cycle {:d}" \
+              .format(mfloat, cycle_state["cycle_nb"]))
+
+    # Convert in cycle files
+    cycle_records, next_cycle_state = preprocess.convert_in_cycle(mfloat_path,begin,end,mfloat_catalog,cycle_state,
+                                                                  write_files=write_cycle_files)
+
+    # Really: collect all the .MER files (next we correlate their environments to .LOG files)
+    print(" ...compiling a list of events from {:s} .MER files (GPS & seismic data)..." \
+          .format(mfloat))
+    mevents = events.Events(mfloat_path, mer_index=previous_mer_index,
+                            mer_hashes={name: entry["sha1"] for name, entry in server_manifest.items()})
+    events.write_mer_index(mfloat_path, mevents.mer_index)
+    # Build list of all S41 profiles recorded
+    ms41s = sbe41.Profiles(mfloat_path)
+    # Build list of all S61 profiles recorded
+    ms61s = sbe61.Profiles(mfloat_path)
+
+    # Concatenate RBR files
+    preprocess.concatenate_rbr_files(mfloat_path, mfloat_catalog);
+    # Build list of all RBR profiles recorded
+    mRBRs = rbr.Profiles(mfloat_path)
+
+    # Keep the cycles of the last run that the new server files cannot affect
+    reused_cycles = get_reusable_cycles(previous_cycles, changed_files, mevents, [ms41s, ms61s, mRBRs])
+    if reused_cycles:
+        print(" ...reusing {:d} cycles of {:s} processed during the last run" \
+              .format(len(reused_cycles), mfloat))
+
+    # The cycles completed before the resumed assembly that cannot be reused
+    # (e.g., new .MER files relate to them) are rebuilt from their content
+    if cycle_state is not None:
+        previous_records = [(cycle.cycle_name, cycle.cycle_content) for cycle
+                            in previous_cycles[len(reused_cycles):cycle_state["cycle_nb"]]]
+        if write_cycle_files:
+            for cycle_name, cycle_content in previous_records:
+                with mfloat_catalog.create(cycle_name, "w") as f:
+                    f.write(cycle_content)
+        cycle_records = previous_records + cycle_records
+
+    # Build the (other) cycles
+    print(" ...matching those events to {:s} .LOG ('dive') files (GPS & dive metadata)..." \
+          .format(mfloat))
+    cycle_logs = reused_cycles + cycles.get_cycles(mfloat_path, mevents, ms41s, ms61s, mRBRs,
+                                                   begin_nb=len(reused_cycles),
+                                                   cycle_records=cycle_records)
+
+    # Verify dive logs are sorted as expected
+    if cycle_logs!= sorted(cycle_logs, key=lambda x: x.start_date):
+        raise ValueError('`cycle_logs` improperly sorted')
+
+    for i, cycle_log in enumerate(cycle_logs[len(reused_cycles):]):
+        # Create the directory
+        if not os.path.exists(cycle_log.processed_path):
+            os.mkdir(cycle_log.processed_path)
+
+        # Reformat and write .LOG in individual dive directory
+        cycle_log.write_datetime_cycle()
+
+        # Write .MER environment in individual directories
+        cycle_log.write_mermaid_environment_files()
+
+        # Write .S41 environment in individual directories
+        cycle_log.write_s41_environment_file();
+
+        # Write .S61 environment in individual directories
+        cycle_log.write_s61_environment_file();
+
+        # Generate dive plot
+        cycle_log.write_cycle_html(csv_file,optimize=optimized_html,include_plotly=local_html)
+        # <-- timestamps not corrected for clockdrift
+
+        # The GPS list is None outside of requested begin/end dates, within
+        # which it defaults to an empty list if it is truly empty (the events of
+        # those cycles are not inverted, and keep no `processed_data`)
+        if cycle_log.gps_list is None:
+            cycle_log.release_events_data()
+            continue
+
+        # Validate that the GPS may be used to correct various MERMAID
+        # timestamps, including diving/surfacing and event starttimes
+        cycle_log.validate_gps(min_gps_fix, max_gps_time)
+
+        # Apply clock corrections to the events associated with this
+        # completed dive
+        cycle_log.correct_clockdrifts()
+
+        # Set output (.sac, .mseed) file names of the events associated with
+        # this cycle using the adjusted and corrected event dates
+        cycle_log.set_processed_file_names()
+
+        # Interpolate station locations at various points in the dive
+        cycle_log.compute_station_locations(mixed_layer_depth_m, preliminary_location_ok)
+
+        # Invert the binary data of the events of this cycle (released below,
+        # once written)
+        cycle_log.set_events_processed_data()
+
+        # Format station-location metadata for ObsPy and attach to complete dive object
+        cycle_log.set_events_obspy_trace_stats()
+
+        # Write profiles html
+        cycle_log.write_profile_html(optimize=optimized_html,include_plotly=local_html)
+
+        # Write profiles data on CSV
+        if csv_file :
+            cycle_log.write_profile_csv();
+
+        # Write requested output files
+        if write_png:
+            cycle_log.write_events_png()
+
+        if write_html:
+            cycle_log.write_events_html(optimize=optimized_html,include_plotly=local_html)
+
+        # Write all seismogram formats (.sac, .mseed) of an event from the same
+        # ObsPy Stream
+        if stream_formats:
+            cycle_log.write_events_streams(stream_formats)
+
+        if write_mhpsd:
+            cycle_log.write_events_mhpsd(creation_datestr)
+
+        cycle_log.release_events_data()
+
+    # Verify events sublists are sorted as expected
+    events_list = [event for cycle in cycle_logs for event in cycle.events]
+    # Sort event lists by corrected starttime is exist => use uncorrected_starttime elsewhere
+    if events_list != sorted(events_list, key=functools.cmp_to_key(sort_events)):
+        raise ValueError('`cycle_logs[*].events` improperly sorted')
+
+    # Generate kml file for Google Earth
+    kml.generate(mfloat_path, mfloat, cycle_logs)
+
+    # Plot vital data
+    vitals.plot_battery_voltage(mfloat_path, mfloat + ".vit", begin, end)
+    vitals.plot_internal_pressure(mfloat_path, mfloat + ".vit", begin, end)
+    vitals.plot_pressure_offset(mfloat_path, mfloat + ".vit", begin, end)
+    if len(cycle_logs) > 1:
+        vitals.plot_corrected_pressure_offset(mfloat_path, cycle_logs, begin, end)
+
+    # NB, redundant events (identical header and binary data, e.g., requested
+    # data re-transmitted in a later .MER file) were removed float-wide when
+    # `mevents` was loaded, so every event of `cycle_logs` is unique; one may
+    # use the existence of `event.station_loc` to determine what events were
+    # actually written (see e.g., `events.write_traces_txt`)
+
+    # Write csv and txt files containing all GPS fixes from .LOG and .MER
+    gps.write_gps(cycle_logs, creation_datestr, processed_path, mfloat_path)
+
+    # Write text file detailing event-station location interpolation parameters
+    gps.write_gps_interpolation_txt(cycle_logs,creation_datestr, processed_path, mfloat_path)
+
+    # Write text file detailing which SINGLE .LOG and .MER files define
+    # (possibly incomplete) dives
+    cycles.write_logs_txt(cycle_logs, creation_datestr,  processed_path, mfloat_path)
+
+    # Write text file detailing .CYCLE files (init,complete dives, last dive)
+    cycles.write_cycles_txt(cycle_logs, creation_datestr,  processed_path, mfloat_path,mfloat)
+
+    # Write a text file relating all SAC and mSEED to their associated .LOG
+    # and .MER files
+    events.write_traces_txt(cycle_logs, creation_datestr, processed_path, mfloat_path)
+
+    # Write a text file with our best-guess at the location of MERMAID at
+    # the time of recording
+    events.write_loc_txt(cycle_logs, creation_datestr, processed_path, mfloat_path)
+
+    # Write mseed2sac and automaid metadata csv and text files
+    events.write_obspy_trace_stats(cycle_logs, creation_datestr, processed_path, mfloat_path)
+
+    # Write GeoCSV files
+    geocsv_meta = geocsv.GeoCSV(cycle_logs, creation_datestr, mixed_layer_depth_m)
+    geocsv_meta.write(os.path.join(processed_path, mfloat_path, 'geo.csv'))
+
+    # Clean directories: unlink the staged (and preprocessed) entries of the
+    # catalog only, never other files of the processed directory
+    files_to_delete = list()
+    for extension in ["MER", "S41", "S61", "RBR", "LOG", "BIN"]:
+        files_to_delete += mfloat_catalog.get_files(extension, mfloat_nb)
+    for f in files_to_delete:
+        mfloat_catalog.unlink(f)
+
+    # Remove lingering incomplete "IcCycle" folders, if completed
+    mfloat_files = os.listdir(mfloat_path)
+    incomplete_cycles = list(filter(lambda x: 'IcCycle' in x, mfloat_files))
+    for incomplete_cycle in incomplete_cycles:
+        complete_cycle = incomplete_cycle.replace('IcCycle', '')
+        if os.path.exists(os.path.join(mfloat_path, complete_cycle)):
+            shutil.rmtree(os.path.join(mfloat_path, incomplete_cycle))
+
+    with open(pickle_path, 'wb') as handle:
+        pickle.dump(cycle_logs, handle)
+    preprocess.write_cycle_state(mfloat_path, next_cycle_state)
+
+    # Record the server files processed during this run (last, so that a
+    # failed run is entirely reprocessed next time)
+    manifest.write(mfloat_path, server_manifest, settings)
+
+    # Return the last complete dive of this float to later write output list
+    # of external pressure measurements for the entire array
+    if cycle_logs:
+        return cycle_logs[-1]
+
+
+def init_worker(database_path, mer_inversion_cache):
+    '''Initialize a `--jobs` worker process so that it matches the state of the
+    parent process (working directory, database path and cache of inverted
+    seismograms), regardless of the multiprocessing start method.
+
+    '''
+    os.chdir(scripts_path)
+    preprocess.database_path = database_path
+    events.inversion_cache = mer_inversion_cache
+
 def main():
     # Set working directory in "scripts"
     os.chdir(scripts_path)
@@ -151,9 +568,10 @@ def main():
     if not os.path.exists(processed_path):
         os.mkdir(processed_path)
 
-    # Search MERMAID floats
-    vitfile_path = os.path.join(server_path, "[0-9]*.*-*-*[0-9].vit")
-    mfloats = [p.split("/")[-1][:-4] for p in glob.glob(vitfile_path)]
+    # List the server directory once and search MERMAID floats (those with a
+    # <FLOAT>.vit file) in that catalog
+    server_catalog = catalog.Catalog(server_path)
+    mfloats = server_catalog.get_floats()
 
     # Create database directory if it doesn't exist
     if not os.path.exists(database_path):
@@ -162,236 +580,45 @@ def main():
     # Update Database
     preprocess.database_update(database_path)
 
+    # Share the cache of inverted seismograms between all floats
+    if use_inversion_cache:
+        events.inversion_cache = inversion_cache.InversionCache(
+            os.path.join(processed_path, inversion_cache.INVERSION_CACHE_NAME), inversion_cache_size)
+
     # Sort *.vit path
     mfloats_sorted = sorted(mfloats, key=functools.cmp_to_key(sort_mfloats))
 
-    # For each MERMAID float
-    for mfloat in mfloats_sorted:
-        if princeton_only:
-            if mfloat not in utils.princeton_mermaids():
-                continue
-
-        print("Processing {:s} .LOG & .MER files...".format(mfloat))
-
-        # Set the path for the float
-        mfloat_path = os.path.join(processed_path, mfloat, "")
-
-        # Get float number
-        mfloat_nb = re.findall("(\d+)$", mfloat)[0]
-
-        # Delete the directory if the redo flag is true
-        if redo and os.path.exists(mfloat_path):
-            shutil.rmtree(mfloat_path)
-
-        # Create directory for the float
-        if not os.path.exists(mfloat_path):
-            os.mkdir(mfloat_path)
-
-        # Remove existing files in the processed directory (the script may have been previously
-        # executed, copied the files, then failed)
-        for f in glob.glob(mfloat_path + "*.*"):
-            os.remove(f)
-
-        # Copy appropriate files in the directory and remove files outside of the time range
-        files_to_copy = []
-
-        # All files begin with buoy_nb followed by underscore
-        # Add underscore avoids errors between similar buoy numbers (Ex: 01_* and 0101_*)
-        files_to_copy += glob.glob(os.path.join(server_path, mfloat_nb +  "_*"))
-
-        # Add .cmd, .out, and .vit files
-        files_to_copy += glob.glob(os.path.join(server_path, mfloat + "*"))
-
-        # Copy files
-        for f in files_to_copy:
-            shutil.copy(f, mfloat_path)
-
-        # Concatenate all files for this float
-        preprocess.concatenate_files(mfloat_path);
-
-        # Decrypt all files for this float
-        preprocess.decrypt_all(mfloat_path);
-
-        # Determine the time range of analysis (generally; birth to death of a MERMAID)
-        if mfloat in filterDate.keys():
-            begin = filterDate[mfloat][0]
-            end = filterDate[mfloat][1]
-        else:
-            begin = datetime.datetime(1000, 1, 1)
-            end = datetime.datetime(3000, 1, 1)
-
-        # Convert in cycle files
-        preprocess.convert_in_cycle(mfloat_path,begin,end);
-
-        # Really: collect all the .MER files (next we correlate their environments to .LOG files)
-        print(" ...compiling a list of events from {:s} .MER files (GPS & seismic data)..." \
-              .format(mfloat))
-        mevents = events.Events(mfloat_path)
-        # Build list of all S41 profiles recorded
-        ms41s = sbe41.Profiles(mfloat_path)
-        # Build list of all S61 profiles recorded
-        ms61s = sbe61.Profiles(mfloat_path)
-
-        # Concatenate RBR files
-        preprocess.concatenate_rbr_files(mfloat_path);
-        # Build list of all RBR profiles recorded
-        mRBRs = rbr.Profiles(mfloat_path)
-
-        # Collect all the .CYCLE files
-        print(" ...matching those events to {:s} .LOG ('dive') files (GPS & dive metadata)..." \
-              .format(mfloat))
-        cycle_logs = cycles.get_cycles(mfloat_path, mevents, ms41s, ms61s, mRBRs)
-
-        # Verify dive logs are sorted as expected
-        if cycle_logs!= sorted(cycle_logs, key=lambda x: x.start_date):
-            raise ValueError('`cycle_logs` improperly sorted')
-
-        for i, cycle_log in enumerate(cycle_logs):
-            # Create the directory
-            if not os.path.exists(cycle_log.processed_path):
-                os.mkdir(cycle_log.processed_path)
-
-            # Reformat and write .LOG in individual dive directory
-            cycle_log.write_datetime_cycle()
-
-            # Write .MER environment in individual directories
-            cycle_log.write_mermaid_environment_files()
-
-            # Write .S41 environment in individual directories
-            cycle_log.write_s41_environment_file();
-
-            # Write .S61 environment in individual directories
-            cycle_log.write_s61_environment_file();
-
-            # Generate dive plot
-            cycle_log.write_cycle_html(csv_file,optimize=optimized_html,include_plotly=local_html)
-            # <-- timestamps not corrected for clockdrift
-
-            # The GPS list is None outside of requested begin/end dates, within
-            # which it defaults to an empty list if it is truly empty
-            if cycle_log.gps_list is None:
-                continue
-
-            # Validate that the GPS may be used to correct various MERMAID
-            # timestamps, including diving/surfacing and event starttimes
-            cycle_log.validate_gps(min_gps_fix, max_gps_time)
-
-            # Apply clock corrections to the events associated with this
-            # completed dive
-            cycle_log.correct_clockdrifts()
-
-            # Set output (.sac, .mseed) file names of the events associated with
-            # this cycle using the adjusted and corrected event dates
-            cycle_log.set_processed_file_names()
-
-            # Interpolate station locations at various points in the dive
-            cycle_log.compute_station_locations(mixed_layer_depth_m, preliminary_location_ok)
-
-            # Format station-location metadata for ObsPy and attach to complete dive object
-            cycle_log.set_events_obspy_trace_stats()
-
-            # Write profiles html
-            cycle_log.write_profile_html(optimize=optimized_html,include_plotly=local_html)
-
-            # Write profiles data on CSV
-            if csv_file :
-                cycle_log.write_profile_csv();
-
-            # Write requested output files
-            if write_png:
-                cycle_log.write_events_png()
-
-            if write_html:
-                cycle_log.write_events_html(optimize=optimized_html,include_plotly=local_html)
-
-            if write_sac:
-                cycle_log.write_events_sac()
-
-            if write_mseed:
-                cycle_log.write_events_mseed()
-
-            if write_mhpsd:
-                cycle_log.write_events_mhpsd(creation_datestr)
-
-        # Verify events sublists are sorted as expected
-        events_list = [event for cycle in cycle_logs for event in cycle.events]
-        # Sort event lists by corrected starttime is exist => use uncorrected_starttime elsewhere
-        if events_list != sorted(events_list, key=functools.cmp_to_key(sort_events)):
-            raise ValueError('`cycle_logs[*].events` improperly sorted')
-
-        # Generate kml file for Google Earth
-        kml.generate(mfloat_path, mfloat, cycle_logs)
-
-        # Plot vital data
-        vitals.plot_battery_voltage(mfloat_path, mfloat + ".vit", begin, end)
-        vitals.plot_internal_pressure(mfloat_path, mfloat + ".vit", begin, end)
-        vitals.plot_pressure_offset(mfloat_path, mfloat + ".vit", begin, end)
-        if len(cycle_logs) > 1:
-            vitals.plot_corrected_pressure_offset(mfloat_path, cycle_logs, begin, end)
-
-        # NB, at this point, the total event lists associated with `dive_logs`
-        # and `cycle_logs` may differ because the former collects all events
-        # and the latter winnows that list to only include unique events (via
-        # `dives.set_processed_file_names`, which removes redundant events from
-        # individual `cycle_logs.events` lists); ergo, one may use the
-        # existence of `event.station_loc` to determine what events in
-        # `dive_logs` were actually retained in `cycle_logs` (see e.g.,
-        # `events.write_traces_txt`)
-
-        # Write csv and txt files containing all GPS fixes from .LOG and .MER
-        gps.write_gps(cycle_logs, creation_datestr, processed_path, mfloat_path)
-
-        # Write text file detailing event-station location interpolation parameters
-        gps.write_gps_interpolation_txt(cycle_logs,creation_datestr, processed_path, mfloat_path)
-
-        # Write text file detailing which SINGLE .LOG and .MER files define
-        # (possibly incomplete) dives
-        cycles.write_logs_txt(cycle_logs, creation_datestr,  processed_path, mfloat_path)
-
-        # Write text file detailing .CYCLE files (init,complete dives, last dive)
-        cycles.write_cycles_txt(cycle_logs, creation_datestr,  processed_path, mfloat_path,mfloat)
-
-        # Write a text file relating all SAC and mSEED to their associated .LOG
-        # and .MER files
-        events.write_traces_txt(cycle_logs, creation_datestr, processed_path, mfloat_path)
-
-        # Write a text file with our best-guess at the location of MERMAID at
-        # the time of recording
-        events.write_loc_txt(cycle_logs, creation_datestr, processed_path, mfloat_path)
-
-        # Write mseed2sac and automaid metadata csv and text files
-        events.write_obspy_trace_stats(cycle_logs, creation_datestr, processed_path, mfloat_path)
-
-        # Write GeoCSV files
-        geocsv_meta = geocsv.GeoCSV(cycle_logs, creation_datestr, mixed_layer_depth_m)
-        geocsv_meta.write(os.path.join(processed_path, mfloat_path, 'geo.csv'))
-
-        # Clean directories
-        files_to_delete = list()
-        files_to_delete += glob.glob(mfloat_path + "/" + mfloat_nb + "_*.MER")
-        files_to_delete += glob.glob(mfloat_path + "/" + mfloat_nb + "_*.S41")
-        files_to_delete += glob.glob(mfloat_path + "/" + mfloat_nb + "_*.S61")
-        files_to_delete += glob.glob(mfloat_path + "/" + mfloat_nb + "_*.RBR")
-        files_to_delete += glob.glob(mfloat_path + "/" + mfloat_nb + "_*.LOG")
-        files_to_delete += glob.glob(mfloat_path + "/" + mfloat_nb + "_*.BIN")
-        files_to_delete += glob.glob(mfloat_path + "/" + "*.CYCLE")
-        for f in files_to_delete:
-            os.remove(f)
-        # Save the last complete dive of this float to later write output list
-        # of external pressure measurements for the entire array
-        if cycle_logs:
-            lastcycle[mfloat] = cycle_logs[-1]
-
-        # Remove lingering incomplete "IcCycle" folders, if completed
-        mfloat_files = os.listdir(mfloat_path)
-        incomplete_cycles = list(filter(lambda x: 'IcCycle' in x, mfloat_files))
-        for incomplete_cycle in incomplete_cycles:
-            complete_cycle = incomplete_cycle.replace('IcCycle', '')
-            if os.path.exists(os.path.join(mfloat_path, complete_cycle)):
-                shutil.rmtree(os.path.join(mfloat_path, incomplete_cycle))
-
-        with open(mfloat_path + "/" + mfloat + '.pickle', 'wb') as handle:
-            pickle.dump(cycle_logs, handle)
+    # Filter to only run Princeton set
+    if princeton_only:
+        mfloats_sorted = [m for m in mfloats_sorted if m in utils.princeton_mermaids()]
+
+    # Server files of each float: those named <NUMB>_* (the underscore avoids
+    # errors between similar buoy numbers, e.g., 01_* and 0101_*) and the
+    # <FLOAT>.cmd, .out and .vit files
+    mfloats_files = [server_catalog.get_float_files(mfloat) for mfloat in mfloats_sorted]
+
+    # Process each MERMAID float, either serially or in a pool of worker
+    # processes; per-float outputs are identical in either case
+    if jobs > 1:
+        # Parse and compile the decryption databases once: forked workers
+        # inherit them (else each worker parses them at most once)
+        preprocess.decrypt_preload_databases()
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs,
+                                                    initializer=init_worker,
+                                                    initargs=(database_path, events.inversion_cache)) as executor:
+            last_cycles = list(executor.map(process_float, mfloats_sorted, mfloats_files))
+    else:
+        last_cycles = [process_float(mfloat, mfloat_files)
+                       for mfloat, mfloat_files in zip(mfloats_sorted, mfloats_files)]
+
+    # Keep the cache of inverted seismograms within its maximum size
+    if events.inversion_cache is not None:
+        events.inversion_cache.evict()
+
+    # Save the last complete dive of each float
+    for mfloat, last_cycle in zip(mfloats_sorted, last_cycles):
+        if last_cycle is not None:
+            lastcycle[mfloat] = last_cycle
 
     # Done looping through all dives for each float
     #______________________________________________________________________________________#
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+#
+# Part of automaid -- a Python package to process MERMAID files
+# pymaid environment (Python v3.10)
+#
+# Persistent, per-float record of the server files that were processed during
+# the last (successful) run of main.py, and of the settings they were processed
+# with, used to skip floats with no new files and to limit reprocessing to the
+# cycles that new files can affect.
+
+import os
+import json
+import hashlib
+
+import setup
+
+# Get current version number.
+version = setup.get_version()
+
+# Manifest file name (written in processed/<float>/)
+MANIFEST_NAME = "server_manifest.json"
+
+def hash_file(file_path, block_size=1048576):
+    '''Return the SHA-1 hexdigest of the content of a file, read in blocks
+
+    '''
+    sha1 = hashlib.sha1()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+def build(file_paths, previous=None):
+    '''Return a manifest, i.e., a dict whose keys are file names and whose values
+    are dicts of 'size', 'mtime' and 'sha1', of the files in `file_paths`
+
+    The content hash of a file is only recomputed when its size or modification
+    time differ from the entry in the `previous` manifest, if any.
+
+    '''
+    if previous is None:
+        previous = {}
+
+    manifest = {}
+    for file_path in file_paths:
+        file_name = os.path.basename(file_path)
+        stat = os.stat(file_path)
+        entry = {"size": stat.st_size, "mtime": stat.st_mtime}
+
+        old_entry = previous.get(file_name)
+        if old_entry and old_entry["size"] == entry["size"] and old_entry["mtime"] == entry["mtime"]:
+            entry["sha1"] = old_entry["sha1"]
+        else:
+            entry["sha1"] = hash_file(file_path)
+
+        manifest[file_name] = entry
+
+    return manifest
+
+def hash_directory(path):
+    '''Return a dict of the SHA-1 hexdigests of the files in directory `path`
+    by file name (empty if `path` does not exist)
+
+    '''
+    if not os.path.isdir(path):
+        return {}
+
+    return {file_name: hash_file(os.path.join(path, file_name)) for file_name in sorted(os.listdir(path))
+            if os.path.isfile(os.path.join(path, file_name))}
+
+def read(mfloat_path, settings=None):
+    '''Return the manifest written during the last run in `mfloat_path`, or an
+    empty dict if none exists, it is unreadable, or it was written by another
+    version of automaid or with other `settings` (in which case everything must
+    be reprocessed)
+
+    Keyword arguments:
+    mfloat_path -- processed directory of the float
+    settings -- JSON-serializable description of everything besides the server
+                files that the outputs of the float depend on (e.g., its time
+                range, the output options and the decryption databases)
+
+    '''
+    manifest_path = os.path.join(mfloat_path, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return {}
+
+    try:
+        with open(manifest_path, "r") as f:
+            content = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    if content.get("version") != version or content.get("settings") != settings:
+        return {}
+
+    return content.get("files", {})
+
+def write(mfloat_path, manifest, settings=None):
+    '''Write `manifest`, processed with `settings` (see `read`), in
+    `mfloat_path` (via a temporary file so that an interrupted run never leaves
+    a partially-written manifest)
+
+    '''
+    manifest_path = os.path.join(mfloat_path, MANIFEST_NAME)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"version": version, "settings": settings, "files": manifest}, f,
+                  indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+def changed_files(previous, current):
+    '''Return the sorted list of file names that are new, modified, or removed in
+    manifest `current` with respect to manifest `previous`
+
+    '''
+    changed = []
+    for file_name in set(previous) | set(current):
+        old_entry = previous.get(file_name)
+        new_entry = current.get(file_name)
+        if old_entry is None or new_entry is None \
+           or old_entry["size"] != new_entry["size"] \
+           or old_entry["sha1"] != new_entry["sha1"]:
+            changed.append(file_name)
+
+    return sorted(changed)
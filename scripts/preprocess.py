@@ -15,6 +15,7 @@
 
 import glob
 import os
+import sys
 import shutil
 import json
 import requests
@@ -22,7 +23,10 @@ import struct
 import re
 import traceback
 import functools
+import datetime
+import concurrent.futures
 import utils
+import catalog
 from obspy import UTCDateTime
 
 mermaid_path = os.environ["MERMAID"]
@@ -102,6 +106,33 @@ def database_update(path):
                 json.dump(database_list, linkfile, indent=4)
 
 
+def concatenate_stream(file_path, files_to_merge):
+    '''
+
+    Write the concatenation of `files_to_merge` (which may include
+    `file_path` itself) over `file_path`. The files are streamed block by
+    block into a temporary file, which then atomically replaces `file_path`:
+    memory use does not depend on file sizes, an interrupted run never leaves
+    a half-merged file, and a staged file linked to a server file is replaced
+    rather than modified.
+
+    Keyword arguments:
+    file_path -- path of the merged file
+    files_to_merge -- paths of the files to concatenate, in order
+
+    '''
+    tmp_path = file_path + ".tmp"
+    try:
+        with open(tmp_path, "wb") as fl_out:
+            for file_to_merge in files_to_merge:
+                with open(file_to_merge, "rb") as fl:
+                    shutil.copyfileobj(fl, fl_out)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
 '''
 
 Concatenate files with decimal extensions
@@ -110,41 +141,30 @@ Concatenate files with decimal extensions
 
 Keyword arguments:
 path -- Path with source files of one profiler
+files -- catalog.Catalog of `path` (listed here if not given; updated in place)
 
 '''
  # Concatenate .[0-9][0-9][0-9] files .LOG and .BIN files in the path
-def concatenate_files(path):
+def concatenate_files(path, files=None):
+    if files is None:
+        files = catalog.Catalog(path)
     # List log files (not cyphered)
-    files_path = glob.glob(path + "*.LOG")
+    files_path = files.get_files("LOG")
     # Add bin files
-    files_path += glob.glob(path + "*.BIN")
+    files_path += files.get_files("BIN")
     # Concatenate all files
     for file_path in files_path:
-        bin = b''
         # list file with same head than log file
-        files_to_merge = list(glob.glob(file_path[:-4] +".[0-9][0-9][0-9]"))
-        # Add end file to the list
-        files_to_merge.append(file_path)
-        # Sort list => [0000_XXXXXX.000,0000_XXXXXX.001,0000_XXXXXX.002,0000_XXXXXX.LOG]
-        files_to_merge.sort()
-        if len(files_to_merge) > 1:
-            # Need to merge multiple file
-            for file_to_merge in files_to_merge :
-                if file_to_merge[-3:].isdigit():
-                    # Extension with digit => append to string
-                    with open(file_to_merge, "rb") as fl:
-                        bin += fl.read()
-                    # Remove file after read
-                    os.remove(file_to_merge)
-                else :
-                    if len(bin) > 0:
-                        # If log extension is not a digit and the log string is not empty
-                        # we need to add it at the end of the file
-                        with open(file_to_merge, "rb") as fl:
-                            bin += fl.read()
-                        with open(file_to_merge, "wb") as fl:
-                            fl.write(bin)
-                        bin = b''
+        # => [0000_XXXXXX.000,0000_XXXXXX.001,0000_XXXXXX.002]
+        files_to_merge = files.get_fragments(file_path, catalog.FRAGMENT_REGEX)
+        if len(files_to_merge) == 0:
+            continue
+        # Fragments come before the end file; nothing to merge if they are all empty
+        if any(os.path.getsize(file_to_merge) > 0 for file_to_merge in files_to_merge):
+            concatenate_stream(file_path, files_to_merge + [file_path])
+        # Remove fragments once merged
+        for file_to_merge in files_to_merge:
+            files.unlink(file_to_merge)
 
 '''
 
@@ -153,23 +173,78 @@ Concatenate RBR files with decimal extensions
 
 Keyword arguments:
 path -- Path with source files of one profiler
+files -- catalog.Catalog of `path` (listed here if not given; updated in place)
 
 '''
-def concatenate_rbr_files(path):
-    files_path = glob.glob(path + "*.RBR")
+def concatenate_rbr_files(path, files=None):
+    if files is None:
+        files = catalog.Catalog(path)
+    files_path = files.get_files("RBR")
     for file_path in files_path:
         # list file with same head than log file
-        files_to_merge = list(glob.glob(file_path[:-4] +".R[0-9][0-9]"))
-        # Sort list => [0000_XXXXXX.R00,0000_XXXXXX.R01,0000_XXXXXX.R02,0000_XXXXXX.R03]
-        files_to_merge.sort()       
-        for file_to_merge in files_to_merge :
-            bin = b''
-            with open(file_to_merge, "rb") as fl:
-                bin = fl.read()
-            with open(file_path, "ab") as fl:
-                fl.write(bin)
-                # Remove file after append
-                os.remove(file_to_merge)
+        # => [0000_XXXXXX.R00,0000_XXXXXX.R01,0000_XXXXXX.R02,0000_XXXXXX.R03]
+        files_to_merge = files.get_fragments(file_path, catalog.RBR_FRAGMENT_REGEX)
+        if len(files_to_merge) == 0:
+            continue
+        # Append fragments to the .RBR file
+        concatenate_stream(file_path, [file_path] + files_to_merge)
+        # Remove fragments once merged
+        for file_to_merge in files_to_merge:
+            files.unlink(file_to_merge)
+
+# Parsed link and database files of this process, keyed by (path, parser);
+# each value is the (mtime, size, content) of the file when it was parsed so
+# that a file updated since (e.g., by database_update) is parsed again
+parsed_files = dict()
+
+def read_parsed_file(path, parse=json.loads):
+    '''
+
+    Return the content of file `path` as parsed by `parse`, from the cache if
+    the file has not changed since it was last parsed in this process.
+
+    Keyword arguments:
+    path -- file path
+    parse -- function parsing the text of the file
+
+    '''
+    stat = os.stat(path)
+    cached = parsed_files.get((path, parse))
+    if cached is not None and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+    with open(path,"r") as f:
+        content = parse(f.read())
+    parsed_files[(path, parse)] = (stat.st_mtime_ns, stat.st_size, content)
+    return content
+
+def decrypt_parse_cards(database):
+    '''
+
+    Parse and compile the content of a database file (see DecryptCards)
+
+    '''
+    return DecryptCards(json.loads(database))
+
+def decrypt_preload_databases():
+    '''
+
+    Parse the link file and compile every database it lists into the cache
+    of this process, e.g., before forking worker processes which then
+    inherit it instead of each parsing the databases again.
+
+    '''
+    link_path = os.path.join(database_path,DATABASE_LINK_NAME)
+    if not os.path.exists(link_path):
+        return
+    for database in read_parsed_file(link_path):
+        database_file_path = os.path.join(database_path,database["Name"])
+        if database["Name"] and os.path.exists(database_file_path):
+            # A database that cannot be compiled fails each of its files
+            # instead (see decrypt_task)
+            try:
+                read_parsed_file(database_file_path, decrypt_parse_cards)
+            except Exception:
+                pass
 
 # Get database name with linker file and version read on file
 '''
@@ -184,8 +259,7 @@ model -- Model number of the profiler (0:classic;1:Marittimo(Moored version);2:M
 def decrypt_get_database(file_version,model) :
     link_path = os.path.join(database_path,DATABASE_LINK_NAME)
     if os.path.exists(link_path):
-        with open(link_path,"r") as f:
-            databases = json.loads(f.read())
+        databases = read_parsed_file(link_path)
         # get major and minor versions
         file_version=file_version.split(".")
         file_major = 2
@@ -223,422 +297,510 @@ def decrypt_get_database(file_version,model) :
 
 
 
-'''
+# Precompiled unpackers of the BIN records, applied at buffer offsets
+EXPLICIT_HEADER = struct.Struct('<HIBB')    # ID, timestamp, infos, data size
+ARG_HEADER = struct.Struct('<BB')           # argument infos, argument size
+TIMESTAMP = struct.Struct('<I')
+# Explicit arguments keyed by (type, size): type 0 is signed and 1 unsigned
+EXPLICIT_ARGS = {
+    (0, 4): struct.Struct('<i'), (0, 2): struct.Struct('<h'), (0, 1): struct.Struct('<b'),
+    (1, 4): struct.Struct('<I'), (1, 2): struct.Struct('<H'), (1, 1): struct.Struct('<B'),
+}
+# Short arguments keyed by (sign, size)
+SHORT_ARGS = {
+    ("signed", 4): struct.Struct('<i'), ("signed", 2): struct.Struct('<h'), ("signed", 1): struct.Struct('<b'),
+    ("unsigned", 4): struct.Struct('<I'), ("unsigned", 2): struct.Struct('<H'), ("unsigned", 1): struct.Struct('<B'),
+}
+REGEX_SHORT_FORMAT = re.compile(r"[^%]*(%([\-\+ 0])?(\d)*\.?([\d\*])*([dfcsXxupt]))")
+REGEX_CARD_ID = re.compile(r"^0x([0-9A-F]{4})UL$")
+# Errors raised by malformed card items (missing keys, wrong types...)
+CARD_ITEM_ERRORS = (KeyError, IndexError, TypeError, AttributeError, ValueError)
+
+class MalformedCardItem:
+    '''
 
-Decrypts a log line using an expilicit format
-The number and size of arguments is explicitly described in the binary file.
+    Entry of a compiled card for an item that could not be compiled: only the
+    files that use it fail to be decrypted (see decrypt_lookup), as they did
+    when the cards were read as the files were decrypted.
 
-Keyword arguments:
-f -- file reader
-LOG_card -- Object for LOG decryption (database)
-WARN_card -- Object for WARNING decryption (database)
-ERR_card -- Object for ERROR decryption (database)
+    '''
+    def __init__(self, index, error):
+        self.message = "Malformed card item {:d}: {:s}: {:s}".format(index, type(error).__name__, str(error))
 
-'''
+def decrypt_compile_card(card, type_string):
+    '''
 
-def decrypt_explicit(f,LOG_card,WARN_card,ERR_card) :
-    #Read head
-    string = ""
-    IDbytes = f.read(2)
-    if len(IDbytes) != 2 :
-        print("err:IDbytes")
-        return "";
-    TIMESTAMPbytes = f.read(4)
-    if len(TIMESTAMPbytes) != 4 :
-        print("err:TIMESTAMPbytes")
-        return "";
-    INFOSbytes = f.read(1)
-    if INFOSbytes == "" :
-        print("err:INFOSbytes")
-        return "";
-    DATASIZEbytes = f.read(1)
-    if DATASIZEbytes == "" :
-        print("err:DATASIZEbytes")
-        return "";
-    #unpack head
-    try :
-        id = struct.unpack('<H', IDbytes)[0]
-        timestamp = struct.unpack('<I', TIMESTAMPbytes)[0]
-        infos = struct.unpack('<B', INFOSbytes)[0]
-        dataSize = struct.unpack('<B', DATASIZEbytes)[0]
-    except :
-        traceback.print_exc()
-        print("err:header")
-        return "";
-
-    #Process head
-    idString = "0x"+"{0:0{1}X}".format(id,4)+"UL"
-    binaryinfo = "{0:08b}".format(infos)
-    logtype = "00"
-    argformat = "00"
-    logtype = binaryinfo[-2:]
-    argformat = binaryinfo[-4:-2]
-    if argformat != "00":
-        return "";
-
-    #print ("ID : " + str(id))
-    #print ("IDString : " + str(idString))
-    #print ("Timestamp : " + str(timestamp))
-    #print ("Infos : " + str(infos))
-    #print ("BinaryInfos : " + str(binaryinfo))
-    #print ("Type : " + str(type))
-    #print ("ArgFormat : " + str(argformat))
-    #print ("dataSize : " + str(dataSize))
-
-    decrypt_card={}
-    type_string = ""
-    if logtype == "00":
-        decrypt_card = LOG_card
-    elif logtype == "01":
-        type_string = "<WARN>"
-        decrypt_card = WARN_card
-    elif logtype == "10":
-        type_string = "<ERR>"
-        decrypt_card = ERR_card
-    else :
-        type_string = "<DBG>"
+    Compile the explicit (LOG, WARN or ERR) card of a database into a table
+    keyed by log ID. The value of each key is the list of (index, entry) of
+    the card items of that ID, in increasing index order, where an entry is
+    the (prefix, formats) of decrypt_explicit_buffer: the header following the
+    timestamp ("" for "__BLANK__" files) and the formats with their "\r\n"
+    already normalised, each with its "%c" and "%.*s" flags.
 
-    Formats = []
-    File = "MAIN"
+    An item that cannot be compiled is entered as a MalformedCardItem.
 
-    if(id < len(decrypt_card)) :
-        index = id
-    else :
-        index = len(decrypt_card)-1
-    while index >= 0 :
-        if decrypt_card[index]["ID"] == idString:
-            Formats = decrypt_card[index]["FORMATS"]
-            File = decrypt_card[index]["FILE"]
-            break;
-        index = index - 1
-
-    if len(Formats) <= 0 :
-        f.read(dataSize)
-        string += str(timestamp) + ":" + type_string + "["+"{:04d}".format(id)+"] Format not found\r\n"
-        return string
-    #print (Formats)
-    if File != "__BLANK__" :
-        string += str(timestamp) + ":"
-        string +="["+"{:6}".format(File)+","+"{:04d}".format(id)+"]"
-        string += type_string
+    Keyword arguments:
+    card -- Object for LOG, WARN or ERR decryption (database)
+    type_string -- "", "<WARN>" or "<ERR>"
+
+    '''
+    table = {}
+    for index, item in enumerate(card):
+        # Items whose ID is not formatted as those of the binary files (or
+        # that have no ID) never match
+        try:
+            catch = REGEX_CARD_ID.match(item["ID"]) if isinstance(item["ID"], str) else None
+        except CARD_ITEM_ERRORS:
+            catch = None
+        if not catch:
+            continue
+        id = int(catch.group(1), 16)
+        try:
+            if item["FILE"] != "__BLANK__":
+                prefix = ":["+"{:6}".format(item["FILE"])+","+"{:04d}".format(id)+"]" + type_string
+            else:
+                prefix = ""
+            formats = []
+            for Format in item["FORMATS"]:
+                Format = Format.replace(r"\r\n","\r\n")
+                formats.append((Format, "%c" in Format, "%.*s" in Format))
+            entry = (prefix, formats)
+        except CARD_ITEM_ERRORS as e:
+            entry = MalformedCardItem(index, e)
+        table.setdefault(id, []).append((index, entry))
+    return table, len(card)
+
+# Epoch of the %t (timestamp) arguments of SHORT logs, as in UTCDateTime
+TIMESTAMP0 = datetime.datetime(1970, 1, 1)
+
+def decrypt_short_formatter(specifier, format, replace_pattern, precision):
+    '''
+
+    Return a callable formatting one argument value of a SHORT log, with the
+    work that does not depend on the value (e.g., the divisor of scaled
+    floats) done once.
+
+    Keyword arguments:
+    specifier -- "t" (timestamp), "f" (float stored on integer), None (literal
+                 format, the value is ignored) or other (printf)
+    format -- format of the argument (database)
+    replace_pattern -- "%..." specifier pattern of `format`
+    precision -- precision of `replace_pattern` ("" if none)
+
+    '''
+    if specifier == 't':
+        # value is a timestamp; same string as
+        # UTCDateTime(value).isoformat().replace(':','_')
+        parts = format.split(replace_pattern)
+        def formatter(value):
+            isodate = (TIMESTAMP0 + datetime.timedelta(seconds=int(value))).isoformat()
+            return isodate.replace(':','_').join(parts)
+    elif specifier == 'f':
+        # value is a float stored on integer
+        divisor = 1
+        if precision.isnumeric():
+            divisor = 10 ** int(precision)
+        parts = format.split(replace_pattern)
+        argf_format = ("{:." + precision + "f}").format
+        def formatter(value):
+            return argf_format(float(value) / divisor).join(parts)
+    elif specifier is None:
+        def formatter(value=None):
+            return format
+    else:
+        formatter = format.__mod__
+    return formatter
+
+def decrypt_compile_short_card(short_card):
+    '''
+
+    Compile the SHORT card of a database into a table keyed by short ID (see
+    decrypt_compile_card). The entry of each item is (args, record):
+
+    args -- list of tuples (kind, size, unpacker, formatter), one per argument:
+      "literal" -- formatter returns the format as is (unpacker is None)
+      "wrongsize" -- no unpacker for that size (unpacker is the sign)
+      "wrongformat" -- no specifier in the format (formatter is None)
+      "value" -- formatter (decrypt_short_formatter) takes the unpacked value
+    record -- if every argument is valid, (struct, formatters) to decode the
+      timestamp and all arguments of a log at once, else None
+
+    An item that cannot be compiled is entered as a MalformedCardItem.
+
+    Keyword arguments:
+    short_card -- Object for SHORT decryption (database)
+
+    '''
+    table = {}
+    for index, item in enumerate(short_card):
+        # Items without (hashable) ID never match
+        try:
+            items = table.setdefault(item["ID"], [])
+        except CARD_ITEM_ERRORS:
+            continue
+        try:
+            items.append((index, decrypt_compile_short_item(item)))
+        except CARD_ITEM_ERRORS as e:
+            items.append((index, MalformedCardItem(index, e)))
+    return table, len(short_card)
+
+def decrypt_compile_short_item(item):
+    '''
+
+    Return the (args, record) entry of an item of the SHORT card of a database
+    (see decrypt_compile_short_card)
+
+    '''
+    args = []
+    record_format = "<I"
+    for arg in item["ARGS"]:
+        size = arg["SIZE"]
+        if arg["SIGN"] != "signed" and arg["SIGN"] != "unsigned":
+            args.append(("literal", size, None, decrypt_short_formatter(None, arg["FORMAT"], None, None)))
+            # Skipped bytes, still unpacked so that every argument has a value
+            record_format += "{:d}s".format(size) if isinstance(size, int) and size >= 0 else "?"
+            continue
+        unpacker = SHORT_ARGS.get((arg["SIGN"], size))
+        if unpacker is None:
+            args.append(("wrongsize", size, arg["SIGN"], None))
+            continue
+        shortformatfind = REGEX_SHORT_FORMAT.findall(arg["FORMAT"])
+        if len(shortformatfind) == 0:
+            args.append(("wrongformat", size, unpacker, None))
+            continue
+        replace_pattern = shortformatfind[0][0]
+        precision = shortformatfind[0][3]
+        specifier = shortformatfind[0][4]
+        args.append(("value", size, unpacker,
+                     decrypt_short_formatter(specifier, arg["FORMAT"], replace_pattern, precision)))
+        record_format += unpacker.format[1:]
+
+    record = None
+    if all(arg[0] in ("literal", "value") for arg in args) and "?" not in record_format:
+        record = (struct.Struct(record_format), [arg[3] for arg in args])
+    return args, record
+
+def decrypt_lookup(compiled_card, key):
+    '''
+
+    Return the entry of a compiled card (decrypt_compile_card) for `key`, or
+    None. As when walking the card backwards from index `key`, the item of
+    highest index not above `key` (or the last index of the card) is chosen.
+
+    Raises ValueError if that item is malformed (MalformedCardItem), which
+    fails the decryption of the current file only (see decrypt_task).
+
+    '''
+    table, length = compiled_card
+    items = table.get(key)
+    if items is None:
+        return None
+    limit = key if key < length else length - 1
+    for index, entry in reversed(items):
+        if index <= limit:
+            if isinstance(entry, MalformedCardItem):
+                raise ValueError(entry.message)
+            return entry
+    return None
+
+class DecryptCards:
+    '''
+
+    Decryption cards of a database, compiled once into lookup tables (see
+    decrypt_compile_card and decrypt_compile_short_card).
+
+    Keyword arguments:
+    decrypt_list -- Content of a database file (list of cards)
+
+    '''
+    def __init__(self, decrypt_list):
+        cards = {"LOG": [], "WARN": [], "ERR": [], "SHORT": []}
+        for decrypt_card in decrypt_list:
+            if decrypt_card["TYPE"] in cards:
+                cards[decrypt_card["TYPE"]] = decrypt_card["DECRYPTCARD"]
+        # Indexed by log type: 0 for LOG, 1 for WARN, 2 for ERR and 3 for DBG
+        self.explicit = [decrypt_compile_card(cards["LOG"], ""),
+                         decrypt_compile_card(cards["WARN"], "<WARN>"),
+                         decrypt_compile_card(cards["ERR"], "<ERR>"),
+                         ({}, 0)]
+        self.short = decrypt_compile_short_card(cards["SHORT"])
+
+# Type strings of the explicit logs, indexed by log type
+EXPLICIT_TYPE_STRINGS = ["", "<WARN>", "<ERR>", "<DBG>"]
+
+def decrypt_explicit_buffer(data,view,pos,cards) :
+    '''
+
+    Decrypts a log line using an expilicit format, like the former decrypter
+    (see tests_and_verifications/decrypt_reference.py), but from the content
+    of a whole file, starting at offset `pos` (just after "#*")
+
+    Returns the decrypted string and the offset of the next unread byte.
+
+    Keyword arguments:
+    data -- content of the binary file (bytes)
+    view -- memoryview of `data`
+    pos -- offset of the record header
+    cards -- DecryptCards of the database
+
+    '''
+    size = len(data)
+    if pos + EXPLICIT_HEADER.size > size:
+        if pos + 2 > size:
+            print("err:IDbytes")
+        elif pos + 6 > size:
+            print("err:TIMESTAMPbytes")
+        else:
+            print("err:header")
+        return "", size
+    id, timestamp, infos, dataSize = EXPLICIT_HEADER.unpack_from(data, pos)
+    pos += EXPLICIT_HEADER.size
+
+    # Process head
+    logtype = infos & 0b11
+    argformat = (infos >> 2) & 0b11
+    if argformat != 0:
+        return "", pos
+
+    entry = decrypt_lookup(cards.explicit[logtype], id)
+    if entry is None or len(entry[1]) <= 0 :
+        return str(timestamp) + ":" + EXPLICIT_TYPE_STRINGS[logtype] + "["+"{:04d}".format(id)+"] Format not found\r\n", \
+            min(pos + dataSize, size)
+    prefix, Formats = entry
+
+    strings = []
+    if prefix :
+        strings.append(str(timestamp) + prefix)
     index=0
     argIndex=0
     if dataSize > 0:
         while index < dataSize :
-            #Read Argument Head
-            ARGINFOSByte = f.read(1)
-            if ARGINFOSByte == "":
-                print("err:ARGINFOSByte")
-                return "";
-            ARGSIZEByte = f.read(1)
-            if ARGSIZEByte == "":
-                print("err:ARGSIZEByte")
-                return "";
-            #Unpack Argument Head
-            try :
-                ArgInfos=struct.unpack('<B', ARGINFOSByte)[0]
-                ArgSize = struct.unpack('<B', ARGSIZEByte)[0]
-            except :
-                traceback.print_exc()
+            # Read Argument Head
+            if pos + ARG_HEADER.size > size:
                 print("err:INFOSSIZE")
-                return "";
-
-            #Process Argument Head
-            ArgInfosBinary="{0:08b}".format(ArgInfos)
-            ArgType = ArgInfosBinary[-2:]
-
-            #print ("ArgInfosBinary : " + str(ArgInfosBinary))
-            #print ("ArgType : " + str(ArgType))
-            #print ("ArgSize : " + str(ArgSize))
+                return "", size
+            ArgInfos, ArgSize = ARG_HEADER.unpack_from(data, pos)
+            pos += ARG_HEADER.size
+            ArgType = ArgInfos & 0b11
             index = index+2
-            Formats[argIndex] = Formats[argIndex].replace(r"\r\n","\r\n")
+            Format, is_char, is_star = Formats[argIndex]
             if ArgSize > 0:
                 Arg = 0
-                if ArgType == "00":
-                    if ArgSize == 4:
-                        ArgByte = f.read(4)
-                        if len(ArgByte) != 4 :
-                            print("err:TYPE00SIZE04")
-                            return "";
-                        try :
-                            Arg = struct.unpack('<i', ArgByte)[0]
-                        except :
-                            traceback.print_exc()
-                            print("err:TYPE00SIZE04")
-                            return "";
-                    elif ArgSize == 2:
-                        ArgByte = f.read(2)
-                        if len(ArgByte) != 2 :
-                            print("err:TYPE00SIZE02")
-                            return "";
-                        try :
-                            Arg = struct.unpack('<h', ArgByte)[0]
-                        except :
-                            traceback.print_exc()
-                            print("err:TYPE00SIZE02")
-                            return "";
-                    elif ArgSize == 1:
-                        ArgByte = f.read(1)
-                        if ArgByte == "" :
-                            print("err:TYPE00SIZE01")
-                            return "";
-                        try :
-                            Arg = struct.unpack('<b', ArgByte)[0]
-                        except :
-                            traceback.print_exc()
-                            print("err:TYPE00SIZE01")
-                            return "";
-                elif ArgType == "01":
-                    # unsigned integer
-                    if ArgSize == 4:
-                        ArgByte = f.read(4)
-                        if len(ArgByte) != 4 :
-                            print("err:TYPE01SIZE04")
-                            return "";
-                        try :
-                            Arg = struct.unpack('<I', ArgByte)[0]
-                        except :
-                            traceback.print_exc()
-                            print("err:TYPE01SIZE04")
-                            return "";
-                    elif ArgSize == 2:
-                        ArgByte = f.read(2)
-                        if len(ArgByte) != 2 :
-                            print("err:TYPE01SIZE02")
-                            return "";
-                        try :
-                            Arg = struct.unpack('<H', ArgByte)[0]
-                        except :
-                            traceback.print_exc()
-                            print("err:TYPE01SIZE02")
-                            return "";
-                    elif ArgSize == 1:
-                        ArgByte = f.read(1)
-                        if ArgByte == "":
-                            print("err:TYPE01SIZE01")
-                            return "";
-                        try :
-                            Arg = struct.unpack('<B', ArgByte)[0]
-                        except :
-                            traceback.print_exc()
-                            print("err:TYPE01SIZE01")
-                            return "";
-                elif ArgType == "11":
+                unpacker = EXPLICIT_ARGS.get((ArgType, ArgSize))
+                if unpacker is not None:
+                    # signed or unsigned integer
+                    if pos + ArgSize > size:
+                        print("err:TYPE{:02b}SIZE{:02d}".format(ArgType, ArgSize))
+                        return "", size
+                    Arg = unpacker.unpack_from(data, pos)[0]
+                    pos += ArgSize
+                elif ArgType == 0b11:
                     # string
-                    ArgByte = f.read(ArgSize)
-                    if len(ArgByte) != ArgSize :
-                        print("err:TYPE11")
-                        return "";
-                    if ArgByte[ArgSize-1] == 0 :
-                        ArgByte = ArgByte[:-1]
-                    Arg = ArgByte
-                    try :
-                        Arg = Arg.decode('ascii', 'ignore')
-                    except :
-                        traceback.print_exc()
+                    if pos + ArgSize > size:
                         print("err:TYPE11")
-                        return "";
-                    #replace none ascii characters
-                #print (ArgSize)
-                #print ("Format : " + str(Formats[argIndex]) + "\r\n")
+                        return "", size
+                    end = pos + ArgSize
+                    if data[end-1] == 0 :
+                        end = end - 1
+                    Arg = str(view[pos:end], 'ascii', 'ignore')
+                    pos += ArgSize
                 try :
-                    if "%c" in Formats[argIndex]:
+                    if is_char:
                         if Arg < 0 :
                             Arg = 0
                         elif Arg > 0x10FFFF:
                             Arg = 0x10FFFF
 
-                    if "%.*s" in Formats[argIndex]:
-                        string += (Formats[argIndex] % (ArgSize,Arg))
+                    if is_star:
+                        strings.append(Format % (ArgSize,Arg))
                     else :
-                        string += (Formats[argIndex] % Arg)
+                        strings.append(Format % Arg)
                 except :
                     traceback.print_exc()
-                    print("error format \"{}\" ARG {}".format(Formats[argIndex],Arg))
-                    return "";
+                    print("error format \"{}\" ARG {}".format(Format,Arg))
+                    return "", pos
             else :
-                #print ("Format : " + str(Formats[argIndex]) + "\r\n")
-                string += str(Formats[argIndex])
+                strings.append(Format)
                 index = index + 1
             index = index + ArgSize
             argIndex = argIndex + 1
     else :
-        #print ("Format : " + (Formats[0].replace(r"\r\n","\r\n")) + "\r\n")
-        string += str(Formats[0].replace(r"\r\n","\r\n"))
-    string += "\r\n"
-    return string
+        strings.append(Formats[0][0])
+    strings.append("\r\n")
+    return "".join(strings), pos
 
-def decrypt_short(f,short_card) :
+def decrypt_short_buffer(data,pos,cards) :
     '''
 
-    Decrypts a log line using an short format
-    The number and size of arguments is implicit.
-    Only frequently recurring logs use this format.
-    (Pressure measurement, Pump time, valve time ...)
+    Decrypts a log line using an short format, like the former decrypter (see
+    tests_and_verifications/decrypt_reference.py), but from the content of a
+    whole file, starting at offset `pos` (just after "@")
+
+    Returns the decrypted string and the offset of the next unread byte.
 
     Keyword arguments:
-    f -- file reader
+    data -- content of the binary file (bytes)
+    pos -- offset of the short ID
+    cards -- DecryptCards of the database
 
     '''
-    string = ""
-    id = f.read(1)
-    format = ""
-    shortId = 256
-    if id == "" :
-        print("err:EMPTYSHORTID")
-        return "";
-    try :
-        shortId = struct.unpack('<B', id)[0]
-    except :
-        traceback.print_exc()
+    size = len(data)
+    if pos >= size :
         print("err:UNPACKSHORTID")
-        return "";
+        return "", size
+    shortId = data[pos]
+    pos += 1
 
     # Search formats link to short log
-    args = []
-    if(shortId < len(short_card)) :
-        index = shortId
-    else :
-        index = len(short_card)-1
-    while index >= 0 :
-        if short_card[index]["ID"] == shortId:
-            args = short_card[index]["ARGS"]
-            break;
-        index = index - 1
-    if len(args) == 0 :
+    entry = decrypt_lookup(cards.short, shortId)
+    if entry is None or len(entry[0]) == 0 :
         print("err:NoShortFormatFound")
-        return ""
+        return "", pos
+    args, record = entry
 
+    # Decode the timestamp and all arguments at once
+    if record is not None and pos + record[0].size <= size :
+        values = record[0].unpack_from(data, pos)
+        strings = [formatter(value) for formatter, value in zip(record[1], values[1:])]
+        return str(values[0]) + ":" + "".join(strings) + "\r\n", pos + record[0].size
+
+    # Else decode argument by argument (to report errors where they occur)
     # Get timestamp
-    timestamp_bytes = f.read(4)
-    if len(timestamp_bytes) != 4 :
+    if pos + TIMESTAMP.size > size :
         print("err:timestamp")
-        return ""; 
-    try :
-        timestamp = struct.unpack('<I', timestamp_bytes)[0]     
-    except :
-        traceback.print_exc()    
-        print("err:unpacktimestamp")
-        return ""
+        return "", size
+    timestamp = TIMESTAMP.unpack_from(data, pos)[0]
+    pos += TIMESTAMP.size
+
     # Init format with timestamp
-    format_str = str(timestamp) + ":"   
-    for arg in args:
-        size = arg["SIZE"]
-        value = f.read(size)
-        if len(value) != size :
+    strings = [str(timestamp), ":"]
+    for kind, arg_size, unpacker, formatter in args:
+        if pos + arg_size > size :
             print("err:valueSize")
-            return ""
-        unpack_arg = ""
-        # get format of value
-        if arg["SIGN"] == "signed":
-            if size == 4:
-                unpack_arg = '<i'
-            elif size == 2:
-                unpack_arg = '<h'
-            elif size == 1:
-                unpack_arg = '<b'
-            else :
-                print("err:wrongsignedformat")
-        elif arg["SIGN"] == "unsigned":
-            if size == 4:
-                unpack_arg = '<I'
-            elif size == 2:
-                unpack_arg = '<H'
-            elif size == 1:
-                unpack_arg = '<B'
-            else :
-                print("err:wrongunsignedformat")
-        else :
-            format_str = format_str + arg["FORMAT"]
+            return "", size
+        value_pos = pos
+        pos += arg_size
+        if kind == "literal":
+            strings.append(formatter())
             continue
-        # unpack argument value
-        try :
-            arg_value = struct.unpack(unpack_arg, value)[0]
-        except :
-            traceback.print_exc()    
+        if kind == "wrongsize":
+            print("err:wrong" + unpacker + "format")
             print("err:unpackvalue")
-            return ""   
-        # seach specific format
-        regexShortFomat = r"[^%]*(%([\-\+ 0])?(\d)*\.?([\d\*])*([dfcsXxupt]))"
-        shortformatfind = re.findall(regexShortFomat, arg["FORMAT"])
-        if len(shortformatfind) == 0 :
+            return "", pos
+        arg_value = unpacker.unpack_from(data, value_pos)[0]
+        if kind == "wrongformat":
             print("err:wrongformat")
-            return ""
+            return "", pos
+        strings.append(formatter(arg_value))
+    strings.append("\r\n")
+    return "".join(strings), pos
 
-        replace_pattern = shortformatfind[0][0]
-        flags = shortformatfind[0][1]
-        width = shortformatfind[0][2]
-        precision = shortformatfind[0][3]
-        specifier = shortformatfind[0][4]
-        if specifier == 't' :
-            # value is a timestamp
-            isodate = UTCDateTime(int(arg_value)).isoformat().replace(':','_')
-            isodate.replace(":","_")
-            format_str = format_str + arg["FORMAT"].replace(replace_pattern,isodate)
-        elif specifier == 'f' :
-            # value is a float stored on integer
-            divisor = 1
-            if precision.isnumeric():
-                divisor = 10 ** int(precision)
-            argf = float(arg_value) / divisor
-            argf_format = "{:." + precision + "f}"
-            argf_str = argf_format.format(argf)
-            format_str = format_str + arg["FORMAT"].replace(replace_pattern,argf_str)
-        else :
-            format_str = format_str + arg["FORMAT"] % arg_value
-    return format_str + "\r\n"       
+def decrypt_buffer(data,cards):
+    '''
+
+    Decrypt the whole content of a binary file: jump from record marker to
+    record marker ("#*" for explicit and "@" for short logs) with bytes.find
+    instead of reading the file byte by byte. The output is identical to that
+    of the former, byte-by-byte decrypter (see
+    tests_and_verifications/decrypt_reference.py).
 
+    Keyword arguments:
+    data -- content of the binary file (bytes)
+    cards -- DecryptCards of the database
+
+    '''
+    view = memoryview(data)
+    size = len(data)
+    strings = []
+    # The first byte of the file is never a marker
+    pos = 1
+    next_explicit = -1
+    next_short = -1
+    while pos < size:
+        # Offsets of the next "#" and "@" (or the end of the file)
+        if next_explicit < pos:
+            next_explicit = data.find(b'#', pos)
+            if next_explicit < 0:
+                next_explicit = size
+        if next_short < pos:
+            next_short = data.find(b'@', pos)
+            if next_short < 0:
+                next_short = size
+        if next_short < next_explicit:
+            string, pos = decrypt_short_buffer(data, next_short + 1, cards)
+            strings.append(string)
+        elif next_explicit < size:
+            # The byte following "#" is consumed whether it is "*" or not
+            if data[next_explicit+1:next_explicit+2] == b'*':
+                string, pos = decrypt_explicit_buffer(data, view, next_explicit + 2, cards)
+                strings.append(string)
+            else:
+                pos = next_explicit + 2
+        else:
+            break
+    return "".join(strings)
 
 # Decrypt one file with LOG, WARN,and ERR cards give in arguments
-def decrypt_one(path,LOG_card,WARN_card,ERR_card,short_card):
+def decrypt_one(path,cards):
     '''
 
-    Read a file byte by byte and wait for header characters.
-    Depending on the header, we decrypt an explicit (decrypt_explicit) or implicit log (decrypt_short).
+    Read a whole file at once and decrypt its content (decrypt_buffer).
 
     Keyword arguments:
-    f -- file reader
-    LOG_card -- Object for LOG decryption (database)
-    WARN_card -- Object for WARNING decryption (database)
-    ERR_card -- Object for ERROR decryption (database)
+    path -- binary file path
+    cards -- DecryptCards of the database
 
     '''
-    #parse data
-    string =""
     with open(path, "rb") as f:
-        byte = f.read(1)
-        while byte != b'':
-            byte = f.read(1)
-            if byte != b'#':
-                if byte != b'@':
-                    continue
-                else :
-                    string += decrypt_short(f,short_card);
-            else :
-                byte = f.read(1)
-                if byte != b'*':
-                    continue
-                else :
-                    string += decrypt_explicit(f,LOG_card,WARN_card,ERR_card);
-    return string
-
+        data = f.read()
+    return decrypt_buffer(data,cards)
 
 # Decrypt all BIN files in a path
-def decrypt_all(path):
+def decrypt_task(binary_file, database_file_path):
+    '''
+    Decrypt one binary file with the (cached) cards of its database; may run
+    in a worker process of decrypt_all.
+
+    Returns (result, None), or (None, traceback) if the decryption failed.
+
+    Keyword arguments:
+    binary_file -- binary file path
+    database_file_path -- database file path
+
+    '''
+    try :
+        result = decrypt_one(binary_file,read_parsed_file(database_file_path, decrypt_parse_cards))
+    except:
+        return None, traceback.format_exc()
+    return result, None
+
+def decrypt_all(path, files=None, jobs=1):
     '''
     Decrypt all Binary file within a folder.
     1/ Read profiler software version and model number
     2/ Get database file
-    3/ Read byte by byte file and decrypt it into .LOG file
+    3/ Read file and decrypt it into .LOG file (with the cards compiled once per database, see read_parsed_file)
     4/ Delete binary file
 
+    Files are independent of one another once their database is known: with
+    `jobs` greater than one, step 3/ runs in a pool of worker processes. The
+    .LOG files are written, and the binary files deleted, in the same order
+    either way; a file whose decryption fails ("FORMAT ERROR") is kept and
+    does not affect the others.
+
     Keyword arguments:
     path -- folder path
+    files -- catalog.Catalog of `path` (listed here if not given; updated in place)
+    jobs -- number of worker processes (default 1: decrypt in this process)
 
     '''
+    if files is None:
+        files = catalog.Catalog(path)
     # Generate List of BINS file
-    files_to_decrypt = glob.glob(path + "*.BIN")
+    files_to_decrypt = files.get_files("BIN")
     files_decrypted = list()
+    # (binary file, log file, database file) of each file to decrypt
+    tasks = list()
     for binary_file in files_to_decrypt :
         # Get version line
         with open(binary_file, "r", errors='replace') as f:
@@ -665,46 +827,47 @@ def decrypt_all(path):
             if database_file != "" :
                 database_file_path = os.path.join(database_path,database_file)
                 if os.path.exists(database_file_path):
-                    # Read and Parse Database binary_file
-                    database =""
-                    with open(database_file_path,"r") as f:
-                        database = f.read()
-                    bin = b''
-                    with open(binary_file,"rb") as bin_file:
-                        bin = bin_file.read()
-
                     log_file = binary_file.replace(".BIN",".LOG")
                     binary_file_name = os.path.basename(binary_file)
                     log_file_name = binary_file_name.replace(".BIN",".LOG")
 
                     print("convert " + binary_file_name + " to " + log_file_name)
-                    decrypt_list = json.loads(database)
-                    log_card = []
-                    warn_card = []
-                    err_card = []
-                    short_card = []
-                    for decrypt_card in decrypt_list:
-                        if decrypt_card["TYPE"] == "LOG":
-                            log_card = decrypt_card["DECRYPTCARD"]
-                        elif decrypt_card["TYPE"] == "WARN":
-                            warn_card = decrypt_card["DECRYPTCARD"]
-                        elif decrypt_card["TYPE"] == "ERR":
-                            err_card = decrypt_card["DECRYPTCARD"]
-                        elif decrypt_card["TYPE"] == "SHORT":
-                            short_card = decrypt_card["DECRYPTCARD"]
-                    try :
-                        result = decrypt_one(binary_file,log_card,warn_card,err_card,short_card)
-                    except:
-                        print(("FORMAT ERROR :" +str(binary_file)))
-                        traceback.print_exc()
-                    else:
-                        if result :
-                            with open(log_file,"w") as f:
-                                f.write(result)
-                            files_decrypted.append(log_file)
-                        os.remove(binary_file)
+                    # Read, parse and compile each database once per process
+                    # (here, before any worker process is forked); a database
+                    # that cannot be compiled fails each of its files instead
+                    # (see decrypt_task)
+                    try:
+                        read_parsed_file(database_file_path, decrypt_parse_cards)
+                    except Exception:
+                        pass
+                    tasks.append((binary_file, log_file, database_file_path))
                 else:
                     print(("No database : " + str(database_file_path)))
+
+    # Decrypt the files, in order or in worker processes (whose results are
+    # still returned in order)
+    executor = None
+    if jobs > 1 and len(tasks) > 1:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=jobs)
+        results = executor.map(decrypt_task,
+                                [task[0] for task in tasks],
+                                [task[2] for task in tasks])
+    else:
+        results = (decrypt_task(task[0], task[2]) for task in tasks)
+    try:
+        for (binary_file, log_file, _), (result, error) in zip(tasks, results):
+            if error is not None:
+                print(("FORMAT ERROR :" +str(binary_file)))
+                print(error, end="", file=sys.stderr)
+            else:
+                if result :
+                    with files.create(log_file,"w") as f:
+                        f.write(result)
+                    files_decrypted.append(log_file)
+                files.unlink(binary_file)
+    finally:
+        if executor is not None:
+            executor.shutdown()
     return files_decrypted
 
 
@@ -748,9 +911,115 @@ def sort_log_files(a,b):
 
 
 
-def convert_in_cycle(path,begin,end):
+# Tags of the lines of a LOG file (see classify_log_line)
+LINE_DIVING = 1         # e.g., "[DIVING, 123]P  +1234mbar reached"
+LINE_SWITCHING = 2      # "*** switching to ..."
+LINE_GPS_FIX = 4        # "GPS fix..."
+LINE_NO_FIX = 8         # "<timestamp>:[...]<WARN>no fix after ..."
+LINE_GPSACK = 16        # "$GPSACK:...;"
+LINE_GPS = 32           # "<timestamp>:[...]N12deg34.567mn..."
+
+REGEX_LINE_DIVING = re.compile(r"\[DIVING, *\d+\]P? *(\+?\-?\d+)mbar reached")
+REGEX_LINE_NO_FIX = re.compile(r"(\d+):\[.+\]<WARN>no fix after")
+REGEX_LINE_GPSACK = re.compile(r"\$GPSACK:.+;")
+REGEX_LINE_GPS = re.compile(r"(\d+):\[\w+ *, *\d+\]([S,N])(\d+)deg(\d+.\d+)mn")
+REGEX_LINE_TIMESTAMP = re.compile(r"(\d+):")
+REGEX_LINE_INTERNAL_PRESSURE = re.compile(r'(\d+):.+internal pressure (-?\d+)Pa')
+REGEX_LINE_BYPASS = re.compile(r'(\d+):(\[.+\])? +bypass (\d+)ms (\d+)ms')
+
+def classify_log_line(line):
+    '''
+    Tag a line of a LOG file once: cheap substring tests select the few lines
+    on which each (compiled) regex is actually run.
+
+    Returns the tags (bitwise OR of LINE_*) and the timestamp of the "no fix
+    after" warning (or None).
+
+    Keyword arguments:
+    line -- line of a LOG file
+
+    '''
+    tags = 0
+    no_fix_timestamp = None
+    if "mbar reached" in line and REGEX_LINE_DIVING.search(line):
+        tags |= LINE_DIVING
+    if "*** switching to" in line:
+        tags |= LINE_SWITCHING
+    if "GPS fix..." in line:
+        tags |= LINE_GPS_FIX
+    if "<WARN>no fix after" in line:
+        catch = REGEX_LINE_NO_FIX.search(line)
+        if catch:
+            tags |= LINE_NO_FIX
+            no_fix_timestamp = catch.group(1)
+    if "$GPSACK:" in line and REGEX_LINE_GPSACK.search(line):
+        tags |= LINE_GPSACK
+    if "deg" in line and REGEX_LINE_GPS.search(line):
+        tags |= LINE_GPS
+    return tags, no_fix_timestamp
+
+# Name of the file (in the processed directory of a float) recording where the
+# cycle assembly of the last run stopped, see convert_in_cycle
+CYCLE_STATE_NAME = "cycle_state.json"
+
+def read_cycle_state(path):
+    '''
+    Return the cycle assembly state written by the last run in `path`, or
+    None if there is none (or if it is unreadable)
+
+    '''
+    state_path = os.path.join(path, CYCLE_STATE_NAME)
+    if not os.path.exists(state_path):
+        return None
+    try:
+        with open(state_path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_cycle_state(path, state):
+    '''
+    Write the cycle assembly state returned by convert_in_cycle in `path`
+    (via a temporary file), or remove any previous one if `state` is None
+
+    '''
+    state_path = os.path.join(path, CYCLE_STATE_NAME)
+    if state is None:
+        if os.path.exists(state_path):
+            os.remove(state_path)
+        return
+    with open(state_path + ".tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(state_path + ".tmp", state_path)
+
+def is_cycle_state_valid(state, changed_files, begin, end):
+    '''
+    Return True if convert_in_cycle may resume from `state`, i.e., if the
+    LOGs it read are still those of the time range of analysis (same `begin`,
+    and `end` still after its last LOG; `end` is generally the present) and
+    none of the server files in `changed_files` (new, modified or removed)
+    that make up a LOG (.LOG, .BIN or fragment) dates from before the end of
+    its last complete cycle
+
+    Keyword arguments:
+    state -- cycle assembly state (see convert_in_cycle)
+    changed_files -- names of the new, modified or removed server files
+    begin -- start of the time range of analysis
+    end -- end of the time range of analysis
+
+    '''
+    last_log_date = int(get_hexa_date(state["last_log"]),16)
+    if state["begin"] != str(begin) or not UTCDateTime(last_log_date) < end:
+        return False
+    for file_name in changed_files:
+        catch = re.match(r"^\d+_([0-9A-F]+)\.(LOG|BIN|[0-9]{3})$", file_name)
+        if catch and int(catch.group(1),16) <= last_log_date:
+            return False
+    return True
+
+def iter_cycles(path,begin,end,files=None,state=None):
     '''
-    Convert all *.LOG files into .CYCLE (LOG >= begin and LOG < end)
+    Assemble all *.LOG files into cycles (LOG >= begin and LOG < end)
     1/ Merge all initialization files before first complete dive (cycle 0)
     2/ Fixes potential datation errors (e.g., 25_643FB6EF.LOG)
     3/ A complete cycle includes :
@@ -763,25 +1032,52 @@ def convert_in_cycle(path,begin,end):
     <CYCLE_NB> : CYCLE NUMBER (0:initialization 1:First dive...)
     <HEXADATE> : Date of file start / Number of seconds from epoch date (January 1st, 1970 at UTC) in hexadecimal format
 
+    Generator of the (cycle_name, content) records of the cycles, in order,
+    where `cycle_name` is the name of the .CYCLE file (e.g., 0001_5E709B26.CYCLE)
+    and `content` its content.  Nothing is written to disk (see
+    convert_in_cycle).
+
+    The assembly may resume from the `state` returned by a previous call
+    (see is_cycle_state_valid): the cycles completed then are not rebuilt,
+    and only the LOGs after the one that ended the last of them are read.
+
+    Returns (as the value of StopIteration) the state at the end of the last
+    complete cycle (or None if there is none), a dict of:
+        begin -- str() of `begin`
+        cycle_nb -- number of the cycle following the last complete cycle
+        cycle_file_name -- name of that cycle (without extension)
+        last_log -- name of the LOG that ended the last complete cycle
+        content -- content carried over to the following cycle
+
     Keyword arguments:
     path -- process path
     begin -- UTCDateTime() object
     end -- UTCDateTime() object
+    files -- catalog.Catalog of `path` (listed here if not given)
+    state -- state to resume from (default None: assemble all cycles)
 
     '''
+    if files is None:
+        files = catalog.Catalog(path)
     # Init cycle nb
     cycle_nb = 0
     # List all LOG files
-    logFiles = glob.glob(os.path.join(path,"*.LOG"));
+    logFiles = files.get_files("LOG");
     # Sort files by names
     logFiles = sorted(logFiles, key=functools.cmp_to_key(sort_log_files))
     # Init Log index
     iLog = 0
-    # Init Content of cycle file
-    content = ""
-    #Init file name and path variables
+    # Init Content of cycle file (list of strings, joined when written)
+    content = []
+    #Init file name variable
     cycle_file_name = None
-    cycle_file_path = ""
+    # Resume after the last complete cycle of a previous call
+    if state is not None:
+        cycle_nb = state["cycle_nb"]
+        cycle_file_name = state["cycle_file_name"]
+        content = [state["content"]]
+        last_log_date = int(get_hexa_date(state["last_log"]),16)
+        logFiles = [f for f in logFiles if int(get_hexa_date(f),16) > last_log_date]
     # Split the path
     # Set default delimiter
     delim = "\r\n"
@@ -793,10 +1089,9 @@ def convert_in_cycle(path,begin,end):
         start_date = utils.get_date_from_file_name(os.path.basename(logFile))
         # File has been done during buoy lifetime ?
         if start_date >= begin and start_date < end :
-            # Init cycle path and cycle name with first file created during lifetime
+            # Init cycle name with first file created during lifetime
             if not cycle_file_name :
                 cycle_file_name = "{:04d}".format(0) + "_" + get_hexa_date(logFile)
-                cycle_file_path = os.path.join(path,cycle_file_name)
             # Init last date
             last_date = start_date
             with open(logFile, "rb") as f:
@@ -805,7 +1100,8 @@ def convert_in_cycle(path,begin,end):
                 if not fileRead :
                     iLog = iLog +1
                     continue
-                fileFixed = ""
+                # Lines of the LOG with time fixed (joined with `delim`)
+                fileFixed = []
                 # Get current delimiter char
                 delim = utils.get_log_delimiter(fileRead)
                 if not delim:
@@ -821,58 +1117,56 @@ def convert_in_cycle(path,begin,end):
                 gps_fix_none = 0
                 is_emergency = False
                 is_reboot_in_dive = False
+                before_dive = None
+                # Timestamp of the last line (start date by default)
+                last_datetime = str(int(last_date.timestamp))
                 lines = utils.split_log_lines(fileRead)
                 for line in lines:
-                    # Is diving ?
-                    if not is_dive and re.findall(r"\[DIVING, *\d+\]P? *(\+?\-?\d+)mbar reached", line) :
-                        is_dive = True
-                    # File is switched ?
-                    if not is_finish and re.findall(r"\*\*\* switching to.*", line) :
-                        is_finish = True
-                    # Gps fix ?
-                    if not is_gps_fix and re.findall(r"GPS fix\.\.\.", line) :
-                        is_gps_fix = True
-
-                    # No GPS without gps fix date ?
-                    gps_none_line = re.findall(r"(\d+):\[.+\]<WARN>no fix after",line)
-                    if gps_none_line:
-                        if not is_gps_fix :
-                            last_datetime = str(int(gps_none_line[0]) - 180)
-                            fileFixed += last_datetime + ":[SURF  ,0022]GPS fix..." + delim
-                            gps_fix_none = 1
+                    # Empty lines (e.g., the only line of a LOG holding a
+                    # single newline) are kept as is, without being classified
+                    if not line:
+                        fileFixed.append(line)
+                        continue
+                    tags, no_fix_timestamp = classify_log_line(line)
+                    if tags:
+                        # Is diving ?
+                        if tags & LINE_DIVING :
+                            is_dive = True
+                        # File is switched ?
+                        if tags & LINE_SWITCHING :
+                            is_finish = True
+                        # Gps fix ?
+                        if tags & LINE_GPS_FIX :
+                            is_gps_fix = True
+
+                        # No GPS without gps fix date ?
+                        if tags & LINE_NO_FIX:
+                            if not is_gps_fix :
+                                fileFixed.append(str(int(no_fix_timestamp) - 180) + ":[SURF  ,0022]GPS fix...")
+                                gps_fix_none = 1
+                                is_gps_fix = True
+                            else :
+                                gps_fix_none = gps_fix_none + 1
+                                if gps_fix_none >= 3 :
+                                    is_gps_fix = False
+                                    gps_fix_none = 0
+
+                        # GPS ACK without gps fix date ?
+                        if tags & LINE_GPSACK and not is_gps_fix:
+                            fileFixed.append(last_datetime + ":[SURF  ,0022]GPS fix...")
                             is_gps_fix = True
-                        else :
-                            gps_fix_none = gps_fix_none + 1
-                            if gps_fix_none >= 3 :
-                                is_gps_fix = False
-                                gps_fix_none = 0
-
-                    # GPS ACK without gps fix date ?
-                    gps_ack_line = re.findall(r"\$GPSACK:.+;",line)
-                    if gps_ack_line and not is_gps_fix:
-                        last_datetime = str(int(last_date.timestamp))
-                        fileFixed += last_datetime + ":[SURF  ,0022]GPS fix..." + delim
-                        is_gps_fix = True
-                    # GPS line without gps fix date ?
-                    gps_line = re.findall(r"(\d+):\[\w+ *, *\d+\]([S,N])(\d+)deg(\d+.\d+)mn", line)
-                    if gps_line :
-                        if not is_gps_fix :
-                            last_datetime = str(int(last_date.timestamp))
-                            fileFixed += last_datetime + ":[SURF  ,0022]GPS fix..." + delim
-                        is_gps_fix = False
-                    # Split line and test
-                    catch = re.findall(r"(\d+):", line)
-                    if len(catch) > 0:
-                        datetime = UTCDateTime(int(catch[0]))
-                        if datetime < start_date :
-                            # line timestamp is before the start date ?
-                            # Replace timestamp by last line timestamp or start date by default
-                            # e.g., 25_643FB6EF.LOG
-                            last_datetime = str(int(last_date.timestamp))
-                            line.replace(catch[0],last_datetime)
-                        last_date = datetime
-                    # Append line into a string with time fixed
-                    fileFixed += line + delim
+                        # GPS line without gps fix date ?
+                        if tags & LINE_GPS :
+                            if not is_gps_fix :
+                                fileFixed.append(last_datetime + ":[SURF  ,0022]GPS fix...")
+                            is_gps_fix = False
+                    # Keep the line timestamp (lines timestamped before the start
+                    # date, e.g., 25_643FB6EF.LOG, are written unchanged)
+                    catch = REGEX_LINE_TIMESTAMP.search(line)
+                    if catch:
+                        last_datetime = str(int(catch.group(1)))
+                    # Append line
+                    fileFixed.append(line)
                 # Complete dive ?
                 is_complete_dive = False
                 if is_dive and is_finish :
@@ -884,44 +1178,86 @@ def convert_in_cycle(path,begin,end):
                 # Test if the buoy has dived and surfaced or If the ascent is in the following files
                 if is_complete_dive or is_reboot_in_dive :
                     # Split content to get before diving (First internal pressure mesurement)
-                    content += str(int(get_hexa_date(logFile),16)) + PREPROCESS_INFOS + "Create " + os.path.basename(logFile) + delim
-                    lines = utils.split_log_lines(fileFixed)
-                    before_dive = None
-                    for index, line in enumerate(lines):
+                    content.append(str(int(get_hexa_date(logFile),16)) + PREPROCESS_INFOS + "Create " + os.path.basename(logFile) + delim)
+                    # Index of the last bypass configuration: an internal
+                    # pressure before it is followed by a bypass configuration
+                    last_bypass = -1
+                    for index in range(len(fileFixed) - 1, -1, -1):
+                        if "bypass" in fileFixed[index] and REGEX_LINE_BYPASS.search(fileFixed[index]):
+                            last_bypass = index
+                            break
+                    cut = len(fileFixed)
+                    for index in range(last_bypass):
                         # Wait an internal pressure follower by bypass configuration
-                        internal_pressure = re.findall(r'(\d+):.+internal pressure (-?\d+)Pa', line)
-                        if internal_pressure :
-                            next_index = index
-                            while next_index < len(lines) - 1:
-                                next_index = next_index+1
-                                before_dive = re.findall(r'(\d+):(\[.+\])? +bypass (\d+)ms (\d+)ms', lines[next_index])
-                                if before_dive :
-                                    break;
-                            
-                        # Wait start of next dive
-                        if before_dive :
-                            # exit the loop
-                            content += before_dive[0][0] + PREPROCESS_END + delim
-                            # Write a complete cycle
-                            with open(cycle_file_path + ".CYCLE", "w") as fcycle:
-                                fcycle.write(content)
-                            # Increment cycle nb and change file name
-                            cycle_nb = cycle_nb + 1
-                            cycle_file_name = "{:04d}".format(cycle_nb) + "_" + get_hexa_date(logFile)
-                            cycle_file_path = os.path.join(path,cycle_file_name)
-                            # Reset content with current file (for next cycle)
-                            content = ""
+                        line = fileFixed[index]
+                        if "internal pressure" in line and REGEX_LINE_INTERNAL_PRESSURE.search(line):
+                            for next_line in fileFixed[index+1:last_bypass+1]:
+                                if "bypass" in next_line:
+                                    before_dive = REGEX_LINE_BYPASS.search(next_line)
+                                    if before_dive:
+                                        break
+                            cut = index
                             break
-                        content += line + delim
+                    if cut:
+                        content.append(delim.join(fileFixed[:cut]) + delim)
+                    # Wait start of next dive
+                    if before_dive :
+                        # exit the loop
+                        content.append(before_dive.group(1) + PREPROCESS_END + delim)
+                        # Yield a complete cycle
+                        yield cycle_file_name + ".CYCLE", "".join(content)
+                        # Increment cycle nb and change file name
+                        cycle_nb = cycle_nb + 1
+                        cycle_file_name = "{:04d}".format(cycle_nb) + "_" + get_hexa_date(logFile)
+                        # Reset content with current file (for next cycle)
+                        content = []
                 # Append filename
-                content += str(int(get_hexa_date(logFile),16)) + PREPROCESS_INFOS + "Create " + os.path.basename(logFile) + delim
+                content.append(str(int(get_hexa_date(logFile),16)) + PREPROCESS_INFOS + "Create " + os.path.basename(logFile) + delim)
                 # Append file content
-                content += fileFixed
+                content.append(delim.join(fileFixed) + delim)
+                # Record the state at the end of the complete cycle
+                if before_dive :
+                    state = {"begin": str(begin),
+                             "cycle_nb": cycle_nb,
+                             "cycle_file_name": cycle_file_name,
+                             "last_log": os.path.basename(logFile),
+                             "content": "".join(content)}
         # Next File
         iLog = iLog +1
         #os.remove(logFile)
 
-    # Write last incomplete cycle
+    # Yield last incomplete cycle
     if content :
-        with open(cycle_file_path + ".CYCLE", "w") as fcycle:
-            fcycle.write(content)
+        yield cycle_file_name + ".CYCLE", "".join(content)
+    return state
+
+def convert_in_cycle(path,begin,end,files=None,state=None,write_files=True):
+    '''
+    Assemble all *.LOG files into cycles (see iter_cycles) and return the
+    list of their (cycle_name, content) records, and the state at the end of
+    the last complete cycle
+
+    Keyword arguments:
+    path -- process path
+    begin -- UTCDateTime() object
+    end -- UTCDateTime() object
+    files -- catalog.Catalog of `path` (listed here if not given; updated in place)
+    state -- state to resume from (default None: assemble all cycles)
+    write_files -- also write the .CYCLE files in `path`, e.g., for debugging
+                   or archival (default True)
+
+    '''
+    if files is None:
+        files = catalog.Catalog(path)
+
+    cycle_records = []
+    builder = iter_cycles(path,begin,end,files,state)
+    while True:
+        try:
+            cycle_name, content = next(builder)
+        except StopIteration as stop:
+            return cycle_records, stop.value
+        if write_files:
+            with files.create(cycle_name, "w") as fcycle:
+                fcycle.write(content)
+        cycle_records.append((cycle_name, content))
@@ -66,19 +66,69 @@ def find_timestamped_values(regexp, content):
             timestamped_values.append([v, d])
     return timestamped_values
 
+# Dtype of the structured arrays of timestamped values: Unix Epoch time (int
+# seconds) and value (first item of `re.findall`) of each match
+TIMESTAMPED_DTYPE = np.dtype([("epoch", np.int64), ("value", object)])
+
+def timestamped_array(epochs, values):
+    timestamped_values = np.empty(len(epochs), dtype=TIMESTAMPED_DTYPE)
+    timestamped_values["epoch"] = epochs
+    # Assigned one by one so that tuples (multiple groups) remain single values
+    for i, value in enumerate(values):
+        timestamped_values["value"][i] = value
+    return timestamped_values
+
+# Convert a structured array of TIMESTAMPED_DTYPE to the [value, UTCDateTime]
+# lists of `find_timestamped_values`
+def timestamped_values(timestamped):
+    return [[value, UTCDateTime(int(epoch))] for epoch, value in timestamped]
+
+# Search timestamps for a specific keyword, as `find_timestamped_values`, but
+# return a structured array of TIMESTAMPED_DTYPE -- convert its "epoch" field
+# with `UTCDateTime(int(epoch))` only where dates are output
+def find_timestamped_epochs(regexp, content):
+    epochs = []
+    values = []
+    lines = split_log_lines(content)
+    for line in lines:
+        value_catch = re.findall(regexp, line)
+        if len(value_catch) > 0:
+            timestamp_catch = re.findall(r"(\d+):", line)
+            epochs.append(int(timestamp_catch[0]))
+            values.append(value_catch[0])
+    return timestamped_array(epochs, values)
+
+
+# First "<time>:" of a line of a log
+LOG_TIMESTAMP_REGEX = re.compile(r"(\d+):")
 
-# Format log files
+# Unix Epoch times below which numpy.datetime_as_string gives the same ISO 8601
+# string as UTCDateTime.isoformat() (which goes through floating-point
+# nanoseconds and may print microseconds for later dates)
+MAX_VECTORIZED_EPOCH = 2**32
+
+# Format log files: replace the (first) Unix Epoch time of every line by its ISO
+# 8601 date, converted all at once
 def format_log(log):
-    datetime_log = ""
     lines = split_log_lines(log)
-    for line in lines:
-        catch = re.findall(r"(\d+):", line)
-        if len(catch) > 0:
-            timestamp = catch[0]
-            isodate = UTCDateTime(int(timestamp)).isoformat()
-            datetime_log += line.replace(timestamp, isodate) + "\r\n"
+    catches = [LOG_TIMESTAMP_REGEX.search(line) for line in lines]
+    timestamps = [catch.group(1) for catch in catches if catch]
+    epochs = [int(timestamp) for timestamp in timestamps]
+
+    in_range = [epoch if epoch < MAX_VECTORIZED_EPOCH else 0 for epoch in epochs]
+    isodates = np.datetime_as_string(np.array(in_range, dtype=np.int64).astype("datetime64[s]")).tolist()
+    for i, epoch in enumerate(epochs):
+        if epoch >= MAX_VECTORIZED_EPOCH:
+            isodates[i] = UTCDateTime(epoch).isoformat()
+
+    datetime_log = []
+    isodates = iter(zip(timestamps, isodates))
+    for line, catch in zip(lines, catches):
+        if catch:
+            timestamp, isodate = next(isodates)
+            datetime_log.append(line.replace(timestamp, isodate) + "\r\n")
         else :
-            datetime_log += line + "\r\n"
+            datetime_log.append(line + "\r\n")
     formatted_log = "".join(datetime_log)
     return formatted_log
 
@@ -0,0 +1,57 @@
+# Part of automaid -- a Python package to process MERMAID files
+# pymaid environment (Python v3.10)
+#
+# Compares the former byte-by-byte .BIN decrypter (`decrypt_one_stream`, see
+# decrypt_reference.py) with the buffer-based one (`decrypt_one`) in
+# preprocess.py: verifies that both produce identical .LOG text and prints
+# their run times.
+#
+# Usage:
+# python benchmark_decrypt.py <database.json> <file.BIN> [<file.BIN> ...]
+#
+# where <database.json> is the database of the .BIN files' software version
+# (see $MERMAID/database/Databases.json).
+
+import os
+import sys
+import json
+import time
+
+sys.path.append(os.path.join(os.getenv('AUTOMAID'), 'scripts'))
+import preprocess
+import decrypt_reference
+
+def read_cards(decrypt_list):
+    cards = {"LOG": [], "WARN": [], "ERR": [], "SHORT": []}
+    for decrypt_card in decrypt_list:
+        if decrypt_card["TYPE"] in cards:
+            cards[decrypt_card["TYPE"]] = decrypt_card["DECRYPTCARD"]
+    return cards["LOG"], cards["WARN"], cards["ERR"], cards["SHORT"]
+
+def best_time(decrypt, bin_file, cards, repeat=3):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        result = decrypt(bin_file, *cards)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+with open(sys.argv[1], "r") as f:
+    decrypt_list = json.load(f)
+cards = read_cards(decrypt_list)
+compiled_cards = preprocess.DecryptCards(decrypt_list)
+total_stream = 0
+total_buffer = 0
+for bin_file in sys.argv[2:]:
+    result_stream, time_stream = best_time(decrypt_reference.decrypt_one_stream, bin_file, cards)
+    result_buffer, time_buffer = best_time(preprocess.decrypt_one, bin_file, [compiled_cards])
+    total_stream += time_stream
+    total_buffer += time_buffer
+    print('{:s}: {:s}, stream {:.4f} s, buffer {:.4f} s (x{:.1f})'.format(
+        os.path.basename(bin_file),
+        'identical' if result_stream == result_buffer else 'DIFFERENT',
+        time_stream, time_buffer, time_stream / max(time_buffer, 1e-9)))
+
+print('Total: stream {:.4f} s, buffer {:.4f} s (x{:.1f})'.format(
+    total_stream, total_buffer, total_stream / max(total_buffer, 1e-9)))
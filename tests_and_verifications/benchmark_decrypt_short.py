@@ -0,0 +1,48 @@
+# Part of automaid -- a Python package to process MERMAID files
+# pymaid environment (Python v3.10)
+#
+# Micro-benchmark of the decoding of SHORT logs (frequently recurring logs,
+# e.g., pressure measurements): for every item of the SHORT card of a database,
+# builds one record and compares the former decoder (`decrypt_short` of
+# decrypt_reference.py, reading a file object field by field) with the precompiled one (`decrypt_short_buffer`,
+# one struct.Struct and one formatter per argument for the whole record).
+#
+# Usage:
+# python benchmark_decrypt_short.py <database.json> [<repeat>]
+
+import io
+import os
+import sys
+import json
+import timeit
+
+sys.path.append(os.path.join(os.getenv('AUTOMAID'), 'scripts'))
+import preprocess
+import decrypt_reference
+
+with open(sys.argv[1], "r") as f:
+    decrypt_list = json.load(f)
+repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+
+short_card = []
+for decrypt_card in decrypt_list:
+    if decrypt_card["TYPE"] == "SHORT":
+        short_card = decrypt_card["DECRYPTCARD"]
+cards = preprocess.DecryptCards(decrypt_list)
+
+for item in short_card:
+    if not isinstance(item["ID"], int) or not 0 <= item["ID"] < 256:
+        continue
+    # Short ID, timestamp and arguments (all bytes set to 1)
+    record = bytes([item["ID"]]) + (1600000000).to_bytes(4, "little") \
+        + b"\x01" * sum(arg["SIZE"] for arg in item["ARGS"])
+
+    old = decrypt_reference.decrypt_short(io.BytesIO(record), short_card)
+    new = preprocess.decrypt_short_buffer(record, 0, cards)[0]
+    time_old = min(timeit.repeat(lambda: decrypt_reference.decrypt_short(io.BytesIO(record), short_card),
+                                 number=repeat, repeat=3)) / repeat
+    time_new = min(timeit.repeat(lambda: preprocess.decrypt_short_buffer(record, 0, cards),
+                                 number=repeat, repeat=3)) / repeat
+    print('SHORT {:3d}: {:s}, old {:.2f} us, new {:.2f} us (x{:.1f}) {:s}'.format(
+        item["ID"], 'identical' if old == new else 'DIFFERENT',
+        time_old * 1e6, time_new * 1e6, time_old / max(time_new, 1e-12), new.strip()))
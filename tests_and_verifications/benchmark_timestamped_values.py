@@ -0,0 +1,59 @@
+# Part of automaid -- a Python package to process MERMAID files
+# pymaid environment (Python v3.10)
+#
+# Micro-benchmark of the search of the pressure values of cycles: assembles the
+# cycles of a directory of .LOG files (in memory) and, for each of them,
+# compares `utils.find_timestamped_values` (one [value, UTCDateTime] list per
+# match) with `utils.find_timestamped_epochs` (one structured array of int64
+# Unix Epoch times and values) in time and in number of memory blocks retained
+# by the result.
+#
+# Usage:
+# python benchmark_timestamped_values.py <directory of .LOG files> [<repeat>]
+
+import os
+import sys
+import timeit
+import datetime
+import tracemalloc
+
+sys.path.append(os.path.join(os.getenv('AUTOMAID'), 'scripts'))
+import utils
+import preprocess
+
+path = os.path.join(sys.argv[1], "")
+repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+regexp = r"\]P\s*(\+?\-?\d+)mbar"
+
+def count_blocks(find):
+    '''Return the number of memory blocks allocated and retained by `find()`
+
+    '''
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = find()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    return sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+
+total_old = total_new = 0
+for cycle_name, content in preprocess.iter_cycles(path, datetime.datetime(1000, 1, 1),
+                                                  datetime.datetime(3000, 1, 1)):
+    old = utils.find_timestamped_values(regexp, content)
+    new = utils.find_timestamped_epochs(regexp, content)
+    identical = [[v, d.timestamp] for v, d in old] == [[v, e] for e, v in new]
+
+    time_old = min(timeit.repeat(lambda: utils.find_timestamped_values(regexp, content),
+                                 number=repeat, repeat=3)) / repeat
+    time_new = min(timeit.repeat(lambda: utils.find_timestamped_epochs(regexp, content),
+                                 number=repeat, repeat=3)) / repeat
+    blocks_old = count_blocks(lambda: utils.find_timestamped_values(regexp, content))
+    blocks_new = count_blocks(lambda: utils.find_timestamped_epochs(regexp, content))
+    total_old += time_old
+    total_new += time_new
+
+    print('{:s}: {:s}, {:5d} values, old {:.2f} ms ({:6d} blocks), new {:.2f} ms ({:6d} blocks)'.format(
+        cycle_name, 'identical' if identical else 'DIFFERENT', len(new),
+        time_old * 1e3, blocks_old, time_new * 1e3, blocks_new))
+
+print('Total: old {:.3f} s, new {:.3f} s, {:.3f} s saved'.format(total_old, total_new, total_old - total_new))
@@ -0,0 +1,415 @@
+# Part of automaid -- a Python package to process MERMAID files
+# pymaid environment (Python v3.10)
+#
+# Former, byte-by-byte .BIN decrypter of preprocess.py (`decrypt_one_stream`,
+# reading the explicit and short logs field by field from a file object),
+# against which benchmark_decrypt.py and benchmark_decrypt_short.py verify the
+# buffer-based decrypter (`preprocess.decrypt_one`).
+#
+# Usage (module):
+# import decrypt_reference
+
+import re
+import struct
+import traceback
+
+from obspy import UTCDateTime
+
+'''
+
+Decrypts a log line using an expilicit format
+The number and size of arguments is explicitly described in the binary file.
+
+Keyword arguments:
+f -- file reader
+LOG_card -- Object for LOG decryption (database)
+WARN_card -- Object for WARNING decryption (database)
+ERR_card -- Object for ERROR decryption (database)
+
+'''
+
+def decrypt_explicit(f,LOG_card,WARN_card,ERR_card) :
+    #Read head
+    string = ""
+    IDbytes = f.read(2)
+    if len(IDbytes) != 2 :
+        print("err:IDbytes")
+        return "";
+    TIMESTAMPbytes = f.read(4)
+    if len(TIMESTAMPbytes) != 4 :
+        print("err:TIMESTAMPbytes")
+        return "";
+    INFOSbytes = f.read(1)
+    if INFOSbytes == "" :
+        print("err:INFOSbytes")
+        return "";
+    DATASIZEbytes = f.read(1)
+    if DATASIZEbytes == "" :
+        print("err:DATASIZEbytes")
+        return "";
+    #unpack head
+    try :
+        id = struct.unpack('<H', IDbytes)[0]
+        timestamp = struct.unpack('<I', TIMESTAMPbytes)[0]
+        infos = struct.unpack('<B', INFOSbytes)[0]
+        dataSize = struct.unpack('<B', DATASIZEbytes)[0]
+    except :
+        traceback.print_exc()
+        print("err:header")
+        return "";
+
+    #Process head
+    idString = "0x"+"{0:0{1}X}".format(id,4)+"UL"
+    binaryinfo = "{0:08b}".format(infos)
+    logtype = "00"
+    argformat = "00"
+    logtype = binaryinfo[-2:]
+    argformat = binaryinfo[-4:-2]
+    if argformat != "00":
+        return "";
+
+    #print ("ID : " + str(id))
+    #print ("IDString : " + str(idString))
+    #print ("Timestamp : " + str(timestamp))
+    #print ("Infos : " + str(infos))
+    #print ("BinaryInfos : " + str(binaryinfo))
+    #print ("Type : " + str(type))
+    #print ("ArgFormat : " + str(argformat))
+    #print ("dataSize : " + str(dataSize))
+
+    decrypt_card={}
+    type_string = ""
+    if logtype == "00":
+        decrypt_card = LOG_card
+    elif logtype == "01":
+        type_string = "<WARN>"
+        decrypt_card = WARN_card
+    elif logtype == "10":
+        type_string = "<ERR>"
+        decrypt_card = ERR_card
+    else :
+        type_string = "<DBG>"
+
+    Formats = []
+    File = "MAIN"
+
+    if(id < len(decrypt_card)) :
+        index = id
+    else :
+        index = len(decrypt_card)-1
+    while index >= 0 :
+        if decrypt_card[index]["ID"] == idString:
+            Formats = decrypt_card[index]["FORMATS"]
+            File = decrypt_card[index]["FILE"]
+            break;
+        index = index - 1
+
+    if len(Formats) <= 0 :
+        f.read(dataSize)
+        string += str(timestamp) + ":" + type_string + "["+"{:04d}".format(id)+"] Format not found\r\n"
+        return string
+    #print (Formats)
+    if File != "__BLANK__" :
+        string += str(timestamp) + ":"
+        string +="["+"{:6}".format(File)+","+"{:04d}".format(id)+"]"
+        string += type_string
+    index=0
+    argIndex=0
+    if dataSize > 0:
+        while index < dataSize :
+            #Read Argument Head
+            ARGINFOSByte = f.read(1)
+            if ARGINFOSByte == "":
+                print("err:ARGINFOSByte")
+                return "";
+            ARGSIZEByte = f.read(1)
+            if ARGSIZEByte == "":
+                print("err:ARGSIZEByte")
+                return "";
+            #Unpack Argument Head
+            try :
+                ArgInfos=struct.unpack('<B', ARGINFOSByte)[0]
+                ArgSize = struct.unpack('<B', ARGSIZEByte)[0]
+            except :
+                traceback.print_exc()
+                print("err:INFOSSIZE")
+                return "";
+
+            #Process Argument Head
+            ArgInfosBinary="{0:08b}".format(ArgInfos)
+            ArgType = ArgInfosBinary[-2:]
+
+            #print ("ArgInfosBinary : " + str(ArgInfosBinary))
+            #print ("ArgType : " + str(ArgType))
+            #print ("ArgSize : " + str(ArgSize))
+            index = index+2
+            Formats[argIndex] = Formats[argIndex].replace(r"\r\n","\r\n")
+            if ArgSize > 0:
+                Arg = 0
+                if ArgType == "00":
+                    if ArgSize == 4:
+                        ArgByte = f.read(4)
+                        if len(ArgByte) != 4 :
+                            print("err:TYPE00SIZE04")
+                            return "";
+                        try :
+                            Arg = struct.unpack('<i', ArgByte)[0]
+                        except :
+                            traceback.print_exc()
+                            print("err:TYPE00SIZE04")
+                            return "";
+                    elif ArgSize == 2:
+                        ArgByte = f.read(2)
+                        if len(ArgByte) != 2 :
+                            print("err:TYPE00SIZE02")
+                            return "";
+                        try :
+                            Arg = struct.unpack('<h', ArgByte)[0]
+                        except :
+                            traceback.print_exc()
+                            print("err:TYPE00SIZE02")
+                            return "";
+                    elif ArgSize == 1:
+                        ArgByte = f.read(1)
+                        if ArgByte == "" :
+                            print("err:TYPE00SIZE01")
+                            return "";
+                        try :
+                            Arg = struct.unpack('<b', ArgByte)[0]
+                        except :
+                            traceback.print_exc()
+                            print("err:TYPE00SIZE01")
+                            return "";
+                elif ArgType == "01":
+                    # unsigned integer
+                    if ArgSize == 4:
+                        ArgByte = f.read(4)
+                        if len(ArgByte) != 4 :
+                            print("err:TYPE01SIZE04")
+                            return "";
+                        try :
+                            Arg = struct.unpack('<I', ArgByte)[0]
+                        except :
+                            traceback.print_exc()
+                            print("err:TYPE01SIZE04")
+                            return "";
+                    elif ArgSize == 2:
+                        ArgByte = f.read(2)
+                        if len(ArgByte) != 2 :
+                            print("err:TYPE01SIZE02")
+                            return "";
+                        try :
+                            Arg = struct.unpack('<H', ArgByte)[0]
+                        except :
+                            traceback.print_exc()
+                            print("err:TYPE01SIZE02")
+                            return "";
+                    elif ArgSize == 1:
+                        ArgByte = f.read(1)
+                        if ArgByte == "":
+                            print("err:TYPE01SIZE01")
+                            return "";
+                        try :
+                            Arg = struct.unpack('<B', ArgByte)[0]
+                        except :
+                            traceback.print_exc()
+                            print("err:TYPE01SIZE01")
+                            return "";
+                elif ArgType == "11":
+                    # string
+                    ArgByte = f.read(ArgSize)
+                    if len(ArgByte) != ArgSize :
+                        print("err:TYPE11")
+                        return "";
+                    if ArgByte[ArgSize-1] == 0 :
+                        ArgByte = ArgByte[:-1]
+                    Arg = ArgByte
+                    try :
+                        Arg = Arg.decode('ascii', 'ignore')
+                    except :
+                        traceback.print_exc()
+                        print("err:TYPE11")
+                        return "";
+                    #replace none ascii characters
+                #print (ArgSize)
+                #print ("Format : " + str(Formats[argIndex]) + "\r\n")
+                try :
+                    if "%c" in Formats[argIndex]:
+                        if Arg < 0 :
+                            Arg = 0
+                        elif Arg > 0x10FFFF:
+                            Arg = 0x10FFFF
+
+                    if "%.*s" in Formats[argIndex]:
+                        string += (Formats[argIndex] % (ArgSize,Arg))
+                    else :
+                        string += (Formats[argIndex] % Arg)
+                except :
+                    traceback.print_exc()
+                    print("error format \"{}\" ARG {}".format(Formats[argIndex],Arg))
+                    return "";
+            else :
+                #print ("Format : " + str(Formats[argIndex]) + "\r\n")
+                string += str(Formats[argIndex])
+                index = index + 1
+            index = index + ArgSize
+            argIndex = argIndex + 1
+    else :
+        #print ("Format : " + (Formats[0].replace(r"\r\n","\r\n")) + "\r\n")
+        string += str(Formats[0].replace(r"\r\n","\r\n"))
+    string += "\r\n"
+    return string
+
+def decrypt_short(f,short_card) :
+    '''
+
+    Decrypts a log line using an short format
+    The number and size of arguments is implicit.
+    Only frequently recurring logs use this format.
+    (Pressure measurement, Pump time, valve time ...)
+
+    Keyword arguments:
+    f -- file reader
+
+    '''
+    string = ""
+    id = f.read(1)
+    format = ""
+    shortId = 256
+    if id == "" :
+        print("err:EMPTYSHORTID")
+        return "";
+    try :
+        shortId = struct.unpack('<B', id)[0]
+    except :
+        traceback.print_exc()
+        print("err:UNPACKSHORTID")
+        return "";
+
+    # Search formats link to short log
+    args = []
+    if(shortId < len(short_card)) :
+        index = shortId
+    else :
+        index = len(short_card)-1
+    while index >= 0 :
+        if short_card[index]["ID"] == shortId:
+            args = short_card[index]["ARGS"]
+            break;
+        index = index - 1
+    if len(args) == 0 :
+        print("err:NoShortFormatFound")
+        return ""
+
+    # Get timestamp
+    timestamp_bytes = f.read(4)
+    if len(timestamp_bytes) != 4 :
+        print("err:timestamp")
+        return ""; 
+    try :
+        timestamp = struct.unpack('<I', timestamp_bytes)[0]     
+    except :
+        traceback.print_exc()    
+        print("err:unpacktimestamp")
+        return ""
+    # Init format with timestamp
+    format_str = str(timestamp) + ":"   
+    for arg in args:
+        size = arg["SIZE"]
+        value = f.read(size)
+        if len(value) != size :
+            print("err:valueSize")
+            return ""
+        unpack_arg = ""
+        # get format of value
+        if arg["SIGN"] == "signed":
+            if size == 4:
+                unpack_arg = '<i'
+            elif size == 2:
+                unpack_arg = '<h'
+            elif size == 1:
+                unpack_arg = '<b'
+            else :
+                print("err:wrongsignedformat")
+        elif arg["SIGN"] == "unsigned":
+            if size == 4:
+                unpack_arg = '<I'
+            elif size == 2:
+                unpack_arg = '<H'
+            elif size == 1:
+                unpack_arg = '<B'
+            else :
+                print("err:wrongunsignedformat")
+        else :
+            format_str = format_str + arg["FORMAT"]
+            continue
+        # unpack argument value
+        try :
+            arg_value = struct.unpack(unpack_arg, value)[0]
+        except :
+            traceback.print_exc()    
+            print("err:unpackvalue")
+            return ""   
+        # seach specific format
+        regexShortFomat = r"[^%]*(%([\-\+ 0])?(\d)*\.?([\d\*])*([dfcsXxupt]))"
+        shortformatfind = re.findall(regexShortFomat, arg["FORMAT"])
+        if len(shortformatfind) == 0 :
+            print("err:wrongformat")
+            return ""
+
+        replace_pattern = shortformatfind[0][0]
+        flags = shortformatfind[0][1]
+        width = shortformatfind[0][2]
+        precision = shortformatfind[0][3]
+        specifier = shortformatfind[0][4]
+        if specifier == 't' :
+            # value is a timestamp
+            isodate = UTCDateTime(int(arg_value)).isoformat().replace(':','_')
+            isodate.replace(":","_")
+            format_str = format_str + arg["FORMAT"].replace(replace_pattern,isodate)
+        elif specifier == 'f' :
+            # value is a float stored on integer
+            divisor = 1
+            if precision.isnumeric():
+                divisor = 10 ** int(precision)
+            argf = float(arg_value) / divisor
+            argf_format = "{:." + precision + "f}"
+            argf_str = argf_format.format(argf)
+            format_str = format_str + arg["FORMAT"].replace(replace_pattern,argf_str)
+        else :
+            format_str = format_str + arg["FORMAT"] % arg_value
+    return format_str + "\r\n"
+
+# Decrypt one file with LOG, WARN,and ERR cards give in arguments
+def decrypt_one_stream(path,LOG_card,WARN_card,ERR_card,short_card):
+    '''
+
+    Read a file byte by byte and wait for header characters.
+    Depending on the header, we decrypt an explicit (decrypt_explicit) or implicit log (decrypt_short).
+    (Former decrypter, the reference of preprocess.decrypt_one)
+
+    Keyword arguments:
+    f -- file reader
+    LOG_card -- Object for LOG decryption (database)
+    WARN_card -- Object for WARNING decryption (database)
+    ERR_card -- Object for ERROR decryption (database)
+
+    '''
+    #parse data
+    string =""
+    with open(path, "rb") as f:
+        byte = f.read(1)
+        while byte != b'':
+            byte = f.read(1)
+            if byte != b'#':
+                if byte != b'@':
+                    continue
+                else :
+                    string += decrypt_short(f,short_card);
+            else :
+                byte = f.read(1)
+                if byte != b'*':
+                    continue
+                else :
+                    string += decrypt_explicit(f,LOG_card,WARN_card,ERR_card);
+    return string
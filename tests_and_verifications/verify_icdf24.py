@@ -0,0 +1,133 @@
+# Part of automaid -- a Python package to process MERMAID files
+# pymaid environment (Python v3.10)
+#
+# Verifies that the in-process inverse CDF(2,4) wavelet transform
+# (`icdf24.icdf24`) is identical, bit for bit, to the C programs it replaces
+# (`icdf24_v103_test` and `icdf24_v103ec_test`, compiled in scripts/bin/ from
+# scripts/src/V103/ and scripts/src/V103EC/), for
+#
+# (1) every event of the .MER files found (recursively) in a directory, e.g.,
+#     tests_and_verifications/test_data/, and
+# (2) random coefficients of every flavor of transform: 0 to 7 scales, all
+#     normalizations, with and without edge corrections, and magnitudes up to
+#     the int32 limits (to exercise the rounding and the int32 wraparound)
+#
+# and compares the time taken by both; the batch inversion of (1) and (2)
+# (`icdf24.icdf24_batch`) is also verified against the C programs.
+#
+# Usage:
+# python verify_icdf24.py <directory of .MER files> [<number of random trials>]
+
+import os
+import re
+import sys
+import glob
+import time
+import tempfile
+import subprocess
+import numpy as np
+
+sys.path.append(os.path.join(os.getenv('AUTOMAID'), 'scripts'))
+import events
+import icdf24
+
+bin_path = os.path.join(os.getenv('AUTOMAID'), 'scripts', 'bin')
+tmp_path = tempfile.mkdtemp()
+
+def c_icdf24(coefficients, scales, normalized, edges_correction):
+    '''Return the output of the C inversion program for `coefficients` (bytes)
+
+    '''
+    program = "icdf24_v103ec_test" if edges_correction == "1" else "icdf24_v103_test"
+    with open(os.path.join(tmp_path, "wtcoeffs"), "wb") as f:
+        f.write(coefficients)
+
+    subprocess.check_output([os.path.join(bin_path, program), scales, normalized, "wtcoeffs"],
+                            cwd=tmp_path)
+    inverted_data_file_name = os.path.join(tmp_path, "wtcoeffs.icdf24_" + scales)
+    data = np.fromfile(inverted_data_file_name, np.int32)
+    os.remove(inverted_data_file_name)
+    return data
+
+def compare(coefficients, scales, normalized, edges_correction):
+    '''Return (identical, C time, NumPy time) for one inversion
+
+    '''
+    t0 = time.perf_counter()
+    c_data = c_icdf24(coefficients, scales, normalized, edges_correction)
+    t1 = time.perf_counter()
+    np_data = icdf24.icdf24(coefficients, scales, normalized, edges_correction)
+    t2 = time.perf_counter()
+    return np.array_equal(c_data, np_data), t1 - t0, t2 - t1
+
+path = sys.argv[1]
+trials = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+
+def compare_batch(cases):
+    '''Return the number of `cases` (coefficients, scales, normalized,
+    edges_correction) whose batch inversion differs from that of the C programs
+
+    '''
+    indices_by_flavor = {}
+    for i, case in enumerate(cases):
+        indices_by_flavor.setdefault(case[1:], []).append(i)
+
+    nb_different = 0
+    for flavor, indices in indices_by_flavor.items():
+        signals = icdf24.icdf24_batch([cases[i][0] for i in indices], *flavor)
+        for i, signal in zip(indices, signals):
+            nb_different += not np.array_equal(c_icdf24(*cases[i]), signal)
+
+    return nb_different
+
+# (1) Events of the .MER files
+nb_cases = nb_different = 0
+time_c = time_np = 0
+cases = []
+for mer_dir in sorted({os.path.dirname(f) for f in glob.glob(os.path.join(path, "**", "*.MER"), recursive=True)}):
+    for event in events.Events(mer_dir).events:
+        if event.is_stanford_event or event.scales == "-1":
+            continue
+
+        event.load_mer_binary()
+        normalized = re.findall(r" NORMALIZED=(\d+)", event.default_mer_environment)[0]
+        edges_correction = re.findall(r" EDGES_CORRECTION=(\d+)", event.default_mer_environment)[0]
+        identical, t_c, t_np = compare(event.mer_binary_binary, event.scales, normalized, edges_correction)
+        cases.append((event.mer_binary_binary, event.scales, normalized, edges_correction))
+        nb_cases += 1
+        nb_different += not identical
+        time_c += t_c
+        time_np += t_np
+        if not identical:
+            print("DIFFERENT: event {:s} in {:s}".format(str(event.info_date), event.mer_binary_name))
+
+print(".MER events: {:d} inverted, {:d} different; C {:.3f} s, NumPy {:.3f} s".format(
+    nb_cases, nb_different, time_c, time_np))
+print(".MER events (batch): {:d} different".format(compare_batch(cases)))
+
+# (2) Random coefficients (NB, the C programs loop endlessly for more than 6
+# scales with normalization by sqrt(2): not tested)
+rng = np.random.default_rng(0)
+nb_cases = nb_different = 0
+cases = []
+for trial in range(trials):
+    scales = int(rng.integers(0, 8))
+    normalized = int(rng.integers(0, 3))
+    if normalized == 1 and scales > 6:
+        continue
+
+    edges_correction = str(rng.integers(0, 2))
+    magnitude = [2**8, 2**20, 2**31][rng.integers(0, 3)]
+    size = int(rng.integers(1, 64)) << scales
+    coefficients = rng.integers(-magnitude, magnitude, size).astype(np.int32).tobytes()
+
+    identical, t_c, t_np = compare(coefficients, str(scales), str(normalized), edges_correction)
+    cases.append((coefficients, str(scales), str(normalized), edges_correction))
+    nb_cases += 1
+    nb_different += not identical
+    if not identical:
+        print("DIFFERENT: {:d} coefficients, {:d} scales, NORMALIZED={:d}, EDGES_CORRECTION={:s}".format(
+            size, scales, normalized, edges_correction))
+
+print("Random coefficients: {:d} inverted, {:d} different".format(nb_cases, nb_different))
+print("Random coefficients (batch): {:d} different".format(compare_batch(cases)))